@@ -0,0 +1,70 @@
+"""Pomiar czasu zimnego startu `regon-cli` i importu pakietu regon_core.
+
+Każdy przypadek uruchamiany jest w nowym procesie Pythona; liczy się mediana
+z kilku prób. Skrypt kończy się kodem 1, gdy mediana przekroczy próg albo gdy
+import pakietu wciągnie ciężkie zależności (tkinter, fpdf, lxml, litex.regon).
+
+Użycie:
+    python benchmarks/cold_start.py [--runs 7] [--target-ms 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Próg dla samego interpretera + regon_core; `python -c pass` jest mierzony dla porównania.
+TARGET_MS = 150
+
+CASES = {
+    "python": ["-c", "pass"],
+    "import regon_core": ["-c", "import regon_core"],
+    "regon-cli --help": ["-m", "regon_core", "--help"],
+}
+
+HEAVY_MODULES = ("tkinter", "fpdf", "lxml", "litex.regon", "requests")
+
+
+def measure(args, runs):
+    czasy = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        czasy.append((time.perf_counter() - start) * 1000)
+    return statistics.median(czasy)
+
+
+def heavy_imports():
+    kod = (
+        "import sys, regon_core.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    wynik = subprocess.run([sys.executable, "-c", kod], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [m for m in wynik.stdout.strip().split(",") if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=TARGET_MS)
+    args = parser.parse_args(argv)
+
+    wyniki = {nazwa: round(measure(case, args.runs), 1) for nazwa, case in CASES.items()}
+    ciezkie = heavy_imports()
+    print(json.dumps({"median_ms": wyniki, "target_ms": args.target_ms, "heavy_imports": ciezkie}, indent=2))
+
+    if ciezkie:
+        print(f"regon_core importuje przy starcie: {', '.join(ciezkie)}", file=sys.stderr)
+        return 1
+    if wyniki["regon-cli --help"] > args.target_ms:
+        print(f"regon-cli --help: {wyniki['regon-cli --help']} ms > {args.target_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Pomiary wydajności wyszukiwania, parsowania i eksportu PDF na atrapie usługi BIR1.
+
+Skrypt uruchamia lokalny MockBIR (z opóźnieniem i odsetkiem błędów do
+ustawienia), dodaje wygenerowane podmioty i mierzy przypadki:
+
+    single_lookup          - pojedyncze wyszukiwania po kolei (jak w GUI)
+    batch_workers_N        - regon-cli batch przy N równoległych sesjach
+    reload_uncached/cached - ponowne wczytanie listy NIPów bez i z pamięcią podręczną
+    xml_extract            - strumieniowe parsowanie odpowiedzi z projekcją pól (dane_z_rekordu)
+    history_page/search    - pierwsza strona i wyszukiwanie w historii z N wpisami
+    validate_nips          - normalizacja, suma kontrolna i deduplikacja listy NIPów (bez sieci)
+    pdf_export_N           - eksport raportu N firm do jednego pliku PDF (karty firm)
+    pdf_table_N            - zestawienie N firm w układzie tabeli
+
+Wynik (JSON) zawiera commit, konfigurację, czasy przypadków i metryki faz
+z regon_core.metryki, więc przebiegi z różnych commitów można porównać:
+
+    python benchmarks/regon_bench.py -o wyniki.json
+    python benchmarks/regon_bench.py --compare wyniki.json --threshold 20
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from regon_core import HistoryStore, ResultCache, SessionManager, pobierz_dane, run_batch  # noqa: E402
+from regon_core.gus import dane_z_rekordu  # noqa: E402
+from regon_core.metryki import METRYKI  # noqa: E402
+from regon_core.mock_bir import MOCK_API_KEY, MOCK_DATA_DIR, MockBIR  # noqa: E402
+from regon_core.projekcja import PODSTAWOWA, rekordy  # noqa: E402
+from regon_core.walidacja import filtruj_nipy  # noqa: E402
+
+# --- Konfiguracja i stałe ---
+
+DOMYSLNE_WORKERS = (1, 4, 8)
+DOMYSLNE_PDF = (1, 100, 1000)
+# Próg regresji (w procentach spadku przepustowości) dla --compare.
+PROG_REGRESJI = 20.0
+
+
+def _commit():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        zmiany = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        return rev, bool(zmiany)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def _wynik(czasy, calkowity, bledy=0):
+    """Statystyki przypadku: liczba operacji, czas, przepustowość i kwantyle opóźnień."""
+    posortowane = sorted(czasy)
+    wynik = {
+        "n": len(czasy),
+        "seconds": round(calkowity, 4),
+        "ops_per_s": round(len(czasy) / calkowity, 2) if calkowity else None,
+        "errors": bledy,
+    }
+    if posortowane:
+        for nazwa, q in (("p50_ms", 0.5), ("p95_ms", 0.95)):
+            wynik[nazwa] = round(posortowane[min(len(posortowane) - 1, int(q * len(posortowane)))] * 1000, 3)
+    return wynik
+
+
+def _pojedynczo(nipy, sesje, cache=None):
+    czasy, bledy = [], 0
+    start = time.perf_counter()
+    for nip in nipy:
+        t = time.perf_counter()
+        try:
+            pobierz_dane(nip, MOCK_API_KEY, sesje, cache)
+        except Exception:
+            bledy += 1
+        czasy.append(time.perf_counter() - t)
+    return _wynik(czasy, time.perf_counter() - start, bledy)
+
+# --- Przypadki ---
+
+
+def case_single_lookup(bir, nipy, katalog):
+    sesje = SessionManager(service_url=bir.url)
+    try:
+        return _pojedynczo(nipy, sesje)
+    finally:
+        sesje.close()
+
+
+def case_batch(bir, nipy, katalog, workers):
+    sesje = SessionManager(service_url=bir.url, max_sessions=workers)
+    wyjscie = os.path.join(katalog, f"batch_{workers}.jsonl")
+    start = time.perf_counter()
+    try:
+        liczniki = run_batch(nipy, MOCK_API_KEY, wyjscie, workers=workers, rate=0, sesje=sesje)
+    finally:
+        sesje.close()
+    calkowity = time.perf_counter() - start
+    wynik = _wynik([], calkowity, liczniki["błąd"])
+    wynik.update(n=len(nipy), ops_per_s=round(len(nipy) / calkowity, 2), requests=dict(bir.requests))
+    return wynik
+
+
+def case_reload(bir, nipy, katalog):
+    """Dwa przebiegi po tej samej liście (jak ponowne wczytanie historii): bez i z trafieniami w cache."""
+    sesje = SessionManager(service_url=bir.url)
+    cache = ResultCache(os.path.join(katalog, "cache.sqlite"))
+    try:
+        return {
+            "reload_uncached": _pojedynczo(nipy, sesje, cache),
+            "reload_cached": _pojedynczo(nipy, sesje, cache),
+        }
+    finally:
+        sesje.close()
+        cache.close()
+
+
+def case_xml_extract(bir, powtorzenia):
+    """Parsowanie wyniku wyszukiwania i raportu szczegółowego oraz budowa `dane_do_raportu`."""
+    pary = []
+    for (regon, raport), tresc in bir.nagrania.raporty.items():
+        szukaj = bir.nagrania.po_regon.get(regon)
+        if szukaj is not None and raport == "PublDaneRaportPrawna":
+            pary.append((f"<root>{szukaj}</root>", f"<root>{tresc}</root>"))
+    czasy = []
+    start = time.perf_counter()
+    for i in range(powtorzenia):
+        szukaj, raport = pary[i % len(pary)]
+        t = time.perf_counter()
+        rekord = next(rekordy(szukaj))
+        rekord.update(next(rekordy(raport, PODSTAWOWA.pola_raportu), {}))
+        dane_z_rekordu(rekord)
+        czasy.append(time.perf_counter() - t)
+    return _wynik(czasy, time.perf_counter() - start)
+
+
+def case_history(liczba, katalog):
+    """Otwarcie historii z `liczba` wpisami: pierwsza strona oraz wyszukiwanie po NIP i nazwie."""
+    historia = HistoryStore(os.path.join(katalog, "historia.sqlite"), None)
+    try:
+        historia.add_many((f"{1000000000 + i}", f"Firma Testowa {i} SPÓŁKA Z O.O.", i) for i in range(liczba))
+        wyniki = {}
+        for nazwa, query in (("history_page", None), ("history_search", "testowa 12"), ("history_nip", "10000")):
+            czasy = []
+            start = time.perf_counter()
+            for _ in range(20):
+                t = time.perf_counter()
+                historia.count(query)
+                historia.page(0, query=query)
+                czasy.append(time.perf_counter() - t)
+            wyniki[nazwa] = _wynik(czasy, time.perf_counter() - start)
+        return wyniki
+    finally:
+        historia.close()
+
+
+def case_validation(liczba, seed):
+    """Lista `liczba` NIPów jak z ERP: co piąty z myślnikami, co dziesiąty powtórzony, ok. 90% ze złą sumą."""
+    import random
+
+    losowe = random.Random(seed)
+    wartosci = []
+    for i in range(liczba):
+        if i % 10 == 9 and wartosci:
+            wartosci.append(wartosci[losowe.randrange(len(wartosci))])
+            continue
+        nip = f"{losowe.randrange(10 ** 9, 10 ** 10)}"
+        wartosci.append(f"{nip[:3]}-{nip[3:6]}-{nip[6:8]}-{nip[8:]}" if i % 5 == 0 else nip)
+    odrzucone = []
+    start = time.perf_counter()
+    poprawne = filtruj_nipy(wartosci, odrzucone)
+    wynik = _wynik([], time.perf_counter() - start)
+    wynik.update(n=liczba, ops_per_s=round(liczba / wynik["seconds"], 2), valid=len(poprawne),
+                 rejected=len(odrzucone))
+    return wynik
+
+
+def case_pdf_export(dane, liczba, katalog, uklad="karta"):
+    from regon_core.pdf import ReportTemplate, export_pdf_batch
+
+    raporty = [(f"firma_{i}", dane[i % len(dane)]) for i in range(liczba)]
+    start = time.perf_counter()
+    stats = export_pdf_batch(raporty, os.path.join(katalog, f"eksport_{uklad}_{liczba}.pdf"),
+                             szablon=ReportTemplate(uklad=uklad))
+    wynik = _wynik([], time.perf_counter() - start)
+    wynik.update(n=liczba, ops_per_s=round(liczba / wynik["seconds"], 2), pages=stats["pages"])
+    return wynik
+
+# --- Uruchomienie i porównanie ---
+
+
+def run(args):
+    wyniki = {}
+    METRYKI.reset()
+    with tempfile.TemporaryDirectory() as katalog, MockBIR(
+        MOCK_DATA_DIR, latency=args.latency, error_rate=args.error_rate, seed=args.seed
+    ) as bir:
+        nipy = bir.add_synthetic(max(args.lookups, args.batch))
+
+        wyniki["single_lookup"] = case_single_lookup(bir, nipy[:args.lookups], katalog)
+        for workers in args.workers:
+            bir.requests.clear()
+            wyniki[f"batch_workers_{workers}"] = case_batch(bir, nipy[:args.batch], katalog, workers)
+        wyniki.update(case_reload(bir, nipy[:args.lookups], katalog))
+        wyniki["xml_extract"] = case_xml_extract(bir, args.xml)
+        wyniki.update(case_history(args.history, katalog))
+        wyniki["validate_nips"] = case_validation(args.validate, args.seed)
+
+        # Dane do eksportu PDF pobieramy bez wstrzykiwanych błędów.
+        bir.error_rate = 0.0
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            dane = [d for d in (pobierz_dane(nip, MOCK_API_KEY, sesje) for nip in nipy[:10]) if d]
+        finally:
+            sesje.close()
+        for liczba in args.pdf:
+            wyniki[f"pdf_export_{liczba}"] = case_pdf_export(dane, liczba, katalog)
+        wyniki[f"pdf_table_{max(args.pdf)}"] = case_pdf_export(dane, max(args.pdf), katalog, "tabela")
+
+    commit, zmiany = _commit()
+    return {
+        "meta": {
+            "commit": commit,
+            "dirty": zmiany,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold")},
+        },
+        "cases": wyniki,
+        "metryki": METRYKI.snapshot(),
+    }
+
+
+def compare(poprzednie, biezace, prog):
+    """Wypisuje zmianę przepustowości względem poprzedniego przebiegu; zwraca listę regresji."""
+    regresje = []
+    print(f"{'przypadek':<22}{'przed':>12}{'teraz':>12}{'zmiana':>10}")
+    for nazwa, wynik in biezace["cases"].items():
+        przed = poprzednie["cases"].get(nazwa, {}).get("ops_per_s")
+        teraz = wynik.get("ops_per_s")
+        if not przed or not teraz:
+            continue
+        zmiana = (teraz - przed) / przed * 100
+        print(f"{nazwa:<22}{przed:>12.2f}{teraz:>12.2f}{zmiana:>9.1f}%")
+        if zmiana < -prog:
+            regresje.append(nazwa)
+    return regresje
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="zapisz wynik JSON do pliku (domyślnie na stdout)")
+    parser.add_argument("--compare", metavar="PLIK", help="porównaj z wcześniejszym wynikiem JSON")
+    parser.add_argument("--threshold", type=float, default=PROG_REGRESJI,
+                        help=f"dopuszczalny spadek przepustowości w %% (domyślnie {PROG_REGRESJI})")
+    parser.add_argument("--latency", type=float, default=0.005, help="opóźnienie odpowiedzi atrapy w sekundach")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek żądań kończonych błędem HTTP 500")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--lookups", type=int, default=50, help="liczba pojedynczych wyszukiwań")
+    parser.add_argument("--batch", type=int, default=500, help="liczba NIPów w przypadkach batch")
+    parser.add_argument("--workers", type=int, nargs="+", default=list(DOMYSLNE_WORKERS))
+    parser.add_argument("--xml", type=int, default=2000, help="liczba parsowanych odpowiedzi")
+    parser.add_argument("--history", type=int, default=100000, help="liczba wpisów w historii")
+    parser.add_argument("--validate", type=int, default=1000000, help="liczba NIPów w przypadku validate_nips")
+    parser.add_argument("--pdf", type=int, nargs="+", default=list(DOMYSLNE_PDF), help="liczby firm w eksporcie PDF")
+    args = parser.parse_args(argv)
+
+    wynik = run(args)
+    tekst = json.dumps(wynik, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(tekst + "\n")
+    else:
+        print(tekst)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regresje = compare(json.load(f), wynik, args.threshold)
+        if regresje:
+            print(f"Regresja powyżej {args.threshold}%: {', '.join(regresje)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
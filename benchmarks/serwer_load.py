@@ -0,0 +1,191 @@
+"""Test obciążeniowy serwera regon-cli serve na atrapie usługi BIR1.
+
+Skrypt uruchamia MockBIR (z opóźnieniem i odsetkiem błędów do ustawienia)
+i RegonServer ze wspólną pulą sesji i pamięcią podręczną, a następnie:
+
+    lookups - `--clients` wątków wysyła GET /nip/{nip} przez połączenia keep-alive;
+              odsetek `--hot` zapytań dotyczy kilku "gorących" NIPów, reszta
+              jest losowana z `--entities` podmiotów
+    batch   - `--batches` równoległych POST /batch po `--batch-size` NIPów
+              (czas do pierwszego wiersza i do końca strumienia)
+
+Wynik (JSON) zawiera przepustowość, kwantyle opóźnień, liczniki statusów,
+liczbę zapytań, które dotarły do atrapy GUS, oraz statystyki pamięci
+podręcznej i single-flight serwera:
+
+    python benchmarks/serwer_load.py --clients 32 --requests 5000 --latency 0.05
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from regon_core import ResultCache, SessionManager  # noqa: E402
+from regon_core.limiter import AdaptiveLimiter  # noqa: E402
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR  # noqa: E402
+from regon_core.serwer import RegonServer  # noqa: E402
+
+# --- Konfiguracja i stałe ---
+
+LICZBA_GORACYCH = 10
+
+
+def _wynik(czasy, calkowity, statusy):
+    posortowane = sorted(czasy)
+    wynik = {
+        "n": len(czasy),
+        "seconds": round(calkowity, 4),
+        "ops_per_s": round(len(czasy) / calkowity, 2) if calkowity else None,
+        "statusy": statusy,
+    }
+    if posortowane:
+        for nazwa, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            wynik[nazwa] = round(posortowane[min(len(posortowane) - 1, int(q * len(posortowane)))] * 1000, 3)
+    return wynik
+
+
+def _polaczenie(url):
+    czesci = urlsplit(url)
+    return http.client.HTTPConnection(czesci.hostname, czesci.port, timeout=120)
+
+# --- Przypadki ---
+
+
+def case_lookups(url, nipy, args):
+    goraca = nipy[:LICZBA_GORACYCH]
+    losowe = random.Random(args.seed)
+    kolejka = [
+        losowe.choice(goraca) if losowe.random() < args.hot else losowe.choice(nipy)
+        for _ in range(args.requests)
+    ]
+    czasy, statusy = [], {}
+    lock = threading.Lock()
+    iterator = iter(kolejka)
+
+    def klient():
+        polaczenie = _polaczenie(url)
+        moje_czasy, moje_statusy = [], {}
+        while True:
+            with lock:
+                nip = next(iterator, None)
+            if nip is None:
+                break
+            t = time.perf_counter()
+            polaczenie.request("GET", f"/nip/{nip}")
+            odpowiedz = polaczenie.getresponse()
+            odpowiedz.read()
+            moje_czasy.append(time.perf_counter() - t)
+            moje_statusy[odpowiedz.status] = moje_statusy.get(odpowiedz.status, 0) + 1
+        polaczenie.close()
+        with lock:
+            czasy.extend(moje_czasy)
+            for kod, ile in moje_statusy.items():
+                statusy[kod] = statusy.get(kod, 0) + ile
+
+    watki = [threading.Thread(target=klient) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for watek in watki:
+        watek.start()
+    for watek in watki:
+        watek.join()
+    return _wynik(czasy, time.perf_counter() - start, statusy)
+
+
+def case_batch(url, nipy, args):
+    losowe = random.Random(args.seed + 1)
+    listy = [losowe.sample(nipy, min(args.batch_size, len(nipy))) for _ in range(args.batches)]
+    pierwsze, czasy, statusy = [], [], {}
+    lock = threading.Lock()
+
+    def klient(lista):
+        polaczenie = _polaczenie(url)
+        t = time.perf_counter()
+        polaczenie.request("POST", "/batch", json.dumps(lista), {"Content-Type": "application/json"})
+        odpowiedz = polaczenie.getresponse()
+        pierwszy = None
+        moje = {}
+        for linia in odpowiedz:
+            if pierwszy is None:
+                pierwszy = time.perf_counter() - t
+            status = json.loads(linia)["status"]
+            moje[status] = moje.get(status, 0) + 1
+        polaczenie.close()
+        with lock:
+            czasy.append(time.perf_counter() - t)
+            pierwsze.append(pierwszy or 0.0)
+            for status, ile in moje.items():
+                statusy[status] = statusy.get(status, 0) + ile
+
+    watki = [threading.Thread(target=klient, args=(lista,)) for lista in listy]
+    start = time.perf_counter()
+    for watek in watki:
+        watek.start()
+    for watek in watki:
+        watek.join()
+    wynik = _wynik(czasy, time.perf_counter() - start, statusy)
+    wynik["first_row_p50_ms"] = round(sorted(pierwsze)[len(pierwsze) // 2] * 1000, 3) if pierwsze else None
+    wynik["rows_per_s"] = round(sum(statusy.values()) / wynik["seconds"], 2) if wynik["seconds"] else None
+    return wynik
+
+
+def run(args):
+    wynik = {"config": {k: v for k, v in vars(args).items() if k != "output"}}
+    with tempfile.TemporaryDirectory() as katalog, \
+            MockBIR(latency=args.latency, error_rate=args.error_rate, seed=args.seed) as bir:
+        nipy = bir.add_synthetic(args.entities)
+        sesje = SessionManager(service_url=bir.url, max_sessions=args.workers, limiter=AdaptiveLimiter(args.rate))
+        cache = None if args.no_cache else ResultCache(os.path.join(katalog, "cache.sqlite"))
+        serwer = RegonServer(MOCK_API_KEY, port=0, sesje=sesje, cache=cache, workers=args.workers)
+        try:
+            with serwer:
+                wynik["lookups"] = case_lookups(serwer.url, nipy, args)
+                wynik["lookups"]["upstream_requests"] = dict(bir.requests)
+                if args.batches:
+                    przed = dict(bir.requests)
+                    wynik["batch"] = case_batch(serwer.url, nipy, args)
+                    wynik["batch"]["upstream_requests"] = {k: v - przed.get(k, 0) for k, v in bir.requests.items()}
+                wynik["server"] = serwer.health()
+        finally:
+            sesje.close()
+            if cache is not None:
+                cache.close()
+    return wynik
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="zapisz wynik JSON do pliku (domyślnie na stdout)")
+    parser.add_argument("--latency", type=float, default=0.02, help="opóźnienie odpowiedzi atrapy w sekundach")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek żądań kończonych błędem HTTP 500")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--entities", type=int, default=2000, help="liczba wygenerowanych podmiotów")
+    parser.add_argument("--clients", type=int, default=16, help="liczba równoległych klientów GET")
+    parser.add_argument("--requests", type=int, default=2000, help="łączna liczba zapytań GET")
+    parser.add_argument("--hot", type=float, default=0.5, help="odsetek zapytań o gorące NIPy")
+    parser.add_argument("--batches", type=int, default=4, help="liczba równoległych POST /batch")
+    parser.add_argument("--batch-size", type=int, default=500, help="liczba NIPów w jednym POST /batch")
+    parser.add_argument("--workers", type=int, default=8, help="liczba sesji GUS serwera")
+    parser.add_argument("--rate", type=float, default=0, help="pułap zapytań do atrapy na sekundę (0 = bez limitu)")
+    parser.add_argument("--no-cache", action="store_true", help="serwer bez pamięci podręcznej")
+    args = parser.parse_args(argv)
+
+    tekst = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(tekst + "\n")
+    else:
+        print(tekst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Rdzeń klienta REGON: sesje BIR1, pobieranie danych podmiotów, pamięć podręczna wyników, historia i tryb wsadowy.
+
+Pakiet nie importuje tkintera; litex.regon, lxml i fpdf są ładowane dopiero przy pierwszym użyciu.
+"""
+
+from .sesja import SERVICE_URL, SessionManager, is_auth_error, is_session_error
+from .gus import (
+    KLUCZE_DANYCH, POLA_DO_WYSWIETLENIA, dane_z_odpowiedzi, dane_z_rekordu, format_dane, pobierz_dane,
+    pobierz_dane_wiele, rozpoznaj_identyfikator,
+)
+from .projekcja import Projekcja
+from .limiter import AdaptiveLimiter, DeadLetterList
+from .singleflight import SingleFlight
+from .cache import ResultCache
+from .historia import HistoryStore
+from .wyniki import ResultSet
+from .lustro import EntityMirror, MirrorRefresher
+from .klucz import KEY_FILE, read_api_key, save_api_key
+from .batch import read_nips, run_batch
+from .serwer import RegonServer
+from .obserwacja import Watchlist, WatchScheduler
+
+__all__ = [
+    "SERVICE_URL",
+    "SessionManager",
+    "is_auth_error",
+    "is_session_error",
+    "KLUCZE_DANYCH",
+    "POLA_DO_WYSWIETLENIA",
+    "dane_z_odpowiedzi",
+    "dane_z_rekordu",
+    "format_dane",
+    "pobierz_dane",
+    "pobierz_dane_wiele",
+    "rozpoznaj_identyfikator",
+    "Projekcja",
+    "AdaptiveLimiter",
+    "DeadLetterList",
+    "SingleFlight",
+    "ResultCache",
+    "HistoryStore",
+    "ResultSet",
+    "EntityMirror",
+    "MirrorRefresher",
+    "KEY_FILE",
+    "read_api_key",
+    "save_api_key",
+    "read_nips",
+    "run_batch",
+    "RegonServer",
+    "Watchlist",
+    "WatchScheduler",
+]
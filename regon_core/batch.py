@@ -0,0 +1,228 @@
+"""Tryb wsadowy: sprawdzanie listy NIPów z pliku bez GUI.
+
+Użycie:
+    regon-cli batch kontrahenci.csv -o wyniki.jsonl --workers 4 --rate 10
+    regon-cli batch kontrahenci.csv -o wyniki.parquet --fields forma,pkd
+"""
+import csv
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from .eksport import ROW_GROUP, open_writer, read_results
+from .gus import KLUCZE_DANYCH, MAX_W_ZAPYTANIU, pobierz_dane_wiele
+from .limiter import DOMYSLNY_LIMIT, AdaptiveLimiter, DeadLetterList
+from .projekcja import PODSTAWOWA
+from .sesja import SessionManager, is_auth_error
+from .walidacja import filtruj_nipy
+
+# Odrzucone NIPy (błędny klucz API) są dopisywane do pliku wynikowego z tym przyrostkiem.
+ODRZUCONE_SUFFIX = ".odrzucone.jsonl"
+
+STATUS_OK = "ok"
+STATUS_BRAK = "brak"
+STATUS_BLAD = "błąd"
+# Wartość wejściowa odrzucona lokalnie (format lub suma kontrolna) - bez zapytania do GUS.
+STATUS_NIEPOPRAWNY = "niepoprawny"
+
+KOLUMNY_WYNIKU = ["NIP", "Status"] + KLUCZE_DANYCH + ["Błąd"]
+
+
+def kolumny_wyniku(projekcja=PODSTAWOWA):
+    """Kolumny pliku wynikowego z dodatkowymi polami projekcji (przed kolumną "Błąd")."""
+    return KOLUMNY_WYNIKU[:-1] + projekcja.klucze + KOLUMNY_WYNIKU[-1:]
+
+# --- Wczytywanie NIPów ---
+
+
+def _wiersze_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        probka = f.read(4096)
+        f.seek(0)
+        try:
+            dialekt = csv.Sniffer().sniff(probka, delimiters=",;\t")
+        except csv.Error:
+            dialekt = csv.excel
+        yield from csv.reader(f, dialekt)
+
+
+def _wiersze_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Wczytywanie plików XLSX wymaga pakietu openpyxl (pip install openpyxl).")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield ["" if v is None else str(v) for v in row]
+    finally:
+        wb.close()
+
+
+def read_nips(path, odrzucone=None):
+    """Czyta NIPy z pliku CSV, XLSX lub tekstowego (jeden na linię), bez duplikatów.
+
+    W plikach tabelarycznych brana jest kolumna z nagłówkiem "NIP", a gdy jej nie ma - pierwsza.
+    Spacje, myślniki i przedrostek PL są usuwane, a wartości z niepoprawną
+    sumą kontrolną trafiają (z powodem) do listy `odrzucone`, jeśli ją podano.
+    """
+    rozszerzenie = os.path.splitext(path)[1].lower()
+    if rozszerzenie == ".xlsx":
+        wiersze = _wiersze_xlsx(path)
+    else:
+        wiersze = _wiersze_csv(path)
+
+    def wartosci():
+        kolumna = 0
+        for i, wiersz in enumerate(wiersze):
+            if not wiersz:
+                continue
+            if i == 0:
+                naglowki = [k.strip().upper() for k in wiersz]
+                if "NIP" in naglowki:
+                    kolumna = naglowki.index("NIP")
+                    continue
+            if kolumna < len(wiersz):
+                yield wiersz[kolumna]
+
+    return filtruj_nipy(wartosci(), odrzucone)
+
+# --- Zapis wyników ---
+
+
+def read_done(path):
+    """NIPy (i odrzucone wartości), które mają już ostateczny wynik w pliku wyjściowym - do wznawiania przebiegu."""
+    return {
+        wiersz.get("NIP") for wiersz in read_results(path, ["NIP", "Status"])
+        if wiersz.get("Status") in (STATUS_OK, STATUS_BRAK, STATUS_NIEPOPRAWNY)
+    }
+
+# --- Silnik wsadowy ---
+
+
+def _sprawdz(nipy, klucz, sesje, odrzucone, cache, force_refresh, projekcja=PODSTAWOWA):
+    """Sprawdza paczkę NIPów jednym wyszukiwaniem zbiorczym; zwraca listę wierszy wyniku.
+
+    Błędy przejściowe ponawia już klient sesji; przy błędzie klucza API NIPy
+    trafiają do `odrzucone` (DeadLetterList).
+    """
+    wiersze = {nip: {"NIP": nip} for nip in nipy}
+    dane = {nip: cache.get(nip) if cache is not None and not force_refresh else None for nip in nipy}
+    do_pobrania = []
+    for nip in nipy:
+        if dane[nip] is not None and all(k in dane[nip] for k in projekcja.klucze):
+            continue
+        dane[nip] = None
+        do_pobrania.append(("nip", nip))
+    if do_pobrania:
+        try:
+            # Pamięć podręczna została już sprawdzona - tu tylko zapisujemy do niej wyniki z GUS.
+            pobrane = pobierz_dane_wiele(do_pobrania, klucz, sesje, cache, force_refresh=True,
+                                         projekcja=projekcja)
+        except Exception as e:
+            for _, nip in do_pobrania:
+                wiersze[nip]["Status"] = STATUS_BLAD
+                wiersze[nip]["Błąd"] = str(e)
+                if is_auth_error(e):
+                    odrzucone.add(nip, e)
+        else:
+            for (_, nip), wynik in pobrane.items():
+                dane[nip] = wynik
+                wiersze[nip]["Status"] = STATUS_OK if wynik is not None else STATUS_BRAK
+    # Wpis z pamięci podręcznej mógł powstać przy innej projekcji - do wiersza trafiają tylko kolumny bieżącej.
+    pola = KLUCZE_DANYCH + projekcja.klucze
+    for nip, wiersz in wiersze.items():
+        if dane[nip] is not None:
+            wiersz["Status"] = STATUS_OK
+            wiersz.update({k: dane[nip].get(k) for k in pola})
+        wiersz.setdefault("Status", STATUS_BRAK)
+    return list(wiersze.values())
+
+
+def run_batch(nipy, klucz, output, workers=4, rate=DOMYSLNY_LIMIT, sesje=None, on_result=None,
+              cache=None, force_refresh=False, projekcja=PODSTAWOWA, row_group=ROW_GROUP, dead_letter=None,
+              niepoprawne=None):
+    """Sprawdza NIPy w `workers` wątkach i dopisuje wyniki do pliku `output`.
+
+    Format pliku (CSV, JSONL, Parquet, Arrow) wynika z rozszerzenia - patrz
+    regon_core.eksport; pliki kolumnowe są zapisywane grupami po `row_group` wierszy.
+
+    Każde zadanie to paczka do MAX_W_ZAPYTANIU NIPów sprawdzana jednym
+    wyszukiwaniem zbiorczym. Z `cache` (ResultCache) brane są aktualne wyniki, a limit wywołań dotyczy
+    tylko zapytań do GUS. `projekcja` (Projekcja) dodaje do wyników kolumny
+    z wybranymi polami raportu i listą PKD.
+
+    `rate` to pułap zapytań HTTP na sekundę wspólnego AdaptiveLimitera sesji
+    (przy podanych `sesje` obowiązuje ich własny limiter). Po błędzie klucza
+    API kolejne paczki nie są wysyłane, a odrzucone NIPy trafiają do pliku
+    JSONL `dead_letter`.
+
+    NIPy są najpierw normalizowane i deduplikowane, a te z niepoprawną sumą
+    kontrolną odrzucane lokalnie (licznik "niepoprawne", wiersz ze statusem
+    "niepoprawny") - nie kosztują zapytania do GUS. NIPy i odrzucone wartości
+    z ostatecznym wynikiem w `output` są pomijane, więc przerwany przebieg
+    można wznowić tym samym poleceniem bez powielania wierszy. Wartości
+    odrzucone już przy wczytaniu (`read_nips`) można przekazać w `niepoprawne`.
+    Zwraca liczniki statusów.
+    """
+    niepoprawne = list(niepoprawne or ())
+    nipy = filtruj_nipy(nipy, niepoprawne)
+    gotowe = read_done(output)
+    niesprawdzone = [nip for nip in nipy if nip not in gotowe]
+    do_sprawdzenia = iter(niesprawdzone)
+    # Plik z innymi kolumnami zgłasza ValueError, zanim powstanie pula sesji.
+    writer = open_writer(output, kolumny_wyniku(projekcja), row_group)
+    wlasne_sesje = sesje is None
+    if wlasne_sesje:
+        sesje = SessionManager(max_sessions=workers, limiter=AdaptiveLimiter(rate))
+    odrzucone = DeadLetterList(dead_letter)
+    liczniki = {STATUS_OK: 0, STATUS_BRAK: 0, STATUS_BLAD: 0, "pominięte": len(nipy) - len(niesprawdzone),
+                "niepoprawne": len(niepoprawne)}
+
+    try:
+        # Odrzucone wartości są zapisywane raz - przy wznowieniu są już w pliku.
+        writer.write_many([
+            {"NIP": str(wartosc).strip(), "Status": STATUS_NIEPOPRAWNY, "Błąd": f"Niepoprawny NIP ({powod})."}
+            for wartosc, powod in niepoprawne if str(wartosc).strip() not in gotowe
+        ])
+        with ThreadPoolExecutor(max_workers=workers) as pula:
+            w_toku = set()
+            wyczerpane = False
+            while True:
+                # Klucz API odrzucony - pozostałe NIPy czekają na ponowne uruchomienie z poprawnym kluczem.
+                wyczerpane = wyczerpane or len(odrzucone) > 0
+                # Najwyżej dwa zadania na wątek w kolejce - lista wejściowa może być bardzo długa.
+                while not wyczerpane and len(w_toku) < workers * 2:
+                    paczka = list(islice(do_sprawdzenia, MAX_W_ZAPYTANIU))
+                    if not paczka:
+                        wyczerpane = True
+                        break
+                    w_toku.add(pula.submit(_sprawdz, paczka, klucz, sesje, odrzucone, cache,
+                                           force_refresh, projekcja))
+                if not w_toku:
+                    break
+                zakonczone, w_toku = wait(w_toku, return_when=FIRST_COMPLETED)
+                for zadanie in zakonczone:
+                    wiersze = zadanie.result()
+                    writer.write_many(wiersze)
+                    for wiersz in wiersze:
+                        liczniki[wiersz["Status"]] += 1
+                        if on_result:
+                            on_result(wiersz)
+    finally:
+        writer.close()
+        if wlasne_sesje:
+            sesje.close()
+    liczniki["odrzucone"] = len(odrzucone)
+    return liczniki
+
+
+def main(argv=None):
+    """Odpowiednik `regon-cli batch`."""
+    from .cli import main as cli_main
+    return cli_main(["batch"] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
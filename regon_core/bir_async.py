@@ -0,0 +1,358 @@
+"""Asynchroniczny klient BIR1 (asyncio) z pulą połączeń HTTP keep-alive.
+
+W przeciwieństwie do litex.regon (nowe połączenie przy każdym wywołaniu)
+klient utrzymuje otwarte połączenia z usługą i jeden SID dla wszystkich
+zapytań, a liczbę równoczesnych wyszukiwań ogranicza semafor `max_in_flight`.
+
+Użycie:
+    async with AsyncREGONClient(klucz) as klient:
+        wyniki = await asyncio.gather(*(klient.pobierz_dane(nip) for nip in nipy))
+
+Klient można testować z atrapą usługi z regon_core.mock_bir.
+"""
+import asyncio
+import re
+import ssl
+from urllib.parse import urlsplit
+
+from .gus import KOD_BRAK_DANYCH, dane_z_odpowiedzi
+from .metryki import METRYKI
+from .sesja import SERVICE_URL, is_session_error
+from .walidacja import sprawdz
+
+# --- Konfiguracja i stałe ---
+
+MAX_CONNECTIONS = 4
+MAX_IN_FLIGHT = 8
+TIMEOUT = 30
+
+_NAMESPACES = {
+    'bir': 'http://CIS/BIR/PUBL/2014/07',
+    'pb': 'http://CIS/BIR/2014/07',
+}
+_ENVELOPE_RE = re.compile(rb"<(\w+:|)Envelope[\s>].*?</\1Envelope>", re.S)
+# Fazy w metrykach (regon_core.metryki) dla mierzonych operacji.
+_FAZY = {
+    "bir:ZalogujResult": "login",
+    "bir:DaneSzukajPodmiotyResult": "search",
+    "bir:DanePobierzPelnyRaportResult": "report",
+}
+
+
+class AsyncREGONError(RuntimeError):
+    """Błąd zwrócony przez usługę BIR1 (komunikaty jak w litex.regon)."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+    def __str__(self):
+        return f"<REGONAPIError [{self.code}] {self.message}>"
+
+# --- HTTP/1.1 z utrzymywaniem połączeń ---
+
+
+class _ConnectionPool:
+    """Pula połączeń HTTP/1.1 keep-alive do jednego hosta."""
+
+    def __init__(self, url, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT):
+        czesci = urlsplit(url)
+        self.https = czesci.scheme == "https"
+        self.host = czesci.hostname
+        self.port = czesci.port or (443 if self.https else 80)
+        self.path = czesci.path or "/"
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.opened = 0
+        self._wolne = []
+        self._limit = None
+
+    async def _otworz(self):
+        kontekst = ssl.create_default_context() if self.https else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=kontekst), self.timeout
+        )
+        self.opened += 1
+        return reader, writer
+
+    async def post(self, body, headers):
+        """Wysyła POST i zwraca (status, nagłówki, treść). Zerwane połączenie z puli jest ponawiane raz."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_connections)
+        async with self._limit:
+            for proba in range(2):
+                z_puli = bool(self._wolne)
+                polaczenie = self._wolne.pop() if z_puli else await self._otworz()
+                try:
+                    status, naglowki, dane, keep_alive = await asyncio.wait_for(
+                        self._wyslij(polaczenie, body, headers), self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    polaczenie[1].close()
+                    # Serwer mógł zamknąć bezczynne połączenie - próbujemy na nowym.
+                    if z_puli and proba == 0:
+                        continue
+                    raise
+                except BaseException:
+                    polaczenie[1].close()
+                    raise
+                if keep_alive:
+                    self._wolne.append(polaczenie)
+                else:
+                    polaczenie[1].close()
+                return status, naglowki, dane
+
+    async def _wyslij(self, polaczenie, body, headers):
+        reader, writer = polaczenie
+        linie = [f"POST {self.path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}",
+                 "Connection: keep-alive"]
+        linie += [f"{k}: {v}" for k, v in headers.items() if v is not None]
+        writer.write(("\r\n".join(linie) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status = int((await reader.readuntil(b"\r\n")).split()[1])
+        naglowki = {}
+        while True:
+            linia = await reader.readuntil(b"\r\n")
+            if linia == b"\r\n":
+                break
+            klucz, _, wartosc = linia.decode("latin-1").partition(":")
+            naglowki[klucz.strip().lower()] = wartosc.strip()
+
+        keep_alive = naglowki.get("connection", "").lower() != "close"
+        if naglowki.get("transfer-encoding", "").lower() == "chunked":
+            czesci = []
+            while True:
+                rozmiar = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if rozmiar == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                czesci.append(await reader.readexactly(rozmiar))
+                await reader.readexactly(2)
+            dane = b"".join(czesci)
+        elif "content-length" in naglowki:
+            dane = await reader.readexactly(int(naglowki["content-length"]))
+        else:
+            dane = await reader.read()
+            keep_alive = False
+        return status, naglowki, dane, keep_alive
+
+    def close(self):
+        for _, writer in self._wolne:
+            writer.close()
+        self._wolne.clear()
+
+# --- Klient BIR1 ---
+
+
+class AsyncREGONClient:
+    """Klient BIR1 dla asyncio: logowanie, wyszukiwanie po NIP, pełny raport i wylogowanie."""
+
+    def __init__(self, api_key, service_url=SERVICE_URL, max_connections=MAX_CONNECTIONS,
+                 max_in_flight=MAX_IN_FLIGHT, timeout=TIMEOUT):
+        self.api_key = api_key
+        self.service_url = service_url
+        self.sid = None
+        self.max_in_flight = max_in_flight
+        self._pula = _ConnectionPool(service_url, max_connections, timeout)
+        # Semafor i blokada powstają przy pierwszym użyciu, w działającej pętli: w Pythonie 3.9
+        # prymityw asyncio utworzony poza pętlą wiąże się z pętlą domyślną i zawodzi pod asyncio.run.
+        self._semafor = None
+        self._blokada = None
+
+    @property
+    def _w_toku(self):
+        if self._semafor is None:
+            self._semafor = asyncio.Semaphore(self.max_in_flight)
+        return self._semafor
+
+    @property
+    def _logowanie(self):
+        if self._blokada is None:
+            self._blokada = asyncio.Lock()
+        return self._blokada
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _call(self, envelope, wynik, **args):
+        """Wywołuje operację SOAP i zwraca tekst elementu wyniku (albo None)."""
+        from lxml import etree
+
+        body = envelope.format(api=self, **args).encode("utf-8")
+        naglowki = {"Content-Type": "application/soap+xml; charset=utf-8", "sid": self.sid}
+        if wynik in _FAZY:
+            with METRYKI.span(_FAZY[wynik]):
+                status, _, dane = await self._pula.post(body, naglowki)
+        else:
+            status, _, dane = await self._pula.post(body, naglowki)
+        m = _ENVELOPE_RE.search(dane)
+        if m is None:
+            raise AsyncREGONError(f"Nieprawidłowa odpowiedź usługi (HTTP {status}).", status)
+        tekst = etree.fromstring(m.group(0)).xpath(f"//{wynik}/text()", namespaces=_NAMESPACES)
+        return str(tekst[0]) if tekst else None
+
+    async def login(self):
+        """Loguje się kluczem API; równoczesne wywołania czekają na jedno logowanie."""
+        from litex.regon.envelopes import LOGIN_ENVELOPE
+
+        sid_przed = self.sid
+        async with self._logowanie:
+            if self.sid is not None and self.sid != sid_przed:
+                return self.sid
+            self.sid = None
+            sid = await self._call(LOGIN_ENVELOPE, "bir:ZalogujResult", user_key=self.api_key)
+            if not sid:
+                raise AsyncREGONError("Login failed.")
+            self.sid = sid
+            return sid
+
+    async def logout(self):
+        from litex.regon.envelopes import LOGOUT_ENVELOPE
+
+        if not self.sid:
+            raise AsyncREGONError("Not logged in.")
+        wynik = await self._call(LOGOUT_ENVELOPE, "bir:WylogujResult")
+        self.sid = None
+        if wynik != "true":
+            raise AsyncREGONError("Logout failed.")
+        return True
+
+    async def close(self):
+        try:
+            if self.sid:
+                await self.logout()
+        except Exception:
+            pass
+        finally:
+            self._pula.close()
+
+    async def _get_value(self, param):
+        from litex.regon.envelopes import GET_VALUE_ENVELOPE
+        return await self._call(GET_VALUE_ENVELOPE, "pb:GetValueResult", param=param) or ""
+
+    async def _raise_detailed_error(self):
+        kod = int(await self._get_value("KomunikatKod") or 0)
+        if kod != 0:
+            raise AsyncREGONError(await self._get_value("KomunikatTresc"), kod)
+
+    async def _w_sesji(self, operacja):
+        # Odrzucony SID: logujemy się ponownie i powtarzamy operację raz.
+        if self.sid is None:
+            await self.login()
+        try:
+            return await operacja()
+        except Exception as e:
+            if not is_session_error(e):
+                raise
+        await self.login()
+        return await operacja()
+
+    async def search(self, nip=None, regon=None, krs=None, nips=None, regons=None, krss=None, detailed=False):
+        """Odpowiednik REGONAPI.search: lista elementów `dane` (z `detailed` przy detailed=True)."""
+        async with self._w_toku:
+            return await self._w_sesji(
+                lambda: self._search(nip, regon, krs, nips, regons, krss, detailed)
+            )
+
+    async def _search(self, nip, regon, krs, nips, regons, krss, detailed):
+        from litex.regon.envelopes import SEARCH_ENVELOPE
+        from lxml import objectify
+
+        param = ""
+        for nazwa, wartosc in (("Nip", nip), ("Regon", regon), ("Krs", krs)):
+            if wartosc:
+                param += f"<dat:{nazwa}>{wartosc}</dat:{nazwa}>"
+        if nips:
+            param += f"<dat:Nipy>{''.join(nips)}</dat:Nipy>"
+        if krss:
+            param += f"<dat:Krsy>{''.join(krss)}</dat:Krsy>"
+        if regons:
+            nazwa = "Regony9zn" if len(regons[0]) == 9 else "Regony14zn"
+            param += f"<dat:{nazwa}>{''.join(regons)}</dat:{nazwa}>"
+        if not param:
+            raise AsyncREGONError("You have to pass at least one of: nip(s), regon(s) or krs(s) parameters.")
+
+        wynik = await self._call(SEARCH_ENVELOPE, "bir:DaneSzukajPodmiotyResult", param=param)
+        if not wynik:
+            raise AsyncREGONError("No response received. Are you logged in?")
+
+        wyniki = list(objectify.fromstring(wynik).dane)
+        kod = getattr(wyniki[0], "ErrorCode", None)
+        if kod is not None:
+            raise AsyncREGONError(str(wyniki[0].ErrorMessageEn), str(kod))
+        if detailed:
+            await asyncio.gather(*(self._dolacz_raport(rs) for rs in wyniki))
+        return wyniki
+
+    async def _dolacz_raport(self, rs):
+        # Ta sama logika co w REGONAPI.search(detailed=True).
+        from litex.regon import detailed_report_names_map, extended_report_names_map
+        from lxml import objectify
+
+        regon = rs.Regon.text.strip()
+        if len(regon) < 9:
+            regon = regon.zfill(9)
+        elif 9 < len(regon) < 14:
+            regon = regon.zfill(14)
+        try:
+            rs.detailed = await self._full_report(regon, detailed_report_names_map.get(str(rs.SilosID)))
+        except AsyncREGONError:
+            rs.detailed = objectify.Element("detailed")
+        rozszerzony = extended_report_names_map.get(str(rs.Typ))
+        if rozszerzony:
+            dodatkowe = await self._full_report(regon, rozszerzony)
+            rs.detailed.extend(dodatkowe.getchildren())
+
+    async def full_report(self, regon, report_name):
+        async with self._w_toku:
+            return await self._w_sesji(lambda: self._full_report(regon, report_name))
+
+    async def _full_report(self, regon, report_name):
+        from litex.regon.envelopes import FULL_REPORT_ENVELOPE
+        from lxml import objectify
+
+        wynik = await self._call(
+            FULL_REPORT_ENVELOPE, "bir:DanePobierzPelnyRaportResult", regon=regon, report_name=report_name
+        )
+        if wynik:
+            elementy = objectify.fromstring(wynik).findall(".//dane")
+            if len(elementy) > 1:
+                return elementy
+            if elementy:
+                return elementy[0]
+        await self._raise_detailed_error()
+        raise AsyncREGONError("Empty report.")
+
+    async def pobierz_dane(self, nip):
+        """Jak pobierz_dane(): `dane_do_raportu` dla NIPu albo None, gdy GUS nie zwrócił wyniku."""
+        sprawdz("nip", nip)
+        with METRYKI.span("lookup", nip=nip):
+            try:
+                wyniki = await self.search(nip=nip, detailed=True)
+            except AsyncREGONError as e:
+                # Brak podmiotu to wynik, a nie błąd - pobierz_wiele nie może go zgłaszać jako wyjątku.
+                if str(e.code) == KOD_BRAK_DANYCH:
+                    return None
+                raise
+        if not wyniki:
+            return None
+        with METRYKI.span("parse"):
+            return dane_z_odpowiedzi(wyniki[0])
+
+
+async def pobierz_wiele(nipy, api_key, service_url=SERVICE_URL, max_in_flight=MAX_IN_FLIGHT,
+                        max_connections=MAX_CONNECTIONS):
+    """Pobiera dane dla wielu NIPów w jednej sesji. Zwraca {nip: dane albo wyjątek}.
+
+    Powtórzone NIPy są sprawdzane raz, a niepoprawne dostają ValueError bez zapytania do GUS.
+    """
+    nipy = list(dict.fromkeys(nipy))
+    async with AsyncREGONClient(api_key, service_url, max_connections, max_in_flight) as klient:
+        wyniki = await asyncio.gather(*(klient.pobierz_dane(nip) for nip in nipy), return_exceptions=True)
+    return dict(zip(nipy, wyniki))
@@ -0,0 +1,125 @@
+import json
+import sqlite3
+import threading
+import time
+
+# --- Konfiguracja i stałe ---
+
+CACHE_FILE = "regon_cache.sqlite"
+# Jak długo wynik z GUS jest uznawany za aktualny (w sekundach).
+CACHE_TTL = 24 * 60 * 60
+# Po przekroczeniu tej liczby wpisów usuwane są najdawniej używane (do 90% limitu).
+CACHE_MAX_ENTRIES = 10000
+# Co tyle trafień czasy użycia są zapisywane do bazy (jeden commit zamiast jednego na trafienie).
+UZYCIA_PACZKA = 100
+
+
+class ResultCache:
+    """Trwała pamięć podręczna wyników REGON (SQLite) z TTL i usuwaniem LRU.
+
+    Dla każdego NIPu przechowuje słownik `dane_do_raportu` i surowy XML
+    raportu szczegółowego. Liczy trafienia i chybienia w `hits`/`misses`.
+    Trafienie niczego nie zapisuje od razu - czas użycia (dla LRU) trafia
+    do bazy paczkami po UZYCIA_PACZKA, przy zapisie nowego wyniku lub przy zamknięciu.
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._uzycia = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # W trybie WAL NORMAL nie synchronizuje dysku przy każdym commit; po awarii systemu
+        # można stracić najwyżej ostatnie wpisy, które i tak da się pobrać ponownie z GUS.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS wyniki ("
+            " nip TEXT PRIMARY KEY,"
+            " dane TEXT NOT NULL,"
+            " xml TEXT,"
+            " pobrano REAL NOT NULL,"
+            " uzyto REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS wyniki_uzyto ON wyniki (uzyto)")
+        self._db.commit()
+        self._wpisy = self._db.execute("SELECT COUNT(*) FROM wyniki").fetchone()[0]
+
+    def _zapisz_uzycia(self):
+        # Wywoływane pod self._lock.
+        if self._uzycia:
+            self._db.executemany("UPDATE wyniki SET uzyto = ? WHERE nip = ?",
+                                 [(czas, nip) for nip, czas in self._uzycia.items()])
+            self._uzycia.clear()
+
+    def get_entry(self, nip):
+        """Zwraca (dane, xml) dla NIPu albo None, gdy brak wpisu lub wygasł."""
+        teraz = time.time()
+        with self._lock:
+            wiersz = self._db.execute(
+                "SELECT dane, xml, pobrano FROM wyniki WHERE nip = ?", (nip,)
+            ).fetchone()
+            if wiersz is None or teraz - wiersz[2] > self.ttl:
+                if wiersz is not None:
+                    self._usun(nip)
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._uzycia[nip] = teraz
+            if len(self._uzycia) >= UZYCIA_PACZKA:
+                self._zapisz_uzycia()
+                self._db.commit()
+            self.hits += 1
+        return json.loads(wiersz[0]), wiersz[1]
+
+    def get(self, nip):
+        """Zwraca `dane_do_raportu` dla NIPu albo None."""
+        wpis = self.get_entry(nip)
+        return wpis[0] if wpis else None
+
+    def put(self, nip, dane, xml=None):
+        teraz = time.time()
+        with self._lock:
+            nowy = self._db.execute("SELECT 1 FROM wyniki WHERE nip = ?", (nip,)).fetchone() is None
+            self._db.execute(
+                "INSERT OR REPLACE INTO wyniki (nip, dane, xml, pobrano, uzyto) VALUES (?, ?, ?, ?, ?)",
+                (nip, json.dumps(dane, ensure_ascii=False), xml, teraz, teraz),
+            )
+            self._uzycia.pop(nip, None)
+            self._wpisy += nowy
+            if self._wpisy > self.max_entries:
+                # Kolejność LRU musi uwzględniać trafienia, które czekają jeszcze w pamięci.
+                self._zapisz_uzycia()
+                # Usuwamy z zapasem (do 90% limitu), żeby nie sprzątać przy każdym kolejnym wpisie.
+                self._db.execute(
+                    "DELETE FROM wyniki WHERE nip IN"
+                    " (SELECT nip FROM wyniki ORDER BY uzyto DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries - self.max_entries // 10,),
+                )
+                # Plik może współdzielić kilka procesów - licznik bierzemy z bazy.
+                self._wpisy = self._db.execute("SELECT COUNT(*) FROM wyniki").fetchone()[0]
+            self._db.commit()
+
+    def _usun(self, nip):
+        # Wywoływane pod self._lock.
+        self._uzycia.pop(nip, None)
+        self._wpisy -= self._db.execute("DELETE FROM wyniki WHERE nip = ?", (nip,)).rowcount
+
+    def invalidate(self, nip):
+        with self._lock:
+            self._usun(nip)
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            self._wpisy = self._db.execute("SELECT COUNT(*) FROM wyniki").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": self._wpisy}
+
+    def close(self):
+        with self._lock:
+            self._zapisz_uzycia()
+            self._db.commit()
+            self._db.close()
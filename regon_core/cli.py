@@ -0,0 +1,415 @@
+"""Wiersz poleceń klienta REGON (bez GUI).
+
+Użycie:
+    regon-cli lookup 5261040828 000331501 KRS0000312345
+    regon-cli batch kontrahenci.csv -o wyniki.jsonl --workers 4 --rate 10
+    regon-cli export 5261040828 -o raport.pdf
+    regon-cli export --from-results wyniki.jsonl --per-company raporty/
+    regon-cli export --from-results wyniki.jsonl --layout tabela -o zestawienie.pdf
+    regon-cli mirror refresh --max-age 7
+    regon-cli watch add --from kontrahenci.csv --risk 2
+    regon-cli watch run --daily-limit 20000 --events zmiany.jsonl
+    regon-cli serve --port 8000 --workers 8
+
+Moduły z zależnościami (litex.regon, lxml, fpdf) są importowane dopiero
+w poleceniach, które ich potrzebują, więc `--help` startuje natychmiast.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from .cache import CACHE_FILE
+from .eksport import ROW_GROUP
+from .klucz import KEY_FILE, read_api_key
+from .limiter import DOMYSLNY_LIMIT
+from .lustro import MIRROR_FILE, MIRROR_MAX_AGE
+from .metryki import METRICS_ENV, METRYKI, PROFILE_ENV
+from .obserwacja import DZIENNY_LIMIT, EVENTS_FILE, INTERWAL, OKRES, WATCHLIST_FILE
+from .pdf import UKLADY
+from .projekcja import GRUPY_POL, KLUCZ_PKD, PODSTAWOWA, Projekcja
+from .serwer import DOMYSLNE_WORKERS, DOMYSLNY_HOST, DOMYSLNY_PORT, MAX_BATCH
+
+
+def _wspolne_argumenty():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--key", help=f"klucz API (domyślnie REGON_API_KEY lub {KEY_FILE})")
+    parser.add_argument("--cache", default=CACHE_FILE, help=f"plik pamięci podręcznej (domyślnie {CACHE_FILE})")
+    parser.add_argument("--no-cache", action="store_true", help="nie korzystaj z pamięci podręcznej")
+    parser.add_argument("--force-refresh", action="store_true", help="pobierz dane z GUS, aktualizując pamięć podręczną")
+    parser.add_argument("--metrics", metavar="PLIK", default=os.environ.get(METRICS_ENV),
+                        help=f"zapisz czasy faz i liczniki błędów (.prom - Prometheus, inne - JSON; także {METRICS_ENV})")
+    parser.add_argument("--profile", metavar="PLIK", default=os.environ.get(PROFILE_ENV),
+                        help=f"zapisz profil cProfile zapytań i eksportu (także {PROFILE_ENV})")
+    return parser
+
+
+def _projekcja(tekst):
+    try:
+        return Projekcja.z_nazw(tekst)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _argument_pol(parser):
+    parser.add_argument("--fields", type=_projekcja, default=PODSTAWOWA, metavar="POLA",
+                        help=f"dodatkowe pola raportu: grupy {', '.join(GRUPY_POL)} lub nazwy pól praw_*, "
+                             "oddzielone przecinkami")
+
+
+def _otworz_cache(args):
+    if args.no_cache:
+        return None
+    from .cache import ResultCache
+    return ResultCache(args.cache)
+
+
+def _pobierz_wiele(args, klucz, identyfikatory):
+    """Zwraca listę par (numer, dane) w kolejności podanych NIPów, REGONów lub numerów KRS."""
+    from .gus import pobierz_dane_wiele, rozpoznaj_identyfikator
+    from .limiter import AdaptiveLimiter
+    from .sesja import SessionManager
+
+    pary = [rozpoznaj_identyfikator(i) for i in identyfikatory]
+    sesje = SessionManager(limiter=AdaptiveLimiter())
+    cache = _otworz_cache(args)
+    try:
+        wyniki = pobierz_dane_wiele(pary, klucz, sesje, cache, args.force_refresh,
+                                    projekcja=getattr(args, "fields", PODSTAWOWA))
+        return [(numer, wyniki[(rodzaj, numer)]) for rodzaj, numer in pary]
+    finally:
+        sesje.close()
+        if cache is not None:
+            cache.close()
+
+# --- Polecenia ---
+
+
+def cmd_lookup(args, klucz):
+    from .gus import format_dane
+
+    wyniki = _pobierz_wiele(args, klucz, args.nip)
+    kod = 0
+    for nip, dane in wyniki:
+        if dane is None:
+            print(f"Nie znaleziono podmiotu dla numeru: {nip}", file=sys.stderr)
+            kod = 1
+        elif args.json:
+            print(json.dumps({"NIP": nip, **dane}, ensure_ascii=False))
+        else:
+            print(format_dane(dane), end="")
+            for pole in args.fields.klucze:
+                if pole == KLUCZ_PKD:
+                    wartosc = ", ".join(f"{p['kod']}{' (przeważające)' if p['przewazajace'] else ''}"
+                                        for p in dane[pole])
+                else:
+                    wartosc = dane.get(pole) or ""
+                print(f"{pole}: {wartosc}")
+            print()
+    return kod
+
+
+def cmd_export(args, klucz):
+    from .batch import STATUS_OK
+    from .eksport import read_results
+    from .pdf import ReportTemplate, export_pdf_batch, get_current_date
+
+    if args.from_results:
+        wyniki = [(w["NIP"], w) for w in read_results(args.from_results) if w.get("Status") == STATUS_OK]
+    elif args.nip:
+        if not klucz:
+            print("Pobieranie danych z GUS wymaga klucza API (albo użyj --from-results).", file=sys.stderr)
+            return 2
+        wyniki = _pobierz_wiele(args, klucz, args.nip)
+    else:
+        print("Podaj NIPy albo --from-results.", file=sys.stderr)
+        return 1
+    brakujace = [nip for nip, dane in wyniki if dane is None]
+    if brakujace:
+        print(f"Nie znaleziono podmiotów dla numerów: {', '.join(brakujace)}", file=sys.stderr)
+        return 1
+    if not wyniki:
+        print("Brak danych do wyeksportowania do PDF.", file=sys.stderr)
+        return 1
+
+    data = get_current_date()
+    raporty = [(f"REGON_Raport_{nip}_{data}", dane) for nip, dane in wyniki]
+    if args.per_company:
+        output = args.per_company
+    else:
+        output = args.output or f"{raporty[0][0]}.pdf"
+    szablon = ReportTemplate.z_projekcja(args.fields, uklad=args.layout)
+    stats = export_pdf_batch(raporty, output, per_company=bool(args.per_company), processes=args.processes,
+                             szablon=szablon)
+    print(f"Raport zapisano do: {output}")
+    print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+    return 0
+
+
+def cmd_batch(args, klucz):
+    from .batch import ODRZUCONE_SUFFIX, read_nips, run_batch
+
+    niepoprawne = []
+    nipy = read_nips(args.input, niepoprawne)
+    if niepoprawne:
+        przyklady = ", ".join(f"{wartosc} ({powod})" for wartosc, powod in niepoprawne[:5])
+        print(f"Pominięto niepoprawne NIPy ({len(niepoprawne)}), np.: {przyklady}", file=sys.stderr)
+    if args.mirror:
+        from .lustro import EntityMirror
+        # Lustro zastępuje pamięć podręczną: zapisuje wyniki na stałe i odpowiada z nich lokalnie.
+        cache = EntityMirror(args.mirror)
+    else:
+        cache = _otworz_cache(args)
+    try:
+        liczniki = run_batch(nipy, klucz, args.output, workers=args.workers, rate=args.rate,
+                             cache=cache, force_refresh=args.force_refresh, projekcja=args.fields,
+                             row_group=args.row_group, dead_letter=args.output + ODRZUCONE_SUFFIX,
+                             niepoprawne=niepoprawne)
+        print(", ".join(f"{k}: {v}" for k, v in liczniki.items()))
+        if cache is not None:
+            print("pamięć podręczna: " + ", ".join(f"{k}: {v}" for k, v in cache.stats().items()))
+    finally:
+        if cache is not None:
+            cache.close()
+    if liczniki["odrzucone"]:
+        print(f"Klucz API jest niepoprawny lub wygasł - przerwano. Odrzucone NIPy: {args.output}{ODRZUCONE_SUFFIX}; "
+              "pozostałe zostaną sprawdzone po ponownym uruchomieniu.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_mirror(args, klucz):
+    from .lustro import EntityMirror, MirrorRefresher
+
+    lustro = EntityMirror(args.file)
+    try:
+        if args.action == "lookup":
+            from .gus import format_dane
+            kod = 0
+            for numer in args.numery:
+                dane = lustro.lookup(numer)
+                if dane is None:
+                    print(f"Brak podmiotu w lustrze: {numer}", file=sys.stderr)
+                    kod = 1
+                elif args.json:
+                    print(json.dumps(dane, ensure_ascii=False))
+                else:
+                    print(format_dane(dane))
+            return kod
+        if args.action == "refresh":
+            if not klucz:
+                print("Odświeżanie wymaga klucza API.", file=sys.stderr)
+                return 2
+            from .limiter import AdaptiveLimiter
+            from .sesja import SessionManager
+            sesje = SessionManager(limiter=AdaptiveLimiter(args.rate))
+            try:
+                odswiezanie = MirrorRefresher(lustro, klucz, sesje, max_age=args.max_age * 24 * 60 * 60,
+                                              limit=args.limit)
+                liczniki = odswiezanie.run_once()
+            finally:
+                sesje.close()
+            print(", ".join(f"{k}: {v}" for k, v in liczniki.items()))
+        elif args.action == "changes":
+            if not args.output:
+                print("Podaj plik dziennika zmian (-o).", file=sys.stderr)
+                return 1
+            ostatnia = lustro.export_changes(args.output, args.since)
+            print(f"Zmiany zapisano do: {args.output} (ostatnia zmiana: {ostatnia})")
+        print(", ".join(f"{k}: {v}" for k, v in lustro.stats().items()))
+        return 0
+    finally:
+        lustro.close()
+
+
+def cmd_watch(args, klucz):
+    from .obserwacja import JsonlSink, Watchlist, WatchScheduler, WebhookSink
+
+    lista = Watchlist(args.file, okres=args.period_days * 24 * 60 * 60)
+    try:
+        if args.action in ("add", "remove"):
+            numery = list(args.numery)
+            if args.from_file:
+                from .batch import read_nips
+                niepoprawne = []
+                numery += read_nips(args.from_file, niepoprawne)
+                if niepoprawne:
+                    print(f"Pominięto niepoprawne NIPy: {len(niepoprawne)}", file=sys.stderr)
+            if not numery:
+                print("Podaj NIPy albo --from.", file=sys.stderr)
+                return 1
+            if args.action == "add":
+                print(f"Dodano do obserwacji: {lista.add(numery, args.risk)}")
+            else:
+                from .gus import rozpoznaj_identyfikator
+                print(f"Usunięto z obserwacji: {lista.remove([rozpoznaj_identyfikator(n)[1] for n in numery])}")
+        elif args.action == "run":
+            if not klucz:
+                print("Sprawdzanie wymaga klucza API.", file=sys.stderr)
+                return 2
+            from .limiter import AdaptiveLimiter
+            from .sesja import SessionManager
+            sink = WebhookSink(args.webhook) if args.webhook else JsonlSink(args.events)
+            sesje = SessionManager(limiter=AdaptiveLimiter(args.rate))
+            harmonogram = WatchScheduler(lista, klucz, sesje, sink, dzienny_limit=args.daily_limit,
+                                         interval=args.interval)
+            try:
+                if args.once:
+                    liczniki = harmonogram.run_once(args.budget)
+                else:
+                    print(f"Obserwacja działa: do {args.daily_limit} zapytań na dobę (Ctrl+C kończy pracę)")
+                    harmonogram.start()
+                    try:
+                        while True:
+                            time.sleep(1)
+                    except KeyboardInterrupt:
+                        pass
+                    harmonogram.stop()
+                    liczniki = harmonogram.liczniki
+            finally:
+                sesje.close()
+            print(", ".join(f"{k}: {v}" for k, v in liczniki.items()))
+        print(", ".join(f"{k}: {v}" for k, v in lista.stats().items()))
+        return 0
+    finally:
+        lista.close()
+
+
+def cmd_serve(args, klucz):
+    from .serwer import RegonServer
+
+    if args.mirror:
+        from .lustro import EntityMirror
+        cache = EntityMirror(args.mirror)
+    else:
+        cache = _otworz_cache(args)
+    serwer = RegonServer(klucz, args.host, args.port, cache=cache, workers=args.workers, rate=args.rate,
+                         max_batch=args.max_batch)
+    print(f"Serwer REGON działa pod adresem {serwer.url} (Ctrl+C kończy pracę)")
+    try:
+        serwer.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serwer.stop()
+        if cache is not None:
+            cache.close()
+    return 0
+
+
+def build_parser():
+    wspolne = _wspolne_argumenty()
+    parser = argparse.ArgumentParser(prog="regon-cli", description="Klient bazy REGON (GUS BIR1).")
+    polecenia = parser.add_subparsers(dest="command", required=True)
+
+    p = polecenia.add_parser("lookup", parents=[wspolne], help="wyszukaj podmioty po NIP, REGON lub KRS")
+    p.add_argument("nip", nargs="+", metavar="NUMER",
+                   help='NIP (10 cyfr), REGON (9 lub 14 cyfr) albo numer KRS z przedrostkiem, np. "KRS0000312345"')
+    p.add_argument("--json", action="store_true", help="wypisz wyniki jako JSON (jeden wiersz na podmiot)")
+    _argument_pol(p)
+    p.set_defaults(handler=cmd_lookup)
+
+    p = polecenia.add_parser("batch", parents=[wspolne], help="sprawdź NIPy z pliku")
+    p.add_argument("input", help="plik z NIPami (.csv, .xlsx lub .txt)")
+    p.add_argument("-o", "--output", required=True,
+                   help="plik wynikowy (.csv, .jsonl, .parquet lub .arrow - dwa ostatnie wymagają pyarrow)")
+    p.add_argument("--row-group", type=int, default=ROW_GROUP,
+                   help=f"liczba wierszy w grupie zapisu Parquet/Arrow (domyślnie {ROW_GROUP})")
+    p.add_argument("--workers", type=int, default=4, help="liczba równoległych sesji (domyślnie 4)")
+    p.add_argument("--rate", type=float, default=DOMYSLNY_LIMIT,
+                   help=f"pułap zapytań HTTP na sekundę, obniżany automatycznie przy błędach i przeciążeniu GUS "
+                        f"(domyślnie {DOMYSLNY_LIMIT}, 0 = bez limitu)")
+    p.add_argument("--mirror", metavar="PLIK", help="zapisuj wyniki w lokalnym lustrze (zamiast pamięci podręcznej)")
+    _argument_pol(p)
+    p.set_defaults(handler=cmd_batch)
+
+    p = polecenia.add_parser("export", parents=[wspolne], help="zapisz raport PDF dla podanych NIPów")
+    p.add_argument("nip", nargs="*")
+    p.add_argument("--from-results", metavar="PLIK", help="weź dane z pliku wynikowego polecenia batch zamiast z GUS")
+    p.add_argument("-o", "--output", help="jeden plik PDF dla wszystkich firm (domyślnie REGON_Raport_<NIP>_<data>.pdf)")
+    p.add_argument("--per-company", metavar="KATALOG", help="osobny plik PDF dla każdej firmy w podanym katalogu")
+    p.add_argument("--processes", type=int, help="liczba procesów przy --per-company (domyślnie liczba rdzeni)")
+    p.add_argument("--layout", choices=UKLADY, default=UKLADY[0],
+                   help="karta - każda firma jako tabela pól, kolejne firmy jedna pod drugą; "
+                        "tabela - zestawienie z wierszem na firmę (domyślnie karta)")
+    _argument_pol(p)
+    p.set_defaults(handler=cmd_export, key_optional=True)
+
+    p = polecenia.add_parser("mirror", help="lokalne lustro podmiotów: wyszukiwanie, odświeżanie, dziennik zmian")
+    p.add_argument("action", choices=["lookup", "refresh", "changes", "stats"])
+    p.add_argument("numery", nargs="*", metavar="NUMER", help="NIP, REGON lub KRS (dla lookup)")
+    p.add_argument("--file", default=MIRROR_FILE, help=f"plik lustra (domyślnie {MIRROR_FILE})")
+    p.add_argument("--key", help=f"klucz API dla refresh (domyślnie REGON_API_KEY lub {KEY_FILE})")
+    p.add_argument("--json", action="store_true", help="wypisz wyniki lookup jako JSON")
+    p.add_argument("--max-age", type=float, default=MIRROR_MAX_AGE / 86400,
+                   help="odśwież rekordy sprawdzone dawniej niż tyle dni temu")
+    p.add_argument("--limit", type=int, help="najwyżej tyle rekordów w jednym przebiegu refresh")
+    p.add_argument("--rate", type=float, default=DOMYSLNY_LIMIT, help="pułap zapytań HTTP na sekundę przy refresh")
+    p.add_argument("-o", "--output", help="plik dziennika zmian (.csv lub .jsonl) dla changes")
+    p.add_argument("--since", type=int, default=0, help="eksportuj zmiany o id większym niż podane")
+    p.set_defaults(handler=cmd_mirror, metrics=None, profile=None, key_optional=True)
+
+    p = polecenia.add_parser("watch", help="obserwowani kontrahenci: sprawdzanie w limicie zapytań i powiadomienia o zmianach")
+    p.add_argument("action", choices=["add", "remove", "run", "stats"])
+    p.add_argument("numery", nargs="*", metavar="NIP", help="NIPy dla add i remove")
+    p.add_argument("--from", dest="from_file", metavar="PLIK", help="weź NIPy z pliku (.csv, .xlsx lub .txt)")
+    p.add_argument("--risk", type=float, default=1.0,
+                   help="waga ryzyka dla add: podmiot o ryzyku 2 jest sprawdzany dwa razy częściej (domyślnie 1)")
+    p.add_argument("--file", default=WATCHLIST_FILE, help=f"plik listy obserwowanych (domyślnie {WATCHLIST_FILE})")
+    p.add_argument("--key", help=f"klucz API dla run (domyślnie REGON_API_KEY lub {KEY_FILE})")
+    p.add_argument("--period-days", type=float, default=OKRES / 86400,
+                   help="co ile dni sprawdzać podmiot o ryzyku 1 (domyślnie 1)")
+    p.add_argument("--daily-limit", type=int, default=DZIENNY_LIMIT,
+                   help=f"najwięcej zapytań HTTP do GUS na dobę (domyślnie {DZIENNY_LIMIT})")
+    p.add_argument("--interval", type=float, default=INTERWAL,
+                   help=f"co ile sekund sprawdzać należne podmioty (domyślnie {INTERWAL})")
+    p.add_argument("--once", action="store_true", help="jeden przebieg zamiast pracy ciągłej")
+    p.add_argument("--budget", type=int, help="najwięcej zapytań w przebiegu --once (domyślnie dzienny limit)")
+    p.add_argument("--events", default=EVENTS_FILE, help=f"plik zdarzeń JSON Lines (domyślnie {EVENTS_FILE})")
+    p.add_argument("--webhook", metavar="URL", help="wysyłaj zdarzenia metodą POST na podany adres zamiast do pliku")
+    p.add_argument("--rate", type=float, default=DOMYSLNY_LIMIT, help="pułap zapytań HTTP na sekundę")
+    p.set_defaults(handler=cmd_watch, metrics=None, profile=None, key_optional=True)
+
+    p = polecenia.add_parser("serve", parents=[wspolne], help="serwer HTTP/JSON ze wspólną pulą sesji i pamięcią podręczną")
+    p.add_argument("--host", default=DOMYSLNY_HOST, help=f"adres nasłuchu (domyślnie {DOMYSLNY_HOST})")
+    p.add_argument("--port", type=int, default=DOMYSLNY_PORT, help=f"port (domyślnie {DOMYSLNY_PORT})")
+    p.add_argument("--workers", type=int, default=DOMYSLNE_WORKERS,
+                   help=f"liczba sesji GUS i wątków dla POST /batch (domyślnie {DOMYSLNE_WORKERS})")
+    p.add_argument("--rate", type=float, default=DOMYSLNY_LIMIT,
+                   help=f"pułap zapytań HTTP do GUS na sekundę dla wszystkich klientów razem (domyślnie {DOMYSLNY_LIMIT})")
+    p.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                   help=f"najwięcej identyfikatorów w jednym POST /batch (domyślnie {MAX_BATCH})")
+    p.add_argument("--mirror", metavar="PLIK", help="odpowiadaj z lokalnego lustra i zapisuj w nim wyniki")
+    p.set_defaults(handler=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    klucz = args.key or read_api_key()
+    if not klucz and not getattr(args, "key_optional", False):
+        parser.error("brak klucza API")
+
+    from .sesja import is_auth_error
+    if args.profile:
+        METRYKI.enable_profiling()
+    try:
+        return args.handler(args, klucz)
+    except Exception as e:
+        if is_auth_error(e):
+            print(f"Klucz API jest niepoprawny lub wygasł: {e}", file=sys.stderr)
+            return 2
+        print(f"Błąd: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics:
+            METRYKI.save(args.metrics)
+        if args.profile:
+            METRYKI.dump_profile(args.profile)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""Zapis i odczyt wyników trybu wsadowego: CSV, JSONL, Parquet i Arrow.
+
+Wiersze trafiają do pliku grupami, w miarę kończenia kolejnych zapytań,
+więc nawet eksport milionów wierszy nie trzyma wszystkich wyników w pamięci.
+Format wybiera rozszerzenie pliku:
+
+    .csv               - CSV (listy, np. kody PKD, jako JSON w komórce)
+    .jsonl / .json     - jeden obiekt JSON w wierszu
+    .parquet / .pq     - Parquet ze stałym schematem (wymaga pyarrow)
+    .arrow / .feather  - plik Arrow IPC ze stałym schematem (wymaga pyarrow)
+
+Pliki tekstowe są zapisywane na bieżąco (przerwany przebieg zostawia
+wszystkie gotowe wiersze, a ucięty ostatni wiersz jest usuwany przy
+wznowieniu); pliki kolumnowe powstają obok jako .tmp
+i zastępują docelowy plik przy zamknięciu.
+"""
+import csv
+import json
+import os
+
+from .projekcja import KLUCZ_PKD
+
+# --- Formaty i schemat ---
+
+ROZSZERZENIA = {
+    ".csv": "csv",
+    ".jsonl": "jsonl", ".json": "jsonl",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow",
+}
+# Liczba wierszy w grupie Parquet / paczce Arrow - tyle wyników najwyżej czeka w pamięci na zapis.
+ROW_GROUP = 10000
+KOMPRESJA_PARQUET = "zstd"
+
+
+def format_pliku(path):
+    """Format pliku wynikowego według rozszerzenia ("csv", "jsonl", "parquet" lub "arrow"); domyślnie CSV."""
+    return ROZSZERZENIA.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Zapis i odczyt plików Parquet/Arrow wymaga pakietu pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def schemat(kolumny):
+    """Schemat Arrow dla kolumn wyniku: tekst, a lista PKD jako lista struktur (kod, nazwa, przewazajace)."""
+    pa = _pyarrow()
+    pkd = pa.list_(pa.struct([("kod", pa.string()), ("nazwa", pa.string()), ("przewazajace", pa.bool_())]))
+    return pa.schema([(k, pkd if k == KLUCZ_PKD else pa.string()) for k in kolumny])
+
+# --- Zapis ---
+
+
+def _utnij_niepelna_linie(path, paczka=64 * 1024):
+    """Obcina plik tekstowy do ostatniego znaku nowej linii - przerwany zapis mógł zostawić pół wiersza."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        koniec = f.seek(0, os.SEEK_END)
+        pozycja = koniec
+        while pozycja > 0:
+            start = max(0, pozycja - paczka)
+            f.seek(start)
+            nowa_linia = f.read(pozycja - start).rfind(b"\n")
+            if nowa_linia >= 0:
+                pozycja = start + nowa_linia + 1
+                break
+            pozycja = start
+        if pozycja < koniec:
+            f.truncate(pozycja)
+
+
+class _Writer:
+    def write(self, wiersz):
+        self.write_many([wiersz])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(_Writer):
+    """Dopisuje wiersze do pliku CSV; każda grupa wierszy jest od razu zapisywana na dysk."""
+
+    def __init__(self, path, kolumny):
+        self.path = path
+        _utnij_niepelna_linie(path)
+        nowy = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not nowy:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                naglowek = next(csv.reader(f), [])
+            if naglowek != list(kolumny):
+                raise ValueError(f"Plik {path} ma inne kolumny niż bieżący eksport - podaj inny plik wynikowy.")
+        self._f = open(path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._f, fieldnames=kolumny)
+        if nowy:
+            self._csv.writeheader()
+
+    def write_many(self, wiersze):
+        for wiersz in wiersze:
+            # Listy (np. kody PKD) zapisujemy w komórce CSV jako JSON.
+            self._csv.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                                for k, v in wiersz.items()})
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class JsonlWriter(_Writer):
+    """Dopisuje wiersze jako JSON Lines; każda grupa wierszy jest od razu zapisywana na dysk."""
+
+    def __init__(self, path, kolumny=None):
+        self.path = path
+        _utnij_niepelna_linie(path)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write_many(self, wiersze):
+        self._f.write("".join(json.dumps(w, ensure_ascii=False) + "\n" for w in wiersze))
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class ColumnarWriter(_Writer):
+    """Zapisuje wiersze do pliku Parquet lub Arrow IPC grupami po `row_group`.
+
+    Istniejący plik jest przepisywany paczka po paczce na początek nowego
+    (wznawianie przebiegu), a nowy plik zastępuje go dopiero w `close()`.
+    """
+
+    def __init__(self, path, kolumny, row_group=ROW_GROUP, format=None):
+        self.path = path
+        self.format = format or format_pliku(path)
+        self.row_group = row_group
+        self.schemat = schemat(kolumny)
+        self._bufor = []
+        self._tymczasowy = f"{path}.tmp"
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._tymczasowy, self.schemat, compression=KOMPRESJA_PARQUET)
+        else:
+            import pyarrow as pa
+            self._writer = pa.ipc.new_file(self._tymczasowy, self.schemat)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            for paczka in _paczki_kolumnowe(path, self.format, row_group):
+                if not paczka.schema.equals(self.schemat):
+                    self._writer.close()
+                    os.remove(self._tymczasowy)
+                    raise ValueError(f"Plik {path} ma inne kolumny niż bieżący eksport - podaj inny plik wynikowy.")
+                self._writer.write_batch(paczka)
+
+    def write_many(self, wiersze):
+        self._bufor.extend(wiersze)
+        if len(self._bufor) >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        if not self._bufor:
+            return
+        import pyarrow as pa
+        kolumny = {nazwa: [w.get(nazwa) for w in self._bufor] for nazwa in self.schemat.names}
+        self._writer.write_batch(pa.RecordBatch.from_pydict(kolumny, schema=self.schemat))
+        self._bufor = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        os.replace(self._tymczasowy, self.path)
+
+
+def open_writer(path, kolumny, row_group=ROW_GROUP):
+    """Otwiera zapis wyników w formacie wynikającym z rozszerzenia `path`."""
+    format = format_pliku(path)
+    if format in ("parquet", "arrow"):
+        return ColumnarWriter(path, kolumny, row_group, format)
+    if format == "jsonl":
+        return JsonlWriter(path, kolumny)
+    return CsvWriter(path, kolumny)
+
+# --- Odczyt ---
+
+
+def _paczki_kolumnowe(path, format, rozmiar=ROW_GROUP, kolumny=None):
+    pa = _pyarrow()
+    try:
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            yield from pq.ParquetFile(path).iter_batches(batch_size=rozmiar, columns=kolumny)
+        else:
+            with pa.memory_map(path) as plik:
+                czytnik = pa.ipc.open_file(plik)
+                for i in range(czytnik.num_record_batches):
+                    paczka = czytnik.get_batch(i)
+                    yield paczka.select(kolumny) if kolumny else paczka
+    except pa.ArrowInvalid as e:
+        raise RuntimeError(f"Nie można odczytać pliku {path}: {e}")
+
+
+def read_results(path, kolumny=None):
+    """Czyta wiersze z pliku wynikowego (CSV, JSONL, Parquet lub Arrow), pomijając uciętą ostatnią linię JSONL.
+
+    `kolumny` ogranicza odczyt plików kolumnowych do wybranych kolumn.
+    """
+    if not os.path.exists(path):
+        return
+    format = format_pliku(path)
+    if format in ("parquet", "arrow"):
+        for paczka in _paczki_kolumnowe(path, format, kolumny=kolumny):
+            yield from paczka.to_pylist()
+        return
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if format == "jsonl":
+            for linia in f:
+                try:
+                    yield json.loads(linia)
+                except ValueError:
+                    # Ostatnia linia mogła zostać ucięta przy przerwaniu.
+                    continue
+        else:
+            yield from csv.DictReader(f)
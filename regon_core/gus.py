@@ -0,0 +1,334 @@
+from .metryki import METRYKI
+from .singleflight import SINGLE_FLIGHT
+from .projekcja import (
+    KLUCZ_PKD, PODSTAWOWA, POLE_KRS, POLE_ZAKONCZENIA, RAPORT_PRAWNY, RAPORTY_PKD, lista_pkd, rekordy,
+)
+from .walidacja import normalizuj, sprawdz
+
+# Etykiety pól i odpowiadające im klucze słownika `dane_do_raportu`, w kolejności wyświetlania.
+POLA_DO_WYSWIETLENIA = [
+    ("Regon", "Regon"), ("Typ", "Typ"), ("Nazwa", "Nazwa"),
+    ("Województwo", "Wojewodztwo"), ("Powiat", "Powiat"),
+    ("Gmina", "Gmina"),
+    ("Kod pocztowy", "KodPocztowy"),
+    ("Miejscowość", "Miejscowosc"),
+    ("Ulica", "Ulica"),
+    ("Numer Nieruchomości", "Numer Nieruchomości"),
+    ("Informacja o skreśleniu z REGON", "Informacja o skreśleniu z REGON")
+]
+KLUCZE_DANYCH = [klucz for _, klucz in POLA_DO_WYSWIETLENIA]
+
+
+def format_dane(dane_do_raportu):
+    """Tekst raportu w układzie "Etykieta: wartość", jak w panelu danych GUI."""
+    linie = []
+    for label_text, key in POLA_DO_WYSWIETLENIA:
+        value = dane_do_raportu.get(key)
+        linie.append(f"{label_text}: {'' if value is None else str(value).strip()}")
+    return "\n".join(linie) + "\n"
+
+
+def _tekst(element):
+    # Surowy tekst elementu - str() na elemencie objectify gubi zera wiodące w numerach REGON.
+    if element is None:
+        return None
+    return element.text if element.text is not None else ""
+
+
+def dane_z_odpowiedzi(glowny_element_odpowiedzi):
+    """Buduje słownik `dane_do_raportu` z elementu wyniku wyszukiwania (z raportem szczegółowym)."""
+    dane_do_raportu = {}
+    dane_do_raportu['Regon'] = _tekst(getattr(glowny_element_odpowiedzi, 'Regon', None))
+    dane_do_raportu['Typ'] = _tekst(getattr(glowny_element_odpowiedzi, 'Typ', None))
+    dane_do_raportu['Nazwa'] = _tekst(getattr(glowny_element_odpowiedzi, 'Nazwa', None))
+    dane_do_raportu['Wojewodztwo'] = _tekst(getattr(glowny_element_odpowiedzi, 'Wojewodztwo', None))
+    dane_do_raportu['Powiat'] = _tekst(getattr(glowny_element_odpowiedzi, 'Powiat', None))
+    dane_do_raportu['Gmina'] = _tekst(getattr(glowny_element_odpowiedzi, 'Gmina', None))
+    dane_do_raportu['KodPocztowy'] = _tekst(getattr(glowny_element_odpowiedzi, 'KodPocztowy', None))
+    dane_do_raportu['Miejscowosc'] = _tekst(getattr(glowny_element_odpowiedzi, 'Miejscowosc', None))
+    dane_do_raportu['Ulica'] = _tekst(getattr(glowny_element_odpowiedzi, 'Ulica', None))
+    dane_do_raportu['Numer Nieruchomości'] = _tekst(getattr(glowny_element_odpowiedzi, 'NrNieruchomosci', None))
+
+    detailed_element = getattr(glowny_element_odpowiedzi, 'detailed', None)
+    if detailed_element is not None:
+        raw_data_zakonczenia_element = getattr(detailed_element, 'praw_dataZakonczeniaDzialalnosci', None)
+        data_zakonczenia_text = raw_data_zakonczenia_element.text if raw_data_zakonczenia_element is not None else None
+
+        if data_zakonczenia_text and data_zakonczenia_text.strip():
+            dane_do_raportu['Informacja o skreśleniu z REGON'] = f"Działalność zakończona: {data_zakonczenia_text.strip()}"
+        else:
+            dane_do_raportu['Informacja o skreśleniu z REGON'] = "----------"
+    else:
+        dane_do_raportu['Informacja o skreśleniu z REGON'] = "----------"
+
+    return dane_do_raportu
+
+
+# Klucze `dane_do_raportu` i pola wyniku wyszukiwania, z których pochodzą.
+_POLA_WYSZUKIWANIA = [
+    ('Regon', 'Regon'), ('Typ', 'Typ'), ('Nazwa', 'Nazwa'),
+    ('Wojewodztwo', 'Wojewodztwo'), ('Powiat', 'Powiat'), ('Gmina', 'Gmina'),
+    ('KodPocztowy', 'KodPocztowy'), ('Miejscowosc', 'Miejscowosc'), ('Ulica', 'Ulica'),
+    ('Numer Nieruchomości', 'NrNieruchomosci'),
+]
+
+
+def dane_z_rekordu(rekord, projekcja=PODSTAWOWA):
+    """Buduje `dane_do_raportu` z rekordu {pole: tekst} (wynik wyszukiwania z polami raportu).
+
+    Odpowiednik `dane_z_odpowiedzi` dla odpowiedzi czytanych strumieniowo;
+    pola z `projekcja` są dodawane pod własnymi nazwami, a lista PKD pod kluczem "PKD".
+    """
+    dane_do_raportu = {klucz: rekord.get(pole) for klucz, pole in _POLA_WYSZUKIWANIA}
+    data_zakonczenia = (rekord.get(POLE_ZAKONCZENIA) or "").strip()
+    if data_zakonczenia:
+        dane_do_raportu['Informacja o skreśleniu z REGON'] = f"Działalność zakończona: {data_zakonczenia}"
+    else:
+        dane_do_raportu['Informacja o skreśleniu z REGON'] = "----------"
+    for pole in projekcja.dodatkowe:
+        dane_do_raportu[pole] = rekord.get(pole)
+    if projekcja.pkd:
+        dane_do_raportu[KLUCZ_PKD] = rekord.get(KLUCZ_PKD, [])
+    return dane_do_raportu
+
+
+def _z_cache(cache, nip, projekcja):
+    """Wynik z pamięci podręcznej, o ile zawiera wszystkie pola wymagane przez `projekcja`."""
+    dane_do_raportu = cache.get(nip)
+    if dane_do_raportu is not None and all(k in dane_do_raportu for k in projekcja.klucze):
+        return dane_do_raportu
+    return None
+
+
+def _klucz_lotu(klucz, rodzaj, numer, projekcja):
+    return (klucz, rodzaj, numer, tuple(projekcja.klucze))
+
+
+def pobierz_dane(nip, klucz, sesje, cache=None, force_refresh=False, projekcja=PODSTAWOWA,
+                 single_flight=SINGLE_FLIGHT):
+    """Pobiera dane podmiotu dla NIPu w sesji z `sesje` (SessionManager).
+
+    Jeśli podano `cache` (ResultCache), zwraca zapisany wynik bez łączenia się
+    z GUS, chyba że `force_refresh` wymusza ponowne pobranie.
+    `projekcja` (Projekcja) dodaje do wyniku wybrane pola raportu i listę PKD.
+    Równoczesne zapytania o ten sam NIP dzielą jedno wywołanie GUS przez
+    `single_flight` (None wyłącza łączenie).
+    Zwraca `dane_do_raportu` lub None, gdy GUS nie zwrócił wyniku.
+    NIP ze złą sumą kontrolną zgłasza ValueError bez łączenia się z GUS;
+    błędy usługi są przekazywane wyżej.
+    """
+    sprawdz("nip", nip)
+    if cache is not None and not force_refresh:
+        dane_do_raportu = _z_cache(cache, nip, projekcja)
+        if dane_do_raportu is not None:
+            return dane_do_raportu
+
+    def pobierz():
+        with METRYKI.span("lookup", nip=nip):
+            wyniki = sesje.call(klucz, lambda klient: _pobierz_paczke(klient, "nip", [nip], projekcja))
+        if nip not in wyniki:
+            return None
+        rekord, xml = wyniki[nip]
+        dane_do_raportu = dane_z_rekordu(rekord, projekcja)
+        if cache is not None:
+            cache.put(nip, dane_do_raportu, xml)
+        return dane_do_raportu
+
+    if single_flight is None:
+        return pobierz()
+    dane_do_raportu = single_flight.do(_klucz_lotu(klucz, "nip", nip, projekcja), pobierz)
+    # Wynik lotu dostaje kilku wywołujących - każdy dostaje własną kopię.
+    return dict(dane_do_raportu) if dane_do_raportu is not None else None
+
+# --- Wyszukiwanie zbiorcze (Nipy / Regony9zn / Regony14zn / Krsy) ---
+
+# Najwięcej identyfikatorów w jednym wywołaniu DaneSzukajPodmioty.
+MAX_W_ZAPYTANIU = 20
+# Kod błędu BIR "nie znaleziono podmiotu".
+KOD_BRAK_DANYCH = "4"
+
+_PREFIKSY = ("NIP", "REGON", "KRS")
+
+
+def rozpoznaj_identyfikator(tekst):
+    """Zwraca parę (rodzaj, numer), gdzie rodzaj to "nip", "regon" albo "krs".
+
+    Rodzaj można podać przedrostkiem, np. "KRS 0000312345" lub "REGON:000331501";
+    bez przedrostka 9 i 14 cyfr to REGON, a 10 cyfr - NIP.
+    Dla niepoprawnych wartości (także ze złą sumą kontrolną) zgłasza ValueError,
+    zanim numer trafi do GUS.
+    """
+    numer = normalizuj(tekst) or ""
+    rodzaj = None
+    for prefiks in _PREFIKSY:
+        if numer.startswith(prefiks):
+            rodzaj, numer = prefiks.lower(), numer[len(prefiks):].lstrip(":=")
+            break
+    if rodzaj is None and numer.startswith("PL"):
+        rodzaj, numer = "nip", numer[2:]
+    if not numer.isdigit():
+        raise ValueError(f"Niepoprawny identyfikator: {tekst}")
+    if rodzaj is None:
+        rodzaj = "regon" if len(numer) in (9, 14) else "nip"
+    if rodzaj == "krs" and len(numer) < 10:
+        numer = numer.zfill(10)
+    if len(numer) not in ((9, 14) if rodzaj == "regon" else (10,)):
+        raise ValueError(f"Niepoprawna długość numeru {rodzaj.upper()}: {tekst}")
+    return rodzaj, sprawdz(rodzaj, numer)
+
+
+def _parametr(rodzaj, numer):
+    if rodzaj == "nip":
+        return "Nipy"
+    if rodzaj == "krs":
+        return "Krsy"
+    return "Regony9zn" if len(numer) == 9 else "Regony14zn"
+
+
+def _szukaj_paczki(klient, parametr, numery):
+    """Jedno wywołanie DaneSzukajPodmioty dla listy numerów; zwraca znalezione rekordy {pole: tekst}.
+
+    Pomija wpisy z kodem "nie znaleziono", a inne błędy usługi zgłasza dalej.
+    """
+    from litex.regon import SEARCH_ENVELOPE, REGONAPIError, get_message_element
+
+    odpowiedz = klient.call(SEARCH_ENVELOPE, param=f"<dat:{parametr}>{''.join(numery)}</dat:{parametr}>")
+    wynik = get_message_element(odpowiedz, 0, '//bir:DaneSzukajPodmiotyResult/text()')
+    if not wynik:
+        raise REGONAPIError('No response received. Are you logged in?')
+
+    znalezione = []
+    with METRYKI.span("parse"):
+        for rekord in rekordy(wynik[0]):
+            kod = rekord.get('ErrorCode')
+            if kod is None:
+                znalezione.append(rekord)
+            elif kod != KOD_BRAK_DANYCH:
+                raise REGONAPIError(rekord.get('ErrorMessageEn'), kod, rekord)
+    return znalezione
+
+
+def _raport(klient, regon, nazwa):
+    """Surowy XML raportu `nazwa` dla REGONu lub None, gdy GUS go nie zwróci.
+
+    W odróżnieniu od `REGONAPI.full_report` nie buduje drzewa objectify -
+    pola wyciąga z niego `rekordy` z wybraną projekcją.
+    """
+    from litex.regon import FULL_REPORT_ENVELOPE, get_message_element
+
+    odpowiedz = klient.call(FULL_REPORT_ENVELOPE, regon=regon, report_name=nazwa)
+    wynik = get_message_element(odpowiedz, 0, '//bir:DanePobierzPelnyRaportResult/text()')
+    return wynik[0] if wynik else None
+
+
+def _numer_rekordu(rodzaj, rekord):
+    if rodzaj == "nip":
+        return rekord.get('Nip')
+    if rodzaj == "regon":
+        return rekord.get('Regon')
+    krs = (rekord.get(POLE_KRS) or "").strip()
+    return krs.zfill(10) if krs else None
+
+
+def _pobierz_paczke(klient, rodzaj, numery, projekcja=PODSTAWOWA):
+    """Wyszukuje do MAX_W_ZAPYTANIU numerów jednego rodzaju; zwraca {numer: (rekord, xml raportu)}.
+
+    Raport osoby prawnej jest pobierany tylko dla typu P (pozostałe typy nie
+    mają daty zakończenia działalności) oraz przy szukaniu po KRS, a raport
+    z listą PKD - tylko gdy wymaga go `projekcja`.
+    """
+    znalezione = _szukaj_paczki(klient, _parametr(rodzaj, numery[0]), numery)
+    pary = []
+    for rekord in znalezione:
+        typ, regon, xml = rekord.get('Typ'), rekord.get('Regon'), None
+        # Przy KRS raport jest potrzebny także do przypisania wyniku do numeru.
+        if rodzaj == "krs" or typ == "P":
+            xml = _raport(klient, regon, RAPORT_PRAWNY)
+            if xml:
+                with METRYKI.span("parse"):
+                    rekord.update(next(rekordy(xml, projekcja.pola_raportu), {}))
+        if projekcja.pkd and typ in RAPORTY_PKD:
+            xml_pkd = _raport(klient, regon, RAPORTY_PKD[typ][0])
+            with METRYKI.span("parse"):
+                rekord[KLUCZ_PKD] = lista_pkd(xml_pkd, typ) if xml_pkd else []
+        pary.append((rekord, xml))
+
+    wyniki = {}
+    for rekord, xml in pary:
+        numer = _numer_rekordu(rodzaj, rekord)
+        if numer in numery and numer not in wyniki:
+            wyniki[numer] = (rekord, xml)
+    if len(numery) == 1 and not wyniki and pary:
+        wyniki[numery[0]] = pary[0]
+    return wyniki
+
+
+def podziel_na_paczki(identyfikatory, rozmiar=MAX_W_ZAPYTANIU):
+    """Grupuje pary (rodzaj, numer) w paczki po najwyżej `rozmiar` numerów tego samego parametru BIR."""
+    grupy = {}
+    for rodzaj, numer in identyfikatory:
+        grupa = grupy.setdefault((rodzaj, _parametr(rodzaj, numer)), [])
+        if numer not in grupa:
+            grupa.append(numer)
+    return [
+        (rodzaj, numery[i:i + rozmiar])
+        for (rodzaj, _), numery in grupy.items()
+        for i in range(0, len(numery), rozmiar)
+    ]
+
+
+def pobierz_dane_wiele(identyfikatory, klucz, sesje, cache=None, force_refresh=False, projekcja=PODSTAWOWA,
+                       single_flight=SINGLE_FLIGHT):
+    """Pobiera dane dla listy NIPów, REGONów i numerów KRS w jak najmniejszej liczbie wywołań.
+
+    `identyfikatory` to teksty (patrz `rozpoznaj_identyfikator`) lub gotowe pary
+    (rodzaj, numer). Numery tego samego rodzaju są wysyłane paczkami po
+    MAX_W_ZAPYTANIU, a pełny raport jest pobierany tylko dla osób prawnych.
+    Odpowiedzi są czytane strumieniowo i zostają z nich tylko pola z `projekcja`.
+    NIPy są najpierw szukane w `cache`, a wszystkie wyniki trafiają do niego pod NIPem.
+    Numery, o które właśnie pyta inny wątek, nie są wysyłane ponownie - wynik
+    przychodzi z jego zapytania (`single_flight`; None wyłącza łączenie).
+
+    Zwraca słownik {(rodzaj, numer): dane_do_raportu lub None} w kolejności wejścia.
+    Błędy usługi są przekazywane wyżej.
+    """
+    pary = [i if isinstance(i, tuple) else rozpoznaj_identyfikator(i) for i in identyfikatory]
+    wyniki = dict.fromkeys(pary)
+
+    do_pobrania = []
+    for para in wyniki:
+        if cache is not None and not force_refresh and para[0] == "nip":
+            wyniki[para] = _z_cache(cache, para[1], projekcja)
+            if wyniki[para] is not None:
+                continue
+        do_pobrania.append(para)
+
+    loty = {para: _klucz_lotu(klucz, *para, projekcja) for para in do_pobrania}
+    prowadzone, obce = single_flight.zacznij(loty.values()) if single_flight is not None else ({}, {})
+    wlasne = [para for para in do_pobrania if loty[para] not in obce]
+    try:
+        for rodzaj, numery in podziel_na_paczki(wlasne):
+            with METRYKI.span("lookup", rodzaj=rodzaj, liczba=len(numery)):
+                pobrane = sesje.call(klucz, lambda klient: _pobierz_paczke(klient, rodzaj, numery, projekcja))
+            for numer, (rekord, xml) in pobrane.items():
+                dane_do_raportu = dane_z_rekordu(rekord, projekcja)
+                wyniki[(rodzaj, numer)] = dane_do_raportu
+                nip = rekord.get('Nip')
+                if cache is not None and nip:
+                    cache.put(nip, dane_do_raportu, xml)
+            for numer in numery:
+                lot = prowadzone.pop(loty[(rodzaj, numer)], None)
+                if lot is not None:
+                    single_flight.zakoncz(loty[(rodzaj, numer)], lot, wyniki[(rodzaj, numer)])
+    except BaseException as e:
+        # Czekające wątki muszą się dowiedzieć o błędzie, inaczej czekałyby bez końca.
+        for klucz_lotu, lot in prowadzone.items():
+            single_flight.zakoncz(klucz_lotu, lot, blad=e)
+        raise
+
+    for para in do_pobrania:
+        lot = obce.get(loty[para])
+        if lot is not None:
+            dane_do_raportu = single_flight.czekaj(lot)
+            wyniki[para] = dict(dane_do_raportu) if dane_do_raportu is not None else None
+    return wyniki
@@ -0,0 +1,159 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# --- Konfiguracja i stałe ---
+
+HISTORY_DB = "historia_regon.sqlite"
+# Dawny plik tekstowy ("NIP | Nazwa" w każdej linii), importowany przy pierwszym otwarciu bazy.
+HISTORY_TXT = "historia_regon.txt"
+PAGE_SIZE = 200
+# Powyżej tylu pasujących NIPów strona jest czytana wprost z kolejności wpisów zamiast z indeksu NIP.
+NIP_SCAN_THRESHOLD = 2000
+# Kolumny, po których można sortować historię, i wyrażenia ORDER BY (korzystające z indeksów).
+SORTOWANIE = {"nip": "h.nip", "nazwa": "h.nazwa COLLATE NOCASE"}
+
+_SLOWO = re.compile(r"\w+", re.UNICODE)
+
+
+def _do_wyszukiwania(tekst):
+    # "ł" nie rozkłada się na literę z akcentem, więc remove_diacritics jej nie usuwa.
+    return tekst.replace("ł", "l").replace("Ł", "L")
+
+
+class HistoryStore:
+    """Historia wyszukiwań w SQLite: jeden wpis na NIP, najnowsze pierwsze.
+
+    Wpisy są indeksowane po NIP, nazwie i czasie; nazwy firm przeszukuje
+    indeks pełnotekstowy FTS5 (początki słów, bez polskich znaków), a gdy
+    SQLite go nie obsługuje - zapytanie LIKE. Ponowne wyszukanie NIPu
+    zapisuje wpis od nowa, więc kolejność `id` jest kolejnością od najnowszych
+    i `page()` czyta strony prosto z indeksu, bez sortowania całej historii.
+    """
+
+    def __init__(self, path=HISTORY_DB, legacy_path=HISTORY_TXT):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        nowa = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'historia'"
+        ).fetchone() is None
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS historia ("
+            " id INTEGER PRIMARY KEY,"
+            " nip TEXT NOT NULL UNIQUE,"
+            " nazwa TEXT NOT NULL,"
+            " czas REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS historia_czas ON historia (czas)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS historia_nazwa ON historia (nazwa COLLATE NOCASE)")
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS historia_fts USING fts5("
+                " nazwa, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite bez FTS5 - wyszukiwanie po nazwie przez LIKE.
+            self.fts = False
+        self._db.commit()
+        if nowa and legacy_path and os.path.exists(legacy_path):
+            self.import_text(legacy_path)
+
+    def add(self, nip, nazwa, czas=None):
+        """Zapisuje wyszukanie NIPu; powtórne wyszukanie przenosi wpis na początek."""
+        self.add_many([(nip, nazwa, czas)])
+
+    def add_many(self, wpisy):
+        """Zapisuje wpisy (nip, nazwa, czas) w podanej kolejności - ostatni będzie najnowszy."""
+        teraz = time.time()
+        with self._lock:
+            for nip, nazwa, czas in wpisy:
+                nazwa = nazwa or "Brak nazwy"
+                stary = self._db.execute("SELECT id FROM historia WHERE nip = ?", (nip,)).fetchone()
+                if stary is not None:
+                    self._db.execute("DELETE FROM historia WHERE id = ?", stary)
+                    if self.fts:
+                        self._db.execute("DELETE FROM historia_fts WHERE rowid = ?", stary)
+                kursor = self._db.execute(
+                    "INSERT INTO historia (nip, nazwa, czas) VALUES (?, ?, ?)",
+                    (nip, nazwa, teraz if czas is None else czas),
+                )
+                if self.fts:
+                    self._db.execute(
+                        "INSERT INTO historia_fts (rowid, nazwa) VALUES (?, ?)",
+                        (kursor.lastrowid, _do_wyszukiwania(nazwa)),
+                    )
+            self._db.commit()
+
+    def import_text(self, path):
+        """Importuje plik "NIP | Nazwa" (najstarsze wpisy na początku). Zwraca liczbę wpisów."""
+        with open(path, "r", encoding="utf-8") as f:
+            linie = [linia.strip() for linia in f if "|" in linia]
+        start = os.path.getmtime(path) - len(linie)
+        wpisy = []
+        for i, linia in enumerate(linie):
+            nip, nazwa = (czesc.strip() for czesc in linia.split("|", 1))
+            wpisy.append((nip, nazwa, start + i))
+        self.add_many(wpisy)
+        return len(wpisy)
+
+    def _zapytanie(self, kolumny, query, skan_nip=False):
+        """SELECT (bez ORDER BY), parametry i kolumna kolejności dla tekstu wyszukiwania.
+
+        Cyfry dopasowują początek NIPu, a inny tekst - początki słów nazwy.
+        """
+        query = (query or "").strip()
+        cyfry = query.replace("-", "").replace(" ", "")
+        if not query:
+            return f"SELECT {kolumny} FROM historia h", [], "h.id"
+        if cyfry.isdigit():
+            # "+" wyłącza indeks NIP: przy wielu dopasowaniach szybciej czytać od najnowszych i filtrować.
+            nip = "+h.nip" if skan_nip else "h.nip"
+            return f"SELECT {kolumny} FROM historia h WHERE {nip} >= ? AND {nip} < ?", [cyfry, cyfry + ":"], "h.id"
+        slowa = _SLOWO.findall(_do_wyszukiwania(query))
+        if self.fts and slowa:
+            fraza = " ".join(f'"{slowo}"*' for slowo in slowa)
+            return (f"SELECT {kolumny} FROM historia_fts f JOIN historia h ON h.id = f.rowid"
+                    " WHERE historia_fts MATCH ?", [fraza], "f.rowid")
+        return f"SELECT {kolumny} FROM historia h WHERE h.nazwa LIKE ?", [f"%{query}%"], "h.id"
+
+    def page(self, offset=0, limit=PAGE_SIZE, query=None, sort="czas", descending=True):
+        """Lista (nip, nazwa, czas), opcjonalnie zawężona przez `query`.
+
+        `sort` to "czas" (domyślnie od najnowszych), "nip" albo "nazwa"; widok
+        tabeli pyta tylko o widoczne okno wierszy.
+        """
+        if sort != "czas" and sort not in SORTOWANIE:
+            raise ValueError(f"Nieznana kolumna sortowania historii: {sort}")
+        # Indeks FTS5 zwraca wiersze w kolejności rowid, więc sortowanie po f.rowid nie wymaga sortowania wyników.
+        skan_nip = False
+        if sort == "czas" and query and query.replace("-", "").replace(" ", "").isdigit():
+            skan_nip = self.count(query) > NIP_SCAN_THRESHOLD
+        sql, parametry, kolejnosc = self._zapytanie("h.nip, h.nazwa, h.czas", query, skan_nip)
+        kierunek = "DESC" if descending else "ASC"
+        if sort == "czas":
+            porzadek = f"{kolejnosc} {kierunek}"
+        else:
+            # Równe nazwy - od najnowszych w kierunku sortowania, jak w indeksie (nazwa, rowid).
+            porzadek = f"{SORTOWANIE[sort]} {kierunek}, h.id {kierunek}"
+        with self._lock:
+            return self._db.execute(
+                f"{sql} ORDER BY {porzadek} LIMIT ? OFFSET ?", parametry + [limit, offset]
+            ).fetchall()
+
+    def count(self, query=None):
+        sql, parametry, _ = self._zapytanie("COUNT(*)", query)
+        with self._lock:
+            return self._db.execute(sql, parametry).fetchone()[0]
+
+    def get(self, nip):
+        with self._lock:
+            return self._db.execute("SELECT nip, nazwa, czas FROM historia WHERE nip = ?", (nip,)).fetchone()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
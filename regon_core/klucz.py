@@ -0,0 +1,26 @@
+import os
+
+KEY_FILE = "api_key.txt"
+KEY_ENV = "REGON_API_KEY"
+
+
+def read_api_key(path=KEY_FILE):
+    """Zwraca klucz API ze zmiennej środowiskowej REGON_API_KEY lub z pliku; None, gdy go brak."""
+    key = os.environ.get(KEY_ENV, "").strip()
+    if key:
+        return key
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                key = f.read().strip()
+                if key:
+                    return key
+        except Exception:
+            pass
+    return None
+
+
+def save_api_key(key, path=KEY_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(key.strip())
+    return key.strip()
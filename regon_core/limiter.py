@@ -0,0 +1,207 @@
+"""Wspólny limit zapytań do GUS i ponawianie zapytań po błędach przejściowych.
+
+`AdaptiveLimiter` to kubełek żetonów współdzielony przez wszystkie sesje
+SessionManagera: każde zapytanie HTTP pobiera żeton, a limit na sekundę
+spada po błędach przejściowych i przy rosnących czasach odpowiedzi, po czym
+stopniowo wraca do pułapu (AIMD). `with_retries` owija klienta litex.regon:
+błędy przejściowe (HTTP 5xx, zerwane połączenie, przekroczony czas) są
+ponawiane z wykładniczym opóźnieniem z losowym rozrzutem, a błędy klucza API
+nie są ponawiane - w trybie wsadowym trafiają do `DeadLetterList`.
+
+Użycie:
+    sesje = SessionManager(limiter=AdaptiveLimiter(rate=10))
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from .metryki import METRYKI, klasa_bledu
+
+# --- Konfiguracja i stałe ---
+
+# Domyślny pułap zapytań HTTP na sekundę dla wszystkich sesji razem.
+DOMYSLNY_LIMIT = 10.0
+# Najniższy limit, do jakiego schodzimy po błędach.
+MIN_LIMIT = 0.2
+# Ile zapytań może wyjść od razu po przerwie.
+POJEMNOSC = 2
+# Po błędzie przejściowym limit jest mnożony przez SPADEK (najwyżej raz na OKNO_SPADKU sekund),
+# a każda udana odpowiedź podnosi go o WZROST pułapu.
+SPADEK = 0.5
+SPADEK_OPOZNIENIA = 0.8
+OKNO_SPADKU = 1.0
+WZROST = 0.02
+# Odpowiedzi wolniejsze niż PROG_OPOZNIENIA razy średnia długookresowa oznaczają przeciążenie usługi.
+PROG_OPOZNIENIA = 3.0
+
+MAX_PROB = 4
+BACKOFF_BAZA = 0.5
+BACKOFF_MAKS = 30.0
+# Klasy błędów (metryki.klasa_bledu), po których zapytanie warto powtórzyć.
+PRZEJSCIOWE = ("usluga", "timeout", "polaczenie")
+
+
+class ServiceError(RuntimeError):
+    """Usługa GUS odpowiedziała bez danych SOAP (np. HTTP 500 lub strona błędu serwera)."""
+
+
+def czy_przejsciowy(e):
+    """Czy błąd jest przejściowy i zapytanie można powtórzyć (błędy klucza API nigdy nie są)."""
+    from .sesja import is_auth_error
+    return not is_auth_error(e) and klasa_bledu(e) in PRZEJSCIOWE
+
+
+def opoznienie(proba, baza=BACKOFF_BAZA, maks=BACKOFF_MAKS):
+    """Czas oczekiwania przed ponowieniem numer `proba` (od 0): losowy z [0, baza * 2^proba], najwyżej `maks`."""
+    return random.uniform(0, min(maks, baza * 2 ** proba))
+
+# --- Limit zapytań ---
+
+
+class AdaptiveLimiter:
+    """Kubełek żetonów wspólny dla wszystkich wątków, z limitem dopasowywanym do odpowiedzi GUS.
+
+    Limit startuje od `rate` (zapytań HTTP na sekundę), który jest zarazem
+    pułapem. `rate=0` wyłącza ograniczenie.
+    """
+
+    def __init__(self, rate=DOMYSLNY_LIMIT, min_rate=MIN_LIMIT, burst=POJEMNOSC):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self.liczniki = {"zapytania": 0, "błędy": 0, "spadki": 0}
+        self._zetony = float(burst)
+        self._czas = time.monotonic()
+        self._ostatni_spadek = 0.0
+        self._opoznienie = None
+        self._srednie_opoznienie = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Czeka na żeton. Kolejne wątki ustawiają się w kolejce co 1/limit sekundy."""
+        if not self.max_rate:
+            return
+        with self._lock:
+            teraz = time.monotonic()
+            if teraz > self._czas:
+                self._zetony = min(self.burst, self._zetony + (teraz - self._czas) * self.rate)
+                self._czas = teraz
+            self._zetony -= 1
+            czekaj = self._czas - teraz + max(0.0, -self._zetony) / self.rate
+            self.liczniki["zapytania"] += 1
+        if czekaj > 0:
+            time.sleep(czekaj)
+
+    def sukces(self, czas):
+        """Zapisuje udaną odpowiedź trwającą `czas` sekund."""
+        if not self.max_rate:
+            return
+        with self._lock:
+            if self._opoznienie is None:
+                self._opoznienie = self._srednie_opoznienie = czas
+            else:
+                self._opoznienie = 0.8 * self._opoznienie + 0.2 * czas
+                self._srednie_opoznienie = 0.99 * self._srednie_opoznienie + 0.01 * czas
+            if self._opoznienie > PROG_OPOZNIENIA * self._srednie_opoznienie:
+                self._zmniejsz(SPADEK_OPOZNIENIA)
+            else:
+                self.rate = min(self.max_rate, self.rate + WZROST * self.max_rate)
+
+    def blad(self, e):
+        """Zapisuje nieudane zapytanie; błąd przejściowy zmniejsza limit."""
+        with self._lock:
+            self.liczniki["błędy"] += 1
+            if self.max_rate and czy_przejsciowy(e):
+                self._zmniejsz(SPADEK)
+
+    def _zmniejsz(self, mnoznik):
+        teraz = time.monotonic()
+        # Wiele wątków zgłasza zwykle ten sam epizod przeciążenia - liczymy go raz.
+        if teraz - self._ostatni_spadek < OKNO_SPADKU:
+            return
+        self._ostatni_spadek = teraz
+        self.rate = max(self.min_rate, self.rate * mnoznik)
+        self.liczniki["spadki"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": round(self.rate, 2),
+                "pułap": self.max_rate,
+                **self.liczniki,
+                "opóźnienie_ms": round(self._opoznienie * 1000, 1) if self._opoznienie is not None else None,
+            }
+
+# --- Ponawianie ---
+
+
+def with_retries(klient, limiter=None, max_prob=MAX_PROB, czekaj=time.sleep):
+    """Owija `klient.call` (litex.regon): limit `limiter` i ponawianie błędów przejściowych.
+
+    Każda próba pobiera żeton z `limitera` i zgłasza mu wynik. Odpowiedź bez
+    części SOAP (np. HTTP 500) jest zgłaszana jako ServiceError. Opóźnienia
+    ponowień trafiają do metryk jako faza "backoff".
+    """
+    call = klient.call
+
+    def call_z_ponowieniami(envelope, **args):
+        for proba in range(max_prob):
+            if limiter is not None:
+                limiter.acquire()
+            start = time.monotonic()
+            try:
+                odpowiedz = call(envelope, **args)
+                if not odpowiedz.is_multipart():
+                    tresc = str(odpowiedz.get_payload())[:200].strip()
+                    raise ServiceError(f"Usługa GUS zwróciła odpowiedź bez danych SOAP: {tresc}")
+            except Exception as e:
+                if limiter is not None:
+                    limiter.blad(e)
+                if proba == max_prob - 1 or not czy_przejsciowy(e):
+                    raise
+                przerwa = opoznienie(proba)
+                METRYKI.observe("backoff", przerwa, klasa_bledu(e))
+                czekaj(przerwa)
+            else:
+                if limiter is not None:
+                    limiter.sukces(time.monotonic() - start)
+                return odpowiedz
+
+    klient.call = call_z_ponowieniami
+    return klient
+
+# --- Odrzucone zadania ---
+
+
+class DeadLetterList:
+    """Zadania odrzucone bez ponawiania (np. przy błędnym kluczu API).
+
+    Wpisy są trzymane w pamięci i, jeśli podano `path`, dopisywane do pliku JSONL.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.wpisy = []
+        self._lock = threading.Lock()
+
+    def add(self, identyfikator, blad):
+        wpis = {
+            "id": identyfikator,
+            "błąd": str(blad),
+            "klasa": klasa_bledu(blad),
+            "czas": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            self.wpisy.append(wpis)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(wpis, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self.wpisy)
+
+    def __iter__(self):
+        return iter(list(self.wpisy))
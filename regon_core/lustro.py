@@ -0,0 +1,324 @@
+"""Lokalna kopia (lustro) danych podmiotów z REGON z odświeżaniem w tle i dziennikiem zmian.
+
+Lustro ma ten sam interfejs `get`/`put` co ResultCache, więc można je podać
+jako `cache` do pobierz_dane, pobierz_dane_wiele i run_batch - tak budowana
+jest kopia z przebiegów wsadowych. W przeciwieństwie do pamięci podręcznej
+wpisy nie wygasają: `get` zawsze odpowiada lokalnie, a nieaktualne rekordy
+sprawdza ponownie MirrorRefresher, zapisując wykryte zmiany w tabeli `zmiany`.
+
+Użycie:
+    regon-cli batch kontrahenci.csv -o wyniki.jsonl --mirror lustro.sqlite
+    regon-cli mirror refresh --max-age 7
+    regon-cli mirror changes -o zmiany.jsonl
+"""
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .gus import KLUCZE_DANYCH, MAX_W_ZAPYTANIU, pobierz_dane_wiele, rozpoznaj_identyfikator
+from .projekcja import POLE_KRS, POLE_ZAKONCZENIA, rekordy
+
+# --- Konfiguracja i stałe ---
+
+MIRROR_FILE = "regon_lustro.sqlite"
+# Po tylu sekundach rekord jest uznawany za nieaktualny i sprawdzany ponownie.
+MIRROR_MAX_AGE = 7 * 24 * 60 * 60
+# Odstęp między przebiegami odświeżania w tle (w sekundach).
+REFRESH_INTERVAL = 60
+
+POLE_STATUSU = "status"
+_POLE_SKRESLENIA = "Informacja o skreśleniu z REGON"
+_PREFIKS_ZAKONCZENIA = "Działalność zakończona: "
+# Skreślenie trafia do dziennika raz - jako zmiana daty zakończenia (POLE_ZAKONCZENIA), bez tekstu do wyświetlenia.
+_KLUCZE_ZMIAN = [klucz for klucz in KLUCZE_DANYCH if klucz != _POLE_SKRESLENIA]
+KOLUMNY_ZMIAN = ["id", "czas", "nip", "pole", "stara", "nowa"]
+
+
+def data_zakonczenia(dane):
+    """Data zakończenia działalności z pola "Informacja o skreśleniu z REGON" albo None."""
+    informacja = dane.get(_POLE_SKRESLENIA) or ""
+    return informacja[len(_PREFIKS_ZAKONCZENIA):] if informacja.startswith(_PREFIKS_ZAKONCZENIA) else None
+
+
+def roznice(stare, nowe, klucze=KLUCZE_DANYCH):
+    """Zmiany (pole, stara, nowa) między dwiema wersjami `dane_do_raportu`."""
+    return [(klucz, stare.get(klucz), nowe.get(klucz)) for klucz in klucze if stare.get(klucz) != nowe.get(klucz)]
+
+
+def _krs_z_raportu(xml):
+    if not xml:
+        return None
+    from lxml import etree
+    try:
+        krs = next((r[POLE_KRS] for r in rekordy(xml, (POLE_KRS,)) if r.get(POLE_KRS)), None)
+    except etree.XMLSyntaxError:
+        return None
+    return krs.strip().zfill(10) if krs and krs.strip() else None
+
+
+class EntityMirror:
+    """Trwała kopia podmiotów (SQLite) z indeksami po NIP, REGON i KRS.
+
+    Przechowuje słownik `dane_do_raportu`, surowy XML raportu szczegółowego,
+    datę zakończenia działalności oraz czas ostatniego sprawdzenia w GUS.
+    """
+
+    def __init__(self, path=MIRROR_FILE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS podmioty ("
+            " nip TEXT PRIMARY KEY,"
+            " regon TEXT,"
+            " krs TEXT,"
+            " dane TEXT NOT NULL,"
+            " xml TEXT,"
+            " data_zakonczenia TEXT,"
+            " aktywny INTEGER NOT NULL DEFAULT 1,"
+            " sprawdzono REAL NOT NULL,"
+            " zmieniono REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS podmioty_regon ON podmioty (regon);"
+            "CREATE INDEX IF NOT EXISTS podmioty_krs ON podmioty (krs);"
+            "CREATE INDEX IF NOT EXISTS podmioty_sprawdzono ON podmioty (sprawdzono);"
+            "CREATE TABLE IF NOT EXISTS zmiany ("
+            " id INTEGER PRIMARY KEY,"
+            " czas REAL NOT NULL,"
+            " nip TEXT NOT NULL,"
+            " pole TEXT NOT NULL,"
+            " stara TEXT,"
+            " nowa TEXT);"
+            "CREATE INDEX IF NOT EXISTS zmiany_nip ON zmiany (nip);"
+        )
+        self._db.commit()
+
+    # --- Odczyt ---
+
+    def _dane(self, kolumna, wartosc):
+        with self._lock:
+            wiersz = self._db.execute(
+                f"SELECT dane FROM podmioty WHERE {kolumna} = ? AND aktywny = 1", (wartosc,)
+            ).fetchone()
+            if wiersz is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(wiersz[0])
+
+    def get(self, nip):
+        """Zwraca `dane_do_raportu` dla NIPu albo None (bez łączenia się z GUS)."""
+        return self._dane("nip", nip)
+
+    def get_by_regon(self, regon):
+        return self._dane("regon", regon)
+
+    def get_by_krs(self, krs):
+        return self._dane("krs", krs.zfill(10))
+
+    def lookup(self, identyfikator):
+        """Dane dla NIPu, REGONu albo numeru KRS (patrz rozpoznaj_identyfikator)."""
+        rodzaj, numer = rozpoznaj_identyfikator(identyfikator)
+        return {"nip": self.get, "regon": self.get_by_regon, "krs": self.get_by_krs}[rodzaj](numer)
+
+    def get_entry(self, nip):
+        """Pełny rekord: słownik z kluczami nip, regon, krs, dane, xml, data_zakonczenia, aktywny, sprawdzono."""
+        with self._lock:
+            kursor = self._db.execute(
+                "SELECT nip, regon, krs, dane, xml, data_zakonczenia, aktywny, sprawdzono, zmieniono"
+                " FROM podmioty WHERE nip = ?", (nip,)
+            )
+            wiersz = kursor.fetchone()
+        if wiersz is None:
+            return None
+        rekord = dict(zip([k[0] for k in kursor.description], wiersz))
+        rekord["dane"] = json.loads(rekord["dane"])
+        return rekord
+
+    def stale(self, max_age=MIRROR_MAX_AGE, limit=None):
+        """NIPy sprawdzone dawniej niż `max_age` sekund temu, od najstarszych."""
+        with self._lock:
+            return [nip for (nip,) in self._db.execute(
+                "SELECT nip FROM podmioty WHERE sprawdzono < ? ORDER BY sprawdzono LIMIT ?",
+                (time.time() - max_age, -1 if limit is None else limit),
+            )]
+
+    # --- Zapis i wykrywanie zmian ---
+
+    def put(self, nip, dane, xml=None):
+        """Zapisuje wynik z GUS; różnice względem poprzedniej wersji trafiają do dziennika zmian."""
+        teraz = time.time()
+        zakonczenie = data_zakonczenia(dane)
+        with self._lock:
+            stary = self._db.execute(
+                "SELECT dane, xml, data_zakonczenia, aktywny, krs FROM podmioty WHERE nip = ?", (nip,)
+            ).fetchone()
+            krs = _krs_z_raportu(xml) or (stary[4] if stary else None)
+            zmiany = []
+            if stary is not None:
+                zmiany = roznice(json.loads(stary[0]), dane, _KLUCZE_ZMIAN)
+                if stary[2] != zakonczenie:
+                    zmiany.append((POLE_ZAKONCZENIA, stary[2], zakonczenie))
+                if not stary[3]:
+                    zmiany.append((POLE_STATUSU, "brak", "aktywny"))
+                if xml is None:
+                    # Wyszukiwanie zbiorcze pobiera raport tylko dla osób prawnych - zostawiamy poprzedni.
+                    xml = stary[1]
+            zmieniono = teraz if zmiany or stary is None else None
+            self._db.execute(
+                "INSERT INTO podmioty (nip, regon, krs, dane, xml, data_zakonczenia, aktywny, sprawdzono, zmieniono)"
+                " VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (nip) DO UPDATE SET regon = excluded.regon, krs = excluded.krs,"
+                " dane = excluded.dane, xml = excluded.xml, data_zakonczenia = excluded.data_zakonczenia,"
+                " aktywny = 1, sprawdzono = excluded.sprawdzono,"
+                " zmieniono = COALESCE(?, podmioty.zmieniono)",
+                (nip, dane.get("Regon"), krs, json.dumps(dane, ensure_ascii=False), xml, zakonczenie,
+                 teraz, zmieniono or teraz, zmieniono),
+            )
+            self._zapisz_zmiany(nip, teraz, zmiany)
+            self._db.commit()
+        return zmiany
+
+    def mark_missing(self, nip):
+        """Oznacza podmiot, którego GUS już nie zwraca (zmiana statusu trafia do dziennika)."""
+        teraz = time.time()
+        with self._lock:
+            wiersz = self._db.execute("SELECT aktywny FROM podmioty WHERE nip = ?", (nip,)).fetchone()
+            if wiersz is None:
+                return
+            if wiersz[0]:
+                self._db.execute(
+                    "UPDATE podmioty SET aktywny = 0, sprawdzono = ?, zmieniono = ? WHERE nip = ?", (teraz, teraz, nip)
+                )
+                self._zapisz_zmiany(nip, teraz, [(POLE_STATUSU, "aktywny", "brak")])
+            else:
+                self._db.execute("UPDATE podmioty SET sprawdzono = ? WHERE nip = ?", (teraz, nip))
+            self._db.commit()
+
+    def _zapisz_zmiany(self, nip, czas, zmiany):
+        self._db.executemany(
+            "INSERT INTO zmiany (czas, nip, pole, stara, nowa) VALUES (?, ?, ?, ?, ?)",
+            [(czas, nip, pole, stara, nowa) for pole, stara, nowa in zmiany],
+        )
+
+    def invalidate(self, nip):
+        """Wymusza ponowne sprawdzenie NIPu przy najbliższym odświeżaniu."""
+        with self._lock:
+            self._db.execute("UPDATE podmioty SET sprawdzono = 0 WHERE nip = ?", (nip,))
+            self._db.commit()
+
+    # --- Dziennik zmian ---
+
+    def changes(self, since_id=0):
+        """Zmiany o id większym niż `since_id`, jako słowniki w kolejności zapisu."""
+        with self._lock:
+            wiersze = self._db.execute(
+                "SELECT id, czas, nip, pole, stara, nowa FROM zmiany WHERE id > ? ORDER BY id", (since_id,)
+            ).fetchall()
+        return [dict(zip(KOLUMNY_ZMIAN, wiersz)) for wiersz in wiersze]
+
+    def last_change_id(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM zmiany").fetchone()[0]
+
+    def export_changes(self, path, since_id=0):
+        """Zapisuje dziennik zmian do CSV lub JSONL. Zwraca id ostatniej zmiany (do następnego `since_id`)."""
+        zmiany = self.changes(since_id)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if os.path.splitext(path)[1].lower() in (".jsonl", ".json"):
+                for zmiana in zmiany:
+                    f.write(json.dumps(zmiana, ensure_ascii=False) + "\n")
+            else:
+                writer = csv.DictWriter(f, fieldnames=KOLUMNY_ZMIAN)
+                writer.writeheader()
+                writer.writerows(zmiany)
+        return zmiany[-1]["id"] if zmiany else since_id
+
+    def stats(self, max_age=MIRROR_MAX_AGE):
+        with self._lock:
+            wpisy, aktywne, nieaktualne = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(aktywny), 0), COALESCE(SUM(sprawdzono < ?), 0) FROM podmioty",
+                (time.time() - max_age,),
+            ).fetchone()
+            zmiany = self._db.execute("SELECT COUNT(*) FROM zmiany").fetchone()[0]
+        return {"entries": wpisy, "active": aktywne, "stale": nieaktualne, "changes": zmiany,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# --- Odświeżanie w tle ---
+
+
+class MirrorRefresher:
+    """Sprawdza ponownie w GUS tylko nieaktualne rekordy lustra, paczkami wyszukiwania zbiorczego.
+
+    `run_once()` wykonuje jeden przebieg; `start()` uruchamia przebiegi co
+    `interval` sekund w wątku w tle, a `stop()` je kończy.
+    """
+
+    def __init__(self, mirror, klucz, sesje, max_age=MIRROR_MAX_AGE, interval=REFRESH_INTERVAL,
+                 limit=None, limiter=None):
+        self.mirror = mirror
+        self.klucz = klucz
+        self.sesje = sesje
+        self.max_age = max_age
+        self.interval = interval
+        self.limit = limit
+        self.limiter = limiter
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Odświeża nieaktualne rekordy; zwraca liczniki: sprawdzone, zmienione, brak, błędy."""
+        liczniki = {"sprawdzone": 0, "zmienione": 0, "brak": 0, "błędy": 0}
+        nipy = self.mirror.stale(self.max_age, self.limit)
+        for i in range(0, len(nipy), MAX_W_ZAPYTANIU):
+            if self._stop.is_set():
+                break
+            paczka = nipy[i:i + MAX_W_ZAPYTANIU]
+            if self.limiter is not None:
+                self.limiter.acquire()
+            przed = self.mirror.last_change_id()
+            try:
+                wyniki = pobierz_dane_wiele([("nip", nip) for nip in paczka], self.klucz, self.sesje,
+                                            self.mirror, force_refresh=True)
+            except Exception as e:
+                from .sesja import is_auth_error
+                if is_auth_error(e):
+                    raise
+                liczniki["błędy"] += len(paczka)
+                continue
+            for (_, nip), dane in wyniki.items():
+                if dane is None:
+                    self.mirror.mark_missing(nip)
+                    liczniki["brak"] += 1
+            liczniki["sprawdzone"] += len(paczka)
+            liczniki["zmienione"] += len({zmiana["nip"] for zmiana in self.mirror.changes(przed)})
+        return liczniki
+
+    def _petla(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Błąd klucza lub usługi - spróbujemy w następnym przebiegu.
+                pass
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._petla, name="regon-lustro", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,294 @@
+"""Pomiary czasu zapytań do GUS i eksportu PDF.
+
+Każda faza (logowanie, wyszukiwanie, raport, parsowanie odpowiedzi, PDF)
+jest mierzona w bloku `span`, który zapisuje czas do histogramu fazy,
+a wyjątek zlicza według klasy błędu (np. "auth", "http_403", "sesja").
+
+Użycie:
+    with METRYKI.span("search", nip=nip):
+        ...
+    METRYKI.save("metryki.prom")     # format Prometheus (textfile collector)
+    METRYKI.save("metryki.json")     # JSON z p50/p95/p99 dla każdej fazy
+
+Profilowanie (cProfile) włącza `METRYKI.enable_profiling()`; profil zbiera
+się ze wszystkich wątków i jest zapisywany przez `dump_profile(plik)`.
+Naraz profilowany jest jeden blok `span` - od Pythona 3.12 może działać tylko
+jeden profiler, więc bloki z innych wątków w tym czasie nie są profilowane.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# --- Konfiguracja i stałe ---
+
+# "lookup" obejmuje całe zapytanie do GUS (z logowaniem i raportami), "pdf_batch" cały eksport wielu firm,
+# "backoff" to przerwy przed ponowieniem zapytania (z klasą błędu, który je spowodował),
+# a "http" - obsługa zapytań przez serwer regon-cli serve.
+FAZY = ("lookup", "login", "search", "report", "parse", "pdf", "pdf_batch", "backoff", "http")
+# Górne granice kubełków histogramu w sekundach.
+KUBELKI = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Kwantyle liczone są z ostatnich pomiarów, żeby pokazywały bieżący stan usługi.
+MAX_PROBEK = 2048
+MAX_SPANOW = 1000
+KWANTYLE = (0.5, 0.95, 0.99)
+
+# Ścieżki plików ustawiane zmiennymi środowiskowymi (GUI i regon-cli).
+METRICS_ENV = "REGON_METRICS"
+PROFILE_ENV = "REGON_PROFILE"
+
+
+def klasa_bledu(e):
+    """Krótka nazwa klasy błędu do liczników, np. "auth", "http_403", "timeout"."""
+    from .limiter import ServiceError
+    from .sesja import is_auth_error, is_session_error
+
+    tekst = str(e)
+    if "403" in tekst:
+        return "http_403"
+    if is_auth_error(e):
+        return "auth"
+    if is_session_error(e):
+        return "sesja"
+    if str(getattr(e, "code", "")) == "4":
+        return "brak_danych"
+    if isinstance(e, ServiceError):
+        return "usluga"
+    if isinstance(e, TimeoutError) or "Timeout" in type(e).__name__:
+        return "timeout"
+    if isinstance(e, (ConnectionError, OSError)) or "Connection" in type(e).__name__:
+        return "polaczenie"
+    return type(e).__name__
+
+
+def _kwantyl(posortowane, q):
+    if not posortowane:
+        return None
+    indeks = min(len(posortowane) - 1, max(0, round(q * len(posortowane) + 0.5) - 1))
+    return round(posortowane[indeks], 6)
+
+
+class _Histogram:
+    __slots__ = ("kubelki", "suma", "liczba", "maks", "probki")
+
+    def __init__(self, max_probek):
+        self.kubelki = [0] * len(KUBELKI)
+        self.suma = 0.0
+        self.liczba = 0
+        self.maks = 0.0
+        self.probki = deque(maxlen=max_probek)
+
+    def dodaj(self, sekundy):
+        for i, granica in enumerate(KUBELKI):
+            if sekundy <= granica:
+                self.kubelki[i] += 1
+                break
+        self.suma += sekundy
+        self.liczba += 1
+        self.maks = max(self.maks, sekundy)
+        self.probki.append(sekundy)
+
+
+class Metryki:
+    """Histogramy czasu i liczniki błędów dla faz zapytań (bezpieczne dla wątków)."""
+
+    def __init__(self, max_probek=MAX_PROBEK, max_spanow=MAX_SPANOW):
+        self.max_probek = max_probek
+        self.spans = deque(maxlen=max_spanow)
+        self._histogramy = {}
+        self._bledy = {}
+        self._liczniki = {}
+        self._lock = threading.Lock()
+        self._profil = None
+        self._profilowane_fazy = None
+        self._profilowanie = threading.Lock()
+
+    @contextmanager
+    def span(self, faza, **atrybuty):
+        """Mierzy czas bloku jako fazę `faza`; wyjątki są liczone i przekazywane dalej."""
+        profiler = self._start_profilu(faza)
+        start = time.perf_counter()
+        blad = None
+        try:
+            yield
+        except BaseException as e:
+            blad = klasa_bledu(e)
+            raise
+        finally:
+            czas = time.perf_counter() - start
+            if profiler is not None:
+                self._stop_profilu(profiler)
+            self.observe(faza, czas, blad, atrybuty)
+
+    def observe(self, faza, sekundy, blad=None, atrybuty=None):
+        """Zapisuje pomiar zmierzony poza `span` (np. w innym procesie)."""
+        with self._lock:
+            histogram = self._histogramy.get(faza)
+            if histogram is None:
+                histogram = self._histogramy[faza] = _Histogram(self.max_probek)
+            histogram.dodaj(sekundy)
+            if blad is not None:
+                self._bledy[(faza, blad)] = self._bledy.get((faza, blad), 0) + 1
+            self.spans.append({"faza": faza, "start": time.time() - sekundy, "czas": sekundy,
+                               "blad": blad, **(atrybuty or {})})
+
+    def count(self, nazwa, ile=1):
+        """Zwiększa licznik zdarzeń `nazwa` (np. "singleflight_shared")."""
+        with self._lock:
+            self._liczniki[nazwa] = self._liczniki.get(nazwa, 0) + ile
+
+    def reset(self):
+        with self._lock:
+            self._histogramy.clear()
+            self._bledy.clear()
+            self._liczniki.clear()
+            self.spans.clear()
+
+    def snapshot(self):
+        """Słownik {"fazy": {faza: {count, sum, max, p50, p95, p99}}, "bledy": {...}, "liczniki": {...}}."""
+        with self._lock:
+            fazy = {}
+            for faza, h in self._histogramy.items():
+                posortowane = sorted(h.probki)
+                fazy[faza] = {"count": h.liczba, "sum": round(h.suma, 6), "max": round(h.maks, 6)}
+                for q in KWANTYLE:
+                    fazy[faza][f"p{int(q * 100)}"] = _kwantyl(posortowane, q)
+            bledy = {}
+            for (faza, klasa), liczba in self._bledy.items():
+                bledy.setdefault(faza, {})[klasa] = liczba
+            liczniki = dict(self._liczniki)
+        return {"fazy": fazy, "bledy": bledy, "liczniki": liczniki}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Tekst w formacie ekspozycji Prometheusa."""
+        with self._lock:
+            histogramy = {faza: (list(h.kubelki), h.suma, h.liczba) for faza, h in self._histogramy.items()}
+            bledy = dict(self._bledy)
+            liczniki = dict(self._liczniki)
+        linie = [
+            "# HELP regon_phase_seconds Czas faz zapytań do GUS i eksportu PDF.",
+            "# TYPE regon_phase_seconds histogram",
+        ]
+        for faza, (kubelki, suma, liczba) in sorted(histogramy.items()):
+            narastajaco = 0
+            for granica, ile in zip(KUBELKI, kubelki):
+                narastajaco += ile
+                linie.append(f'regon_phase_seconds_bucket{{phase="{faza}",le="{granica}"}} {narastajaco}')
+            linie.append(f'regon_phase_seconds_bucket{{phase="{faza}",le="+Inf"}} {liczba}')
+            linie.append(f'regon_phase_seconds_sum{{phase="{faza}"}} {suma:.6f}')
+            linie.append(f'regon_phase_seconds_count{{phase="{faza}"}} {liczba}')
+        linie += [
+            "# HELP regon_phase_latency_seconds Kwantyle czasu faz z ostatnich pomiarów.",
+            "# TYPE regon_phase_latency_seconds gauge",
+        ]
+        for faza, wartosci in sorted(self.snapshot()["fazy"].items()):
+            for q in KWANTYLE:
+                wartosc = wartosci[f"p{int(q * 100)}"]
+                if wartosc is not None:
+                    linie.append(f'regon_phase_latency_seconds{{phase="{faza}",quantile="{q}"}} {wartosc:.6f}')
+        linie += [
+            "# HELP regon_errors_total Błędy według fazy i klasy.",
+            "# TYPE regon_errors_total counter",
+        ]
+        for (faza, klasa), liczba in sorted(bledy.items()):
+            linie.append(f'regon_errors_total{{phase="{faza}",class="{klasa}"}} {liczba}')
+        linie += [
+            "# HELP regon_events_total Liczniki zdarzeń (np. zapytania połączone przez single-flight).",
+            "# TYPE regon_events_total counter",
+        ]
+        for nazwa, liczba in sorted(liczniki.items()):
+            linie.append(f'regon_events_total{{name="{nazwa}"}} {liczba}')
+        return "\n".join(linie) + "\n"
+
+    def save(self, path):
+        """Zapisuje metryki do pliku: .prom/.txt w formacie Prometheusa, inne jako JSON.
+
+        Zapis jest atomowy (plik tymczasowy + zamiana), więc kolektor nie odczyta połowy pliku.
+        """
+        prometheus = os.path.splitext(path)[1].lower() in (".prom", ".txt")
+        tresc = self.to_prometheus() if prometheus else self.to_json()
+        tymczasowy = f"{path}.tmp"
+        with open(tymczasowy, "w", encoding="utf-8") as f:
+            f.write(tresc)
+        os.replace(tymczasowy, path)
+
+    # --- Profilowanie ---
+
+    def enable_profiling(self, fazy=None):
+        """Profiluje (cProfile) bloki `span` z podanych faz, domyślnie wszystkich."""
+        import pstats
+        self._profilowane_fazy = set(fazy) if fazy else None
+        with self._lock:
+            if self._profil is None:
+                self._profil = pstats.Stats()
+
+    def _start_profilu(self, faza):
+        if self._profil is None:
+            return None
+        if self._profilowane_fazy is not None and faza not in self._profilowane_fazy:
+            return None
+        # Zajęte - profilowany jest już inny blok (w tym lub innym wątku); ten pomijamy.
+        if not self._profilowanie.acquire(blocking=False):
+            return None
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: aktywne jest inne narzędzie profilujące (np. debugger albo coverage).
+            self._profilowanie.release()
+            return None
+        return profiler
+
+    def _stop_profilu(self, profiler):
+        profiler.disable()
+        self._profilowanie.release()
+        with self._lock:
+            self._profil.add(profiler)
+
+    def dump_profile(self, path):
+        """Zapisuje zebrany profil (do odczytu przez pstats lub snakeviz). Zwraca False, gdy pusty."""
+        with self._lock:
+            if self._profil is None or not self._profil.stats:
+                return False
+            self._profil.dump_stats(path)
+        return True
+
+
+# Wspólne metryki procesu - używane przez SessionManager, pobierz_dane i eksport PDF.
+METRYKI = Metryki()
+
+
+def span(faza, **atrybuty):
+    return METRYKI.span(faza, **atrybuty)
+
+
+def instrument_client(klient):
+    """Mierzy wywołania HTTP klienta litex.regon: wyszukiwania jako "search", raporty jako "report"."""
+    from litex.regon import FULL_REPORT_ENVELOPE, SEARCH_ENVELOPE
+
+    fazy = {SEARCH_ENVELOPE: "search", FULL_REPORT_ENVELOPE: "report"}
+    call = klient.call
+
+    def call_z_pomiarem(envelope, **args):
+        faza = fazy.get(envelope)
+        if faza is None:
+            return call(envelope, **args)
+        with METRYKI.span(faza):
+            return call(envelope, **args)
+
+    klient.call = call_z_pomiarem
+    return klient
+
+
+def save_from_env(metryki=METRYKI):
+    """Zapisuje metryki i profil do plików wskazanych w REGON_METRICS / REGON_PROFILE."""
+    if os.environ.get(METRICS_ENV):
+        metryki.save(os.environ[METRICS_ENV])
+    if os.environ.get(PROFILE_ENV):
+        metryki.dump_profile(os.environ[PROFILE_ENV])
@@ -0,0 +1,317 @@
+"""Lokalna atrapa usługi BIR1 do testów i pomiarów bez łączenia się z GUS.
+
+Serwer odtwarza nagrane odpowiedzi z katalogu `mock_data`:
+`szukaj/<NIP>.xml` to element `<dane>` wyniku wyszukiwania, a
+`raport/<REGON>_<nazwa raportu>.xml` to treść pełnego raportu. Odpowiedzi
+mają postać MTOM (multipart/related) jak w prawdziwej usłudze, więc działa
+z nią zarówno litex.regon, jak i AsyncREGONClient.
+
+Użycie:
+    with MockBIR() as bir:
+        sesje = SessionManager(service_url=bir.url)
+        pobierz_dane("5261040828", MOCK_API_KEY, sesje)
+
+Opóźnienie odpowiedzi (`latency`) i odsetek błędów HTTP 500 (`error_rate`)
+pozwalają odtworzyć wolną lub niestabilną usługę, a `add_synthetic(n)`
+dodaje n wygenerowanych podmiotów (np. do pomiarów w benchmarks/).
+
+albo z wiersza poleceń: python -m regon_core.mock_bir --port 8080
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+MOCK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_data")
+MOCK_API_KEY = "abcde12345abcde12345"
+SERVICE_PATH = "/wsBIR/UslugaBIRzewnPubl.svc"
+
+_BOUNDARY = "uuid:7e2f3b1c-0000-4c1a-9d51-mockbir00001+id=1"
+_NS_PUBL = "http://CIS/BIR/PUBL/2014/07"
+_NS_BIR = "http://CIS/BIR/2014/07"
+
+_BRAK_DANYCH = (
+    "<dane><ErrorCode>4</ErrorCode>"
+    "<ErrorMessagePl>Nie znaleziono podmiotu dla podanych kryteriów wyszukiwania.</ErrorMessagePl>"
+    "<ErrorMessageEn>No data found for the specified search criteria.</ErrorMessageEn></dane>"
+)
+
+
+def _tag(xml, nazwa):
+    m = re.search(rf"<(?:\w+:)?{nazwa}>(.*?)</(?:\w+:)?{nazwa}>", xml, re.S)
+    return m.group(1).strip() if m else None
+
+
+def _podziel(ciag, dlugosc):
+    return [ciag[i:i + dlugosc] for i in range(0, len(ciag), dlugosc)] if ciag else []
+
+
+def _z_cyfra_kontrolna(cyfry, wagi, modulo_10=False):
+    suma = sum(int(c) * w for c, w in zip(cyfry, wagi)) % 11
+    if modulo_10:
+        suma %= 10
+    return None if suma == 10 else cyfry + str(suma)
+
+
+def _syntetyczny_podmiot(i):
+    """Element `dane` i raporty wygenerowanego podmiotu: co trzeci to osoba prawna (Typ P)."""
+    # Dziewięć cyfr NIPu z numeru podmiotu; kolejne warianty, gdy cyfra kontrolna wypada 10.
+    nip = next(n for k in range(10)
+               if (n := _z_cyfra_kontrolna(f"{100000000 + i * 10 + k:09d}", (6, 5, 7, 2, 3, 4, 5, 6, 7))))
+    regon = _z_cyfra_kontrolna(f"{80000000 + i % 10000000:08d}", (8, 9, 2, 3, 4, 5, 6, 7), modulo_10=True)
+    prawna = i % 3 == 0
+    dane = (
+        f"<dane><Regon>{regon}</Regon><Nip>{nip}</Nip><StatusNip />"
+        f"<Nazwa>{'SPÓŁKA TESTOWA' if prawna else 'Firma Testowa'} {i} SP. Z O.O.</Nazwa>"
+        "<Wojewodztwo>MAZOWIECKIE</Wojewodztwo><Powiat>m. st. Warszawa</Powiat><Gmina>Śródmieście</Gmina>"
+        f"<Miejscowosc>Warszawa</Miejscowosc><KodPocztowy>00-{i % 1000:03d}</KodPocztowy>"
+        f"<Ulica>ul. Syntetyczna</Ulica><NrNieruchomosci>{i % 200 + 1}</NrNieruchomosci><NrLokalu />"
+        f"<Typ>{'P' if prawna else 'F'}</Typ><SilosID>{'6' if prawna else '1'}</SilosID>"
+        "<DataZakonczeniaDzialalnosci /><MiejscowoscPoczty>Warszawa</MiejscowoscPoczty></dane>"
+    )
+    if prawna:
+        zakonczenie = "2020-12-31" if i % 9 == 0 else ""
+        raporty = {(regon, "PublDaneRaportPrawna"): (
+            f"<dane><praw_regon9>{regon}</praw_regon9><praw_nip>{nip}</praw_nip>"
+            f"<praw_numerWRejestrzeEwidencji>{i % 10 ** 10:010d}</praw_numerWRejestrzeEwidencji>"
+            f"<praw_dataZakonczeniaDzialalnosci>{zakonczenie}</praw_dataZakonczeniaDzialalnosci></dane>"
+        )}
+    else:
+        raporty = {
+            (regon, "PublDaneRaportDzialalnoscFizycznejCeidg"): f"<dane><fiz_regon9>{regon}</fiz_regon9></dane>",
+            (regon, "PublDaneRaportFizycznaOsoba"): f"<dane><fiz_regon9>{regon}</fiz_regon9></dane>",
+        }
+    return nip, dane, raporty
+
+
+class _Nagrania:
+    """Nagrane odpowiedzi wczytane z katalogu, z indeksami po NIP, REGON i KRS."""
+
+    def __init__(self, katalog):
+        self.podmioty = []
+        self.po_nip = {}
+        self.po_regon = {}
+        self.po_krs = {}
+        self.raporty = {}
+        for sciezka in sorted(glob.glob(os.path.join(katalog, "raport", "*.xml"))):
+            nazwa = os.path.splitext(os.path.basename(sciezka))[0]
+            regon, raport = nazwa.split("_", 1)
+            with open(sciezka, "r", encoding="utf-8") as f:
+                self.raporty[(regon, raport)] = f.read().strip()
+        for sciezka in sorted(glob.glob(os.path.join(katalog, "szukaj", "*.xml"))):
+            with open(sciezka, "r", encoding="utf-8") as f:
+                self.dodaj(f.read().strip())
+
+    def dodaj(self, dane_xml, raporty=None):
+        self.podmioty.append(dane_xml)
+        nip, regon = _tag(dane_xml, "Nip"), _tag(dane_xml, "Regon")
+        self.po_nip[nip] = dane_xml
+        self.po_regon[regon] = dane_xml
+        for (regon_raportu, raport), tresc in (raporty or {}).items():
+            self.raporty[(regon_raportu, raport)] = tresc
+        prawna = self.raporty.get((regon, "PublDaneRaportPrawna"))
+        krs = _tag(prawna, "praw_numerWRejestrzeEwidencji") if prawna else None
+        if krs:
+            self.po_krs[krs] = dane_xml
+
+
+class MockBIR:
+    """Serwer HTTP (keep-alive) udający UslugaBIRzewnPubl.svc.
+
+    Zlicza żądania według operacji w `requests` (np. requests["DaneSzukajPodmioty"]).
+    Każda odpowiedź jest opóźniana o `latency` sekund, a odsetek `error_rate`
+    żądań (poza logowaniem) kończy się błędem HTTP 500; `seed` ustala losowanie.
+    """
+
+    def __init__(self, data_dir=MOCK_DATA_DIR, host="127.0.0.1", port=0, api_key=MOCK_API_KEY,
+                 latency=0.0, error_rate=0.0, seed=None):
+        self.api_key = api_key
+        self.latency = latency
+        self.error_rate = error_rate
+        self._losowe = random.Random(seed)
+        self.nagrania = _Nagrania(data_dir)
+        self.requests = {}
+        self._sesje = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{SERVICE_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-bir", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add_synthetic(self, count, start=0):
+        """Dodaje `count` wygenerowanych podmiotów (z poprawnymi NIP i REGON); zwraca ich NIPy."""
+        nipy = []
+        for i in range(start, start + count):
+            nip, dane, raporty = _syntetyczny_podmiot(i)
+            self.nagrania.dodaj(dane, raporty)
+            nipy.append(nip)
+        return nipy
+
+    def _czy_blad(self, akcja):
+        if not self.error_rate or akcja == "Zaloguj":
+            return False
+        with self._lock:
+            if self._losowe.random() >= self.error_rate:
+                return False
+            self.requests["błędy"] = self.requests.get("błędy", 0) + 1
+        return True
+
+    # --- Operacje BIR1 ---
+
+    def handle(self, akcja, envelope, sid):
+        """Zwraca (nazwa elementu wyniku, przestrzeń nazw, treść wyniku) dla operacji."""
+        with self._lock:
+            self.requests[akcja] = self.requests.get(akcja, 0) + 1
+            zalogowany = sid in self._sesje
+
+        if akcja == "Zaloguj":
+            if _tag(envelope, "pKluczUzytkownika") != self.api_key:
+                return "ZalogujResult", _NS_PUBL, ""
+            nowy_sid = uuid.uuid4().hex[:20]
+            with self._lock:
+                self._sesje.add(nowy_sid)
+            return "ZalogujResult", _NS_PUBL, nowy_sid
+
+        if akcja == "Wyloguj":
+            with self._lock:
+                usunieta = _tag(envelope, "pIdentyfikatorSesji") in self._sesje
+                self._sesje.discard(_tag(envelope, "pIdentyfikatorSesji"))
+            return "WylogujResult", _NS_PUBL, "true" if usunieta else "false"
+
+        if akcja == "GetValue":
+            wartosci = {"KomunikatKod": "4" if zalogowany else "7",
+                        "KomunikatTresc": "Nie znaleziono podmiotu dla podanych kryteriów wyszukiwania."
+                        if zalogowany else "Brak sesji. Sesja wygasła lub przekazano nieprawidłowy identyfikator sesji.",
+                        "StatusSesji": "1" if zalogowany else "0"}
+            return "GetValueResult", _NS_BIR, wartosci.get(_tag(envelope, "pNazwaParametru"), "")
+
+        if not zalogowany:
+            return f"{akcja}Result", _NS_PUBL, ""
+
+        if akcja == "DaneSzukajPodmioty":
+            return "DaneSzukajPodmiotyResult", _NS_PUBL, self._szukaj(envelope)
+
+        if akcja == "DanePobierzPelnyRaport":
+            tresc = self.nagrania.raporty.get((_tag(envelope, "pRegon"), _tag(envelope, "pNazwaRaportu")))
+            return "DanePobierzPelnyRaportResult", _NS_PUBL, f"<root>{tresc}</root>" if tresc else ""
+
+        return f"{akcja}Result", _NS_PUBL, ""
+
+    def _szukaj(self, envelope):
+        n = self.nagrania
+        trafienia = []
+        for klucz, indeks, dlugosc in (
+            ("Nip", n.po_nip, None), ("Regon", n.po_regon, None), ("Krs", n.po_krs, None),
+            ("Nipy", n.po_nip, 10), ("Regony9zn", n.po_regon, 9), ("Regony14zn", n.po_regon, 14),
+            ("Krsy", n.po_krs, 10),
+        ):
+            wartosc = _tag(envelope, klucz)
+            if not wartosc:
+                continue
+            for identyfikator in (_podziel(wartosc, dlugosc) if dlugosc else [wartosc]):
+                dane = indeks.get(identyfikator)
+                if dane is not None and dane not in trafienia:
+                    trafienia.append(dane)
+        return "<root>" + ("".join(trafienia) or _BRAK_DANYCH) + "</root>"
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                dlugosc = int(self.headers.get("Content-Length", 0))
+                envelope = self.rfile.read(dlugosc).decode("utf-8")
+                akcja = (_tag(envelope, "Action") or "").rsplit("/", 1)[-1]
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if mock._czy_blad(akcja):
+                    body = b"Internal Server Error"
+                    self.send_response(500)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                wynik, ns, tresc = mock.handle(akcja, envelope, self.headers.get("sid"))
+                body = _mtom(akcja, wynik, ns, tresc)
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type",
+                    f'multipart/related; type="application/xop+xml"; start="<http://tempuri.org/0>"; '
+                    f'boundary="{_BOUNDARY}"; start-info="application/soap+xml"',
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _mtom(akcja, wynik, ns, tresc):
+    envelope = (
+        '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" xmlns:a="http://www.w3.org/2005/08/addressing">'
+        f'<s:Header><a:Action s:mustUnderstand="1">{ns}/IUsluga/{akcja}Response</a:Action></s:Header>'
+        f'<s:Body><{akcja}Response xmlns="{ns}"><{wynik}>{escape(tresc)}</{wynik}></{akcja}Response></s:Body>'
+        '</s:Envelope>'
+    )
+    return (
+        f"\r\n--{_BOUNDARY}\r\n"
+        "Content-ID: <http://tempuri.org/0>\r\n"
+        "Content-Transfer-Encoding: 8bit\r\n"
+        'Content-Type: application/xop+xml;charset=utf-8;type="application/soap+xml"\r\n\r\n'
+        f"{envelope}\r\n--{_BOUNDARY}--\r\n"
+    ).encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Atrapa usługi BIR1 odtwarzająca nagrane odpowiedzi.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data", default=MOCK_DATA_DIR, help="katalog z nagranymi odpowiedziami")
+    parser.add_argument("--latency", type=float, default=0.0, help="opóźnienie każdej odpowiedzi w sekundach")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek żądań kończonych błędem HTTP 500")
+    parser.add_argument("--synthetic", type=int, default=0, help="liczba wygenerowanych podmiotów do dodania")
+    args = parser.parse_args(argv)
+    bir = MockBIR(args.data, args.host, args.port, latency=args.latency, error_rate=args.error_rate)
+    if args.synthetic:
+        bir.add_synthetic(args.synthetic)
+    print(f"Atrapa BIR1: {bir.url} (klucz API: {bir.api_key})")
+    try:
+        bir._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
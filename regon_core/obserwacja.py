@@ -0,0 +1,371 @@
+"""Lista obserwowanych kontrahentów z harmonogramem sprawdzeń i powiadamianiem o zmianach.
+
+Każdy obserwowany NIP ma wagę ryzyka i termin następnego sprawdzenia:
+podmiot o ryzyku 1 jest sprawdzany raz na `okres` (domyślnie dobę), o ryzyku
+2 - dwa razy częściej itd. `WatchScheduler` sprawdza w GUS tylko podmioty,
+których termin minął (najpierw najbardziej zaległe), w tempie wyznaczonym
+przez dzienny limit zapytań HTTP, rozłożonym równomiernie na całą dobę.
+Nowe dane są porównywane z ostatnią migawką, a zmiany (w tym skreślenie
+z REGON) trafiają jako zdarzenia do pliku JSON Lines albo na adres webhooka.
+
+Użycie:
+    regon-cli watch add --from kontrahenci.csv --risk 2
+    regon-cli watch run --daily-limit 20000 --webhook http://127.0.0.1:9000/regon
+    regon-cli watch run --once --budget 500 --events zmiany.jsonl
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .gus import MAX_W_ZAPYTANIU, pobierz_dane_wiele, rozpoznaj_identyfikator
+from .lustro import POLE_STATUSU, data_zakonczenia, roznice
+from .metryki import METRYKI
+
+# --- Konfiguracja i stałe ---
+
+WATCHLIST_FILE = "regon_obserwowane.sqlite"
+EVENTS_FILE = "regon_zmiany_obserwowanych.jsonl"
+DZIEN = 24 * 60 * 60
+# Podmiot o ryzyku 1 jest sprawdzany raz na OKRES sekund, o ryzyku r - r razy częściej.
+OKRES = DZIEN
+# Domyślny dzienny limit zapytań HTTP do GUS dla obserwacji (wyszukiwania i raporty razem).
+DZIENNY_LIMIT = 20000
+# Co ile sekund harmonogram sprawdza, czy są podmioty do sprawdzenia.
+INTERWAL = 60
+# Po błędzie usługi podmiot wraca do kolejki po tylu sekundach.
+OPOZNIENIE_BLEDU = 60 * 60
+# Najwięcej zdarzeń wysyłanych naraz do pliku lub webhooka.
+PACZKA_ZDARZEN = 500
+
+
+def koszt_sprawdzenia(typy):
+    """Szacowana liczba zapytań HTTP dla NIPów o podanych typach (P, F lub None - nieznany).
+
+    Jedno wyszukiwanie obejmuje do 20 NIPów, a osoba prawna (lub podmiot
+    jeszcze nie sprawdzany) wymaga dodatkowo raportu z datą zakończenia działalności.
+    """
+    paczki = -(-len(typy) // MAX_W_ZAPYTANIU)
+    return paczki + sum(1 for typ in typy if typ != "F")
+
+
+class Watchlist:
+    """Obserwowane NIPy (SQLite): waga ryzyka, termin sprawdzenia, ostatnia migawka danych i zdarzenia do wysłania."""
+
+    def __init__(self, path=WATCHLIST_FILE, okres=OKRES):
+        self.path = path
+        self.okres = okres
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS obserwowane ("
+            " nip TEXT PRIMARY KEY,"
+            " ryzyko REAL NOT NULL DEFAULT 1,"
+            " dodano REAL NOT NULL,"
+            " sprawdzono REAL,"
+            " nastepne REAL NOT NULL,"
+            " typ TEXT,"
+            " migawka TEXT,"
+            " aktywny INTEGER NOT NULL DEFAULT 1,"
+            " bledy INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS obserwowane_nastepne ON obserwowane (nastepne);"
+            "CREATE TABLE IF NOT EXISTS zdarzenia ("
+            " id INTEGER PRIMARY KEY,"
+            " czas REAL NOT NULL,"
+            " nip TEXT NOT NULL,"
+            " tresc TEXT NOT NULL,"
+            " wyslano INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS zdarzenia_wyslano ON zdarzenia (wyslano, id);"
+        )
+        self._db.commit()
+
+    def _termin(self, sprawdzono, ryzyko):
+        return sprawdzono + self.okres / max(ryzyko, 0.01)
+
+    # --- Lista ---
+
+    def add(self, identyfikatory, ryzyko=1.0):
+        """Dodaje NIPy do obserwacji (dla już obserwowanych zmienia ryzyko). Zwraca liczbę nowych.
+
+        Nowe podmioty są należne od razu; pierwsze sprawdzenie zapisuje
+        migawkę bez zdarzenia.
+        """
+        teraz = time.time()
+        nipy = []
+        for tekst in identyfikatory:
+            rodzaj, numer = rozpoznaj_identyfikator(tekst)
+            if rodzaj != "nip":
+                raise ValueError(f"Obserwować można tylko NIPy: {tekst}")
+            nipy.append(numer)
+        with self._lock:
+            przed = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO obserwowane (nip, ryzyko, dodano, nastepne) VALUES (?, ?, ?, ?)",
+                [(nip, ryzyko, teraz, teraz) for nip in nipy],
+            )
+            nowe = self._db.total_changes - przed
+            # Zmiana ryzyka przesuwa termin już obserwowanych podmiotów.
+            self._db.executemany(
+                "UPDATE obserwowane SET ryzyko = ?,"
+                " nastepne = CASE WHEN sprawdzono IS NULL THEN nastepne ELSE sprawdzono + ? / ? END"
+                " WHERE nip = ? AND ryzyko != ?",
+                [(ryzyko, self.okres, max(ryzyko, 0.01), nip, ryzyko) for nip in nipy],
+            )
+            self._db.commit()
+        return nowe
+
+    def remove(self, nipy):
+        with self._lock:
+            przed = self._db.total_changes
+            self._db.executemany("DELETE FROM obserwowane WHERE nip = ?", [(nip,) for nip in nipy])
+            self._db.commit()
+            return self._db.total_changes - przed
+
+    def due(self, budzet, teraz=None):
+        """NIPy do sprawdzenia (najbardziej zaległe pierwsze), których koszt mieści się w `budzet` zapytań.
+
+        Zwraca (nipy, szacowany koszt).
+        """
+        teraz = time.time() if teraz is None else teraz
+        nipy, koszt = [], 0
+        with self._lock:
+            kursor = self._db.execute(
+                "SELECT nip, typ FROM obserwowane WHERE nastepne <= ? ORDER BY nastepne, ryzyko DESC", (teraz,)
+            )
+            for nip, typ in kursor:
+                # Co 20 NIPów nowe wyszukiwanie, a dla osoby prawnej także raport.
+                dodatkowy = (len(nipy) % MAX_W_ZAPYTANIU == 0) + (typ != "F")
+                if koszt + dodatkowy > budzet:
+                    break
+                nipy.append(nip)
+                koszt += dodatkowy
+            kursor.close()
+        return nipy, koszt
+
+    # --- Migawki i zdarzenia ---
+
+    def record_many(self, wyniki):
+        """Zapisuje wyniki sprawdzenia {nip: dane lub None}; zmiany względem migawek zapisuje jako zdarzenia.
+
+        Zwraca listę nowych zdarzeń.
+        """
+        teraz = time.time()
+        zdarzenia = []
+        with self._lock:
+            for nip, dane in wyniki.items():
+                wiersz = self._db.execute(
+                    "SELECT migawka, aktywny, ryzyko FROM obserwowane WHERE nip = ?", (nip,)
+                ).fetchone()
+                if wiersz is None:
+                    continue
+                migawka, aktywny, ryzyko = wiersz
+                stare = json.loads(migawka) if migawka else None
+                if dane is None:
+                    # GUS nie zwraca już podmiotu - zostawiamy ostatnią migawkę.
+                    zmiany = [(POLE_STATUSU, "aktywny", "brak")] if aktywny and stare is not None else []
+                    self._db.execute(
+                        "UPDATE obserwowane SET sprawdzono = ?, nastepne = ?, aktywny = 0, bledy = 0 WHERE nip = ?",
+                        (teraz, self._termin(teraz, ryzyko), nip),
+                    )
+                else:
+                    zmiany = roznice(stare, dane) if stare is not None else []
+                    if not aktywny:
+                        zmiany.append((POLE_STATUSU, "brak", "aktywny"))
+                    self._db.execute(
+                        "UPDATE obserwowane SET sprawdzono = ?, nastepne = ?, typ = ?, migawka = ?, aktywny = 1,"
+                        " bledy = 0 WHERE nip = ?",
+                        (teraz, self._termin(teraz, ryzyko), dane.get("Typ"), json.dumps(dane, ensure_ascii=False),
+                         nip),
+                    )
+                if zmiany:
+                    zdarzenie = {
+                        "czas": datetime.fromtimestamp(teraz).isoformat(timespec="seconds"),
+                        "nip": nip,
+                        "nazwa": (dane or stare).get("Nazwa"),
+                        # Skreślenie: nowa data zakończenia działalności albo podmiot zniknął z REGON.
+                        "skreslenie": dane is None or (data_zakonczenia(dane) is not None
+                                                       and data_zakonczenia(stare) is None),
+                        "zmiany": [{"pole": pole, "stara": stara, "nowa": nowa} for pole, stara, nowa in zmiany],
+                    }
+                    kursor = self._db.execute(
+                        "INSERT INTO zdarzenia (czas, nip, tresc) VALUES (?, ?, ?)",
+                        (teraz, nip, json.dumps(zdarzenie, ensure_ascii=False)),
+                    )
+                    zdarzenia.append({"id": kursor.lastrowid, **zdarzenie})
+            self._db.commit()
+        return zdarzenia
+
+    def record_error(self, nipy, opoznienie=OPOZNIENIE_BLEDU):
+        """Przesuwa sprawdzenie NIPów, których nie udało się pobrać, o `opoznienie` sekund."""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE obserwowane SET nastepne = ?, bledy = bledy + 1 WHERE nip = ?",
+                [(time.time() + opoznienie, nip) for nip in nipy],
+            )
+            self._db.commit()
+
+    def pending_events(self, limit=PACZKA_ZDARZEN):
+        """Zdarzenia jeszcze niewysłane, od najstarszych."""
+        with self._lock:
+            wiersze = self._db.execute(
+                "SELECT id, tresc FROM zdarzenia WHERE wyslano = 0 ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"id": id_, **json.loads(tresc)} for id_, tresc in wiersze]
+
+    def mark_sent(self, ids):
+        with self._lock:
+            self._db.executemany("UPDATE zdarzenia SET wyslano = 1 WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def stats(self):
+        """Liczniki listy i prognoza dziennej liczby zapytań potrzebnej przy bieżących ryzykach."""
+        with self._lock:
+            wpisy, nalezne, nieaktywne, prognoza = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nastepne <= ?), 0), COALESCE(SUM(aktywny = 0), 0),"
+                " COALESCE(SUM(ryzyko * (CASE WHEN typ = 'F' THEN 0 ELSE 1 END + 1.0 / ?)), 0)"
+                " FROM obserwowane",
+                (time.time(), MAX_W_ZAPYTANIU),
+            ).fetchone()
+            niewyslane = self._db.execute("SELECT COUNT(*) FROM zdarzenia WHERE wyslano = 0").fetchone()[0]
+        return {"entries": wpisy, "due": nalezne, "inactive": nieaktywne, "pending_events": niewyslane,
+                "calls_per_day": round(prognoza * DZIEN / self.okres)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# --- Odbiorcy zdarzeń ---
+
+
+class JsonlSink:
+    """Dopisuje zdarzenia do pliku JSON Lines."""
+
+    def __init__(self, path=EVENTS_FILE):
+        self.path = path
+
+    def send(self, zdarzenia):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(z, ensure_ascii=False) + "\n" for z in zdarzenia))
+
+
+class WebhookSink:
+    """Wysyła zdarzenia jako JSON {"zdarzenia": [...]} metodą POST; odpowiedź inna niż 2xx zgłasza wyjątek."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, zdarzenia):
+        import urllib.request
+
+        zapytanie = urllib.request.Request(
+            self.url, data=json.dumps({"zdarzenia": zdarzenia}, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"}, method="POST",
+        )
+        with urllib.request.urlopen(zapytanie, timeout=self.timeout) as odpowiedz:
+            odpowiedz.read()
+
+# --- Harmonogram ---
+
+
+class WatchScheduler:
+    """Sprawdza należne podmioty z listy obserwowanych w granicach dziennego limitu zapytań.
+
+    W pętli (`start()`) budżet rośnie o `dzienny_limit` na dobę, co `interval`
+    sekund, więc sprawdzenia rozkładają się równomiernie, a niewykorzystany
+    budżet nie kumuluje się ponad dwa interwały (albo ponad koszt sprawdzenia
+    jednego podmiotu, jeśli jest większy). Zdarzenia trafiają do `sink`
+    (JsonlSink lub WebhookSink); nieudana wysyłka jest ponawiana w następnym
+    przebiegu.
+    """
+
+    def __init__(self, watchlist, klucz, sesje, sink=None, dzienny_limit=DZIENNY_LIMIT, interval=INTERWAL):
+        self.watchlist = watchlist
+        self.klucz = klucz
+        self.sesje = sesje
+        self.sink = sink if sink is not None else JsonlSink()
+        self.dzienny_limit = dzienny_limit
+        self.interval = interval
+        self.liczniki = {"sprawdzone": 0, "zdarzenia": 0, "brak": 0, "błędy": 0, "zapytania": 0, "wysłane": 0}
+        self._budzet = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, budzet=None):
+        """Sprawdza należne podmioty za najwyżej `budzet` zapytań (domyślnie dzienny limit); zwraca liczniki przebiegu."""
+        liczniki = dict.fromkeys(self.liczniki, 0)
+        nipy, koszt = self.watchlist.due(self.dzienny_limit if budzet is None else budzet)
+        for i in range(0, len(nipy), MAX_W_ZAPYTANIU):
+            if self._stop.is_set():
+                break
+            paczka = nipy[i:i + MAX_W_ZAPYTANIU]
+            try:
+                wyniki = pobierz_dane_wiele([("nip", nip) for nip in paczka], self.klucz, self.sesje,
+                                            force_refresh=True)
+            except Exception as e:
+                from .sesja import is_auth_error
+                if is_auth_error(e):
+                    raise
+                self.watchlist.record_error(paczka)
+                liczniki["błędy"] += len(paczka)
+                continue
+            zdarzenia = self.watchlist.record_many({nip: dane for (_, nip), dane in wyniki.items()})
+            liczniki["sprawdzone"] += len(paczka)
+            liczniki["brak"] += sum(1 for dane in wyniki.values() if dane is None)
+            liczniki["zdarzenia"] += len(zdarzenia)
+        liczniki["zapytania"] = koszt
+        liczniki["wysłane"] = self.flush()
+        for nazwa, ile in liczniki.items():
+            self.liczniki[nazwa] += ile
+        METRYKI.count("watch_checked", liczniki["sprawdzone"])
+        METRYKI.count("watch_events", liczniki["zdarzenia"])
+        return liczniki
+
+    def flush(self):
+        """Wysyła zaległe zdarzenia do odbiorcy; zwraca liczbę wysłanych."""
+        wyslane = 0
+        while True:
+            zdarzenia = self.watchlist.pending_events()
+            if not zdarzenia:
+                return wyslane
+            try:
+                self.sink.send(zdarzenia)
+            except Exception:
+                # Odbiorca niedostępny - zdarzenia czekają w bazie na następny przebieg.
+                METRYKI.count("watch_sink_errors")
+                return wyslane
+            self.watchlist.mark_sent([z["id"] for z in zdarzenia])
+            wyslane += len(zdarzenia)
+
+    def _przebieg(self, uplynelo):
+        """Dolicza budżet za `uplynelo` sekund i sprawdza należne podmioty, na które on starcza."""
+        # Pułap to dwa interwały, ale nie mniej niż pełne sprawdzenie jednego podmiotu (wyszukiwanie
+        # i raport) - inaczej przy małym dziennym limicie budżet nigdy nie starczyłby na żaden NIP.
+        pulap = max(2 * self.dzienny_limit * self.interval / DZIEN, koszt_sprawdzenia([None]))
+        self._budzet = min(pulap, self._budzet + self.dzienny_limit * uplynelo / DZIEN)
+        try:
+            self._budzet -= self.run_once(int(self._budzet))["zapytania"]
+        except Exception:
+            # Błąd klucza lub usługi - spróbujemy w następnym przebiegu.
+            pass
+
+    def _petla(self):
+        ostatnio = time.monotonic()
+        while not self._stop.is_set():
+            teraz = time.monotonic()
+            self._przebieg(teraz - ostatnio)
+            ostatnio = teraz
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._petla, name="regon-obserwacja", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
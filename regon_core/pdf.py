@@ -0,0 +1,474 @@
+"""Raporty PDF budowane z rekordów danych podmiotów według szablonu.
+
+Szablon (`ReportTemplate`) określa pola i układ raportu:
+
+    karta   - każdy podmiot jako tabela "etykieta | wartość"; kolejne podmioty
+              następują po sobie na stronie i nie są dzielone między strony
+    tabela  - zestawienie wielu podmiotów: wiersz na podmiot, kolumna na pole,
+              nagłówek kolumn powtarzany na każdej stronie (strona pozioma)
+
+Rekord to słownik danych podmiotu (jak z `pobierz_dane`) albo lista par
+(etykieta, wartość), np. pola wybrane w GUI. Szerokości etykiet i kolumn
+szablon liczy raz i wykorzystuje w kolejnych dokumentach.
+"""
+import copy
+import os
+import threading
+import time
+from datetime import date
+from io import BytesIO
+from itertools import chain, islice
+
+from .gus import POLA_DO_WYSWIETLENIA
+from .metryki import METRYKI
+
+# --- Konfiguracja i stałe ---
+
+FONT_FAMILY = "DejaVuSansCondensed"
+FONT_FILE = "DejaVuSansCondensed.ttf"
+
+# Liczba firm przekazywana naraz do jednego procesu przy eksporcie do osobnych plików.
+CHUNK_SIZE = 20
+# Znacznik liczby stron w stopce; dłuższy niż "{nb}", żeby zmieściły się liczby czterocyfrowe.
+NB_ALIAS = "{nb_stron}"
+
+TYTUL = "Raport Danych REGON"
+UKLADY = ("karta", "tabela")
+ROZMIAR_CZCIONKI = 10
+WYSOKOSC_WIERSZA = 6
+# Najszersza kolumna etykiet w układzie karty (mm) - dłuższe etykiety są skracane.
+MAX_ETYKIETA = 70
+# Odstęp między kolejnymi podmiotami w układzie karty (mm).
+ODSTEP_REKORDOW = 4
+# Najwęższa kolumna zestawienia (mm) i liczba rekordów, z których szacowane są szerokości kolumn.
+MIN_KOLUMNA = 12
+PROBKA_KOLUMN = 200
+# Najszersza kolumna zestawienia jako część szerokości strony (np. nazwa firmy).
+MAX_KOLUMNA = 0.3
+KOLOR_ETYKIET = (235, 235, 235)
+
+
+class FontError(RuntimeError):
+    """Nie udało się załadować czcionki z polskimi znakami."""
+
+
+_pdf_class = None
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+
+def _get_pdf_class():
+    # fpdf jest importowany dopiero przy pierwszym eksporcie.
+    global _pdf_class
+    if _pdf_class is None:
+        from fpdf import FPDF
+
+        # Nagłówek i stopka używają tego samego pliku czcionki co treść (plik DejaVu nie ma
+        # osobnych odmian B/I), więc w dokumencie osadzana jest tylko jedna czcionka.
+        class PDF(FPDF):
+            tytul = TYTUL
+            # Funkcja rysująca nagłówek kolumn zestawienia na początku każdej strony.
+            naglowek_tabeli = None
+
+            def header(self):
+                self.set_font(FONT_FAMILY, '', 12)
+                self.cell(0, 10, self.tytul, align='C', new_x='LMARGIN', new_y='NEXT')
+                self.ln(10)
+                if self.naglowek_tabeli is not None:
+                    self.naglowek_tabeli(self)
+                self.gora_strony = self.get_y()
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font(FONT_FAMILY, '', 8)
+                self.cell(0, 10, f'Strona {self.page_no()}/{NB_ALIAS}', align='C')
+
+        _pdf_class = PDF
+    return _pdf_class
+
+
+def _resolve_font(font_file):
+    # Najpierw katalog bieżący (jak dotąd), potem katalog aplikacji - dla regon-cli uruchamianego z innego miejsca.
+    if os.path.exists(font_file) or os.path.isabs(font_file):
+        return font_file
+    obok_aplikacji = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), font_file)
+    return obok_aplikacji if os.path.exists(obok_aplikacji) else font_file
+
+
+def _load_font(font_file):
+    """Parsuje czcionkę raz na proces; zwraca (wzorzec TTFFont, zawartość pliku)."""
+    with _fonts_lock:
+        if font_file not in _fonts:
+            from fpdf import FPDF
+
+            wzorzec = FPDF()
+            try:
+                wzorzec.add_font(FONT_FAMILY, '', _resolve_font(font_file))
+                with open(wzorzec.fonts[FONT_FAMILY.lower()].ttffile, "rb") as f:
+                    dane_pliku = f.read()
+            except (RuntimeError, OSError) as e:
+                raise FontError(f"Nie można załadować czcionki {font_file}. {e}") from e
+            _fonts[font_file] = (wzorzec.fonts[FONT_FAMILY.lower()], dane_pliku)
+        return _fonts[font_file]
+
+
+# Pola TTFFont (fpdf2 2.8) podmieniane przy kopiowaniu wzorca - nie są częścią publicznego API fpdf2.
+_POLA_KOPII = ("i", "cw", "missing_glyphs", "biggest_size_pt", "subset", "ttfont", "_hbfont")
+
+
+def _add_cached_font(pdf, font_file):
+    wzorzec, dane_pliku = _load_font(font_file)
+    try:
+        from fontTools import ttLib
+        from fpdf.fonts import SubsetMap
+
+        if not all(hasattr(wzorzec, pole) for pole in _POLA_KOPII):
+            raise AttributeError("nieobsługiwana wersja fpdf2")
+        # Metryki i mapy znaków są współdzielone ze wzorcem; stan zależny od dokumentu
+        # (jak w TTFFont.__deepcopy__) zaczyna się od zera. Tabele fontu dostają świeży
+        # obiekt z pamięci, bo fpdf przycina je w miejscu przy zapisie (subsetting).
+        font = copy.copy(wzorzec)
+        font.i = len(pdf.fonts) + 1
+        font.cw = wzorzec.cw.copy()
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font.subset = SubsetMap(font)
+        font.ttfont = ttLib.TTFont(BytesIO(dane_pliku), recalcTimestamp=False, lazy=True)
+        font._hbfont = None
+    except (ImportError, AttributeError, TypeError):
+        # Inna budowa TTFFont niż w przetestowanym fpdf2 - zwykłe (wolniejsze) parsowanie czcionki.
+        pdf.add_font(FONT_FAMILY, '', wzorzec.ttffile)
+        return
+    pdf.fonts[FONT_FAMILY.lower()] = font
+
+
+def get_current_date():
+    return date.today().strftime("%d-%m-%Y")
+
+
+def new_pdf(font_file=FONT_FILE, szablon=None):
+    """Tworzy dokument z czcionką DejaVu (parsowaną raz na proces); zgłasza FontError, gdy jej brak.
+
+    Orientację strony i tytuł w nagłówku wyznacza `szablon`.
+    """
+    szablon = szablon or DOMYSLNY_SZABLON
+    pdf = _get_pdf_class()(orientation=szablon.orientacja)
+    pdf.tytul = szablon.tytul
+    pdf.alias_nb_pages(NB_ALIAS)
+    _add_cached_font(pdf, font_file)
+    pdf.set_font(FONT_FAMILY, '', szablon.rozmiar)
+    return pdf
+
+# --- Szablony raportów ---
+
+
+def tekst_wartosci(wartosc):
+    """Tekst komórki raportu; lista PKD daje osobną linię dla każdego kodu."""
+    if wartosc is None:
+        return ""
+    if isinstance(wartosc, list):
+        return "\n".join(
+            f"{p['kod']} {p.get('nazwa') or ''}{' (przeważające)' if p.get('przewazajace') else ''}".strip()
+            if isinstance(p, dict) else str(p)
+            for p in wartosc
+        )
+    return str(wartosc).strip()
+
+
+def pary_z_tekstu(tekst):
+    """Rekord (lista par) z tekstu w układzie "Etykieta: wartość"; linie bez dwukropka mają pustą etykietę."""
+    pary = []
+    for linia in tekst.splitlines():
+        if not linia.strip():
+            continue
+        etykieta, dwukropek, wartosc = linia.partition(": ")
+        pary.append((etykieta.strip(), wartosc.strip()) if dwukropek else ("", linia.strip()))
+    return pary
+
+
+class ReportTemplate:
+    """Układ raportu: pola (etykieta, klucz), układ "karta" lub "tabela" i wymiary wierszy.
+
+    `naglowek` to klucz pola drukowanego jako tytuł karty podmiotu (pusty -
+    bez tytułu). Szerokości tekstu etykiet są zapamiętywane, więc jeden
+    szablon obsługuje kolejne dokumenty bez ponownych pomiarów; można go
+    też przekazać do innych procesów.
+    """
+
+    def __init__(self, pola=POLA_DO_WYSWIETLENIA, uklad="karta", tytul=TYTUL, naglowek="Nazwa",
+                 rozmiar=ROZMIAR_CZCIONKI, wysokosc=WYSOKOSC_WIERSZA):
+        if uklad not in UKLADY:
+            raise ValueError(f"Nieznany układ raportu: {uklad} (dostępne: {', '.join(UKLADY)})")
+        self.pola = tuple(pola)
+        self.uklad = uklad
+        self.tytul = tytul
+        self.naglowek = naglowek
+        self.rozmiar = rozmiar
+        self.wysokosc = wysokosc
+        self._szerokosci = {}
+
+    @classmethod
+    def z_projekcja(cls, projekcja, **opcje):
+        """Szablon z polami podstawowymi i dodatkowymi polami projekcji (np. --fields pkd)."""
+        return cls(list(POLA_DO_WYSWIETLENIA) + [(k, k) for k in projekcja.klucze], **opcje)
+
+    @property
+    def orientacja(self):
+        return "L" if self.uklad == "tabela" else "P"
+
+    def __getstate__(self):
+        # Do procesów potomnych szablon trafia bez zapamiętanych pomiarów.
+        return {**self.__dict__, "_szerokosci": {}}
+
+    @staticmethod
+    def _dlugosc(pdf, tekst):
+        # Prosto z metryk czcionki - get_string_width z fpdf dzieli tekst na fragmenty stylów,
+        # co przy dziesiątkach tysięcy komórek jest wielokrotnie wolniejsze.
+        return pdf.current_font.get_text_width(tekst, pdf.font_size_pt, None)[1] / pdf.k
+
+    def _szerokosc(self, pdf, tekst):
+        szerokosc = self._szerokosci.get(tekst)
+        if szerokosc is None:
+            szerokosc = self._szerokosci[tekst] = self._dlugosc(pdf, tekst)
+        return szerokosc
+
+    def _napisz(self, pdf, x, y, tekst, szerokosc=None):
+        """Tekst w linii komórki o lewym górnym rogu (x, y); z `szerokosc` - wyśrodkowany."""
+        if not tekst:
+            return
+        przesuniecie = pdf.c_margin if szerokosc is None else (szerokosc - self._dlugosc(pdf, tekst)) / 2
+        pdf.text(x + przesuniecie, y + 0.5 * self.wysokosc + 0.3 * pdf.font_size, tekst)
+
+    def _wiersze(self, rekord):
+        if isinstance(rekord, dict):
+            return [(etykieta, tekst_wartosci(rekord.get(klucz))) for etykieta, klucz in self.pola]
+        return [(etykieta, tekst_wartosci(wartosc)) for etykieta, wartosc in rekord]
+
+    def _ile_znakow(self, pdf, tekst, dostepne):
+        """Najdłuższy początek `tekst` (w znakach), który mieści się w szerokości `dostepne`."""
+        pelna = self._dlugosc(pdf, tekst)
+        if pelna <= dostepne:
+            return len(tekst)
+        # Pierwsze przybliżenie z proporcji szerokości, potem poprawka po znaku.
+        koniec = int(len(tekst) * dostepne / pelna)
+        while koniec < len(tekst) and self._dlugosc(pdf, tekst[:koniec + 1]) <= dostepne:
+            koniec += 1
+        while koniec and self._dlugosc(pdf, tekst[:koniec]) > dostepne:
+            koniec -= 1
+        return koniec
+
+    def _zawin(self, pdf, tekst, szerokosc):
+        """Linie tekstu zawiniętego po słowach do szerokości komórki.
+
+        Zastępuje multi_cell z fpdf, którego łamanie linii mierzy tekst znak
+        po znaku i przy tysiącach komórek zajmuje większość czasu eksportu.
+        """
+        dostepne = szerokosc - 2 * pdf.c_margin
+        spacja = self._dlugosc(pdf, " ")
+        linie = []
+        for akapit in tekst.split("\n"):
+            if self._dlugosc(pdf, akapit) <= dostepne:
+                linie.append(akapit)
+                continue
+            linia, dlugosc = "", 0.0
+            for slowo in akapit.split():
+                w = self._dlugosc(pdf, slowo)
+                if linia and dlugosc + spacja + w <= dostepne:
+                    linia, dlugosc = f"{linia} {slowo}", dlugosc + spacja + w
+                    continue
+                if linia:
+                    linie.append(linia)
+                # Słowo dłuższe niż komórka jest dzielone.
+                while w > dostepne:
+                    koniec = max(1, self._ile_znakow(pdf, slowo, dostepne))
+                    linie.append(slowo[:koniec])
+                    slowo = slowo[koniec:]
+                    w = self._dlugosc(pdf, slowo)
+                linia, dlugosc = slowo, w
+            linie.append(linia)
+        return linie
+
+    def _skroc(self, pdf, tekst, szerokosc):
+        """Tekst skrócony wielokropkiem tak, by zmieścił się w jednej linii komórki."""
+        tekst = tekst.replace("\n", "; ")
+        dostepne = szerokosc - 2 * pdf.c_margin
+        if self._dlugosc(pdf, tekst) <= dostepne:
+            return tekst
+        koniec = self._ile_znakow(pdf, tekst, dostepne - self._szerokosc(pdf, "…"))
+        return tekst[:koniec].rstrip() + "…"
+
+    def render(self, pdf, rekordy):
+        """Dopisuje rekordy do dokumentu `pdf` (z `new_pdf`); zwraca liczbę rekordów."""
+        pdf.set_font(FONT_FAMILY, '', self.rozmiar)
+        pdf.set_fill_color(*KOLOR_ETYKIET)
+        if self.uklad == "tabela":
+            return self._tabela(pdf, rekordy)
+        if pdf.page == 0:
+            pdf.add_page()
+        liczba = 0
+        for rekord in rekordy:
+            self._karta(pdf, rekord)
+            liczba += 1
+        return liczba
+
+    # --- Układ "karta" ---
+
+    def _karta(self, pdf, rekord):
+        h = self.wysokosc
+        wiersze = self._wiersze(rekord)
+        tytul = tekst_wartosci(rekord.get(self.naglowek)) if self.naglowek and isinstance(rekord, dict) else ""
+        szer_etykiety = min(MAX_ETYKIETA, max((self._szerokosc(pdf, e) for e, _ in wiersze), default=0)
+                            + 2 * pdf.c_margin + 1)
+        szer_wartosci = pdf.epw - szer_etykiety
+        linie = [self._zawin(pdf, wartosc, szer_wartosci if etykieta else pdf.epw) for etykieta, wartosc in wiersze]
+
+        # Podmiot, który nie zmieści się do końca strony, zaczyna się na następnej
+        # (chyba że i tak nie zmieściłby się na żadnej).
+        wysokosc_bloku = sum(map(len, linie)) * h + (h + 2 if tytul else 0)
+        if (pdf.get_y() + wysokosc_bloku > pdf.page_break_trigger
+                and pdf.get_y() > getattr(pdf, "gora_strony", pdf.t_margin)):
+            pdf.add_page()
+
+        if tytul:
+            pdf.set_font_size(self.rozmiar + 1)
+            pdf.cell(0, h + 2, self._skroc(pdf, tytul, pdf.epw), border="B", new_x="LMARGIN", new_y="NEXT")
+            pdf.set_font_size(self.rozmiar)
+        for (etykieta, _), linie_wartosci in zip(wiersze, linie):
+            self._wiersz_karty(pdf, self._skroc(pdf, etykieta, szer_etykiety) if etykieta else None,
+                               linie_wartosci, szer_etykiety)
+        pdf.ln(ODSTEP_REKORDOW)
+
+    def _wiersz_karty(self, pdf, etykieta, linie, szer_etykiety):
+        """Wiersz "etykieta | wartość" z wartością w `linie`; zbyt wysoki jest dzielony między strony."""
+        h = self.wysokosc
+        x = pdf.l_margin if etykieta is None else pdf.l_margin + szer_etykiety
+        szerokosc = pdf.l_margin + pdf.epw - x
+        while linie:
+            miejsce = int((pdf.page_break_trigger - pdf.get_y()) // h)
+            if miejsce < 1:
+                pdf.add_page()
+                continue
+            czesc, linie = linie[:miejsce], linie[miejsce:]
+            y, wysokosc = pdf.get_y(), h * len(czesc)
+            if etykieta is not None:
+                pdf.rect(pdf.l_margin, y, szer_etykiety, wysokosc, style="DF")
+                self._napisz(pdf, pdf.l_margin, y, etykieta)
+            pdf.rect(x, y, szerokosc, wysokosc)
+            for i, linia in enumerate(czesc):
+                self._napisz(pdf, x, y + i * h, linia)
+            pdf.set_xy(pdf.l_margin, y + wysokosc)
+
+    # --- Układ "tabela" ---
+
+    def _kolumny(self, pdf, probka):
+        """Szerokości kolumn: etykieta lub typowa (90. percentyl) wartość z próbki, dopasowane do strony."""
+        szerokosci = []
+        for i, (etykieta, _) in enumerate(self.pola):
+            wartosci = sorted(self._dlugosc(pdf, w[i][1].replace("\n", "; ")) for w in probka)
+            typowa = wartosci[int(len(wartosci) * 0.9)] if wartosci else 0
+            # Długie etykiety mogą się łamać w nagłówku - liczy się najdłuższe słowo.
+            slowo = max((self._szerokosc(pdf, s) for s in etykieta.split()), default=0)
+            szerokosci.append(max(MIN_KOLUMNA, slowo, min(typowa, MAX_KOLUMNA * pdf.epw)) + 2 * pdf.c_margin)
+        skala = pdf.epw / sum(szerokosci)
+        return [s * skala for s in szerokosci]
+
+    def _tabela(self, pdf, rekordy):
+        h = self.wysokosc
+        rekordy = iter(rekordy)
+        probka = [self._wiersze(r) for r in islice(rekordy, PROBKA_KOLUMN)]
+        kolumny = self._kolumny(pdf, probka)
+        # Nagłówek kolumn jest łamany raz i powtarzany na każdej stronie.
+        etykiety = [self._zawin(pdf, etykieta, k) for (etykieta, _), k in zip(self.pola, kolumny)]
+        wysokosc_naglowka = h * max(map(len, etykiety), default=1)
+
+        def naglowek(pdf):
+            x, y = pdf.l_margin, pdf.get_y()
+            pdf.set_font(FONT_FAMILY, '', self.rozmiar)
+            for linie, szerokosc in zip(etykiety, kolumny):
+                pdf.rect(x, y, szerokosc, wysokosc_naglowka, style="DF")
+                for i, linia in enumerate(linie):
+                    self._napisz(pdf, x, y + i * h, linia, szerokosc)
+                x += szerokosc
+            pdf.set_xy(pdf.l_margin, y + wysokosc_naglowka)
+
+        pdf.naglowek_tabeli = naglowek
+        pdf.add_page()
+        liczba = 0
+        try:
+            for wiersze in chain(probka, (self._wiersze(r) for r in rekordy)):
+                if pdf.get_y() + h > pdf.page_break_trigger:
+                    pdf.add_page()
+                x, y = pdf.l_margin, pdf.get_y()
+                for (_, wartosc), szerokosc in zip(wiersze, kolumny):
+                    pdf.rect(x, y, szerokosc, h)
+                    self._napisz(pdf, x, y, self._skroc(pdf, wartosc, szerokosc))
+                    x += szerokosc
+                pdf.set_xy(pdf.l_margin, y + h)
+                liczba += 1
+        finally:
+            pdf.naglowek_tabeli = None
+        return liczba
+
+
+DOMYSLNY_SZABLON = ReportTemplate()
+
+
+def write_report(rekordy, file_path, szablon=None, font_file=FONT_FILE):
+    """Zapisuje rekordy jako raport PDF według szablonu (domyślnie karty pól GUI). Zwraca liczbę stron."""
+    szablon = szablon or DOMYSLNY_SZABLON
+    with METRYKI.span("pdf"):
+        pdf = new_pdf(font_file, szablon)
+        szablon.render(pdf, rekordy)
+        pdf.output(file_path)
+    return pdf.page_no()
+
+
+# --- Eksport wielu firm ---
+
+
+def _write_chunk(zadania, font_file, szablon):
+    strony = 0
+    for rekord, file_path in zadania:
+        strony += write_report([rekord], file_path, szablon, font_file)
+    return strony
+
+
+def export_pdf_batch(reports, output, per_company=False, processes=None, font_file=FONT_FILE, szablon=None):
+    """Zapisuje raporty wielu firm do PDF.
+
+    `reports` to pary (nazwa, rekord). Domyślnie powstaje jeden dokument
+    `output` ze wszystkimi firmami w układzie `szablon` (karty jedna pod
+    drugą albo zestawienie); przy `per_company=True` w katalogu `output`
+    powstaje plik `<nazwa>.pdf` dla każdej firmy, a pliki są generowane
+    równolegle w `processes` procesach z tym samym szablonem.
+    Zwraca statystyki: dokumenty, strony, czas i strony na sekundę.
+    """
+    szablon = szablon or DOMYSLNY_SZABLON
+    start = time.perf_counter()
+    if not per_company:
+        with METRYKI.span("pdf"):
+            pdf = new_pdf(font_file, szablon)
+            dokumenty = szablon.render(pdf, (rekord for _, rekord in reports))
+            pdf.output(output)
+        strony = pdf.page_no()
+    else:
+        os.makedirs(output, exist_ok=True)
+        _load_font(font_file)
+        zadania = [(rekord, os.path.join(output, f"{nazwa}.pdf")) for nazwa, rekord in reports]
+        dokumenty = len(zadania)
+        paczki = [zadania[i:i + CHUNK_SIZE] for i in range(0, len(zadania), CHUNK_SIZE)]
+        if processes == 1 or len(paczki) <= 1:
+            strony = sum(_write_chunk(paczka, font_file, szablon) for paczka in paczki)
+        else:
+            # Pula procesów (multiprocessing) jest ładowana tylko tutaj - moduł importuje też CLI.
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processes) as pula:
+                strony = sum(pula.map(_write_chunk, paczki, [font_file] * len(paczki), [szablon] * len(paczki)))
+    czas = time.perf_counter() - start
+    METRYKI.observe("pdf_batch", czas, atrybuty={"dokumenty": dokumenty, "strony": strony})
+    return {
+        "documents": dokumenty,
+        "pages": strony,
+        "seconds": round(czas, 3),
+        "pages_per_second": round(strony / czas, 1) if czas > 0 else None,
+    }
@@ -0,0 +1,124 @@
+"""Strumieniowe wyciąganie wybranych pól z odpowiedzi BIR1 (projekcja pól).
+
+Zamiast budować drzewo lxml.objectify całego raportu, odpowiedź jest czytana
+przez iterparse rekord po rekordzie (`<dane>`); z każdego rekordu zostają
+tylko zadeklarowane pola, a przetworzone elementy są od razu zwalniane.
+Pamięć i czas na rekord nie zależą więc od wielkości raportu.
+
+Użycie:
+    projekcja = Projekcja.z_nazw("forma,pkd")
+    for rekord in rekordy(xml, projekcja.pola_raportu):
+        ...
+"""
+from io import BytesIO
+
+# --- Pola i raporty ---
+
+POLE_ZAKONCZENIA = "praw_dataZakonczeniaDzialalnosci"
+POLE_KRS = "praw_numerWRejestrzeEwidencji"
+
+RAPORT_PRAWNY = "PublDaneRaportPrawna"
+
+# Pola raportu osoby prawnej potrzebne zawsze: data zakończenia (do raportu) i KRS (do wyszukiwania po KRS).
+POLA_PODSTAWOWE = (POLE_ZAKONCZENIA, POLE_KRS)
+
+FORMA_PRAWNA = (
+    "praw_podstawowaFormaPrawna_Symbol", "praw_podstawowaFormaPrawna_Nazwa",
+    "praw_szczegolnaFormaPrawna_Symbol", "praw_szczegolnaFormaPrawna_Nazwa",
+    "praw_formaFinansowania_Nazwa", "praw_formaWlasnosci_Nazwa",
+)
+
+# Raport z listą PKD i nazwy jego pól (kod, nazwa, przeważające) według typu podmiotu.
+RAPORTY_PKD = {
+    "P": ("PublDaneRaportDzialalnosciPrawnej", "praw_pkdKod", "praw_pkdNazwa", "praw_pkdPrzewazajace"),
+    "F": ("PublDaneRaportDzialalnosciFizycznej", "fiz_pkd_Kod", "fiz_pkd_Nazwa", "fiz_pkd_Przewazajace"),
+}
+KLUCZ_PKD = "PKD"
+
+# Nazwy grup pól dla `Projekcja.z_nazw` (np. opcja --fields w regon-cli batch).
+GRUPY_POL = {
+    "forma": FORMA_PRAWNA,
+    "krs": (POLE_KRS,),
+    "pkd": (),
+}
+
+
+class Projekcja:
+    """Deklaracja pól pobieranych ponad podstawowe dane podmiotu.
+
+    `pola_raportu` to pola raportu osoby prawnej (PublDaneRaportPrawna)
+    dodawane do wyniku pod własnymi nazwami, a `pkd=True` dołącza listę
+    kodów PKD (raport działalności) pod kluczem "PKD".
+    """
+
+    def __init__(self, pola_raportu=(), pkd=False):
+        self.dodatkowe = tuple(pola_raportu)
+        self.pola_raportu = frozenset(POLA_PODSTAWOWE) | frozenset(self.dodatkowe)
+        self.pkd = pkd
+
+    @classmethod
+    def z_nazw(cls, nazwy):
+        """Projekcja z listy nazw grup oddzielonych przecinkami ("forma,pkd") lub nazw pól raportu."""
+        pola, pkd = [], False
+        for nazwa in (n.strip() for n in (nazwy or "").split(",")):
+            if not nazwa:
+                continue
+            if nazwa == "pkd":
+                pkd = True
+            elif nazwa in GRUPY_POL:
+                pola.extend(GRUPY_POL[nazwa])
+            elif nazwa.startswith("praw_"):
+                pola.append(nazwa)
+            else:
+                raise ValueError(f"Nieznane pole lub grupa pól: {nazwa} (dostępne: {', '.join(GRUPY_POL)})")
+        return cls(dict.fromkeys(pola), pkd)
+
+    @property
+    def klucze(self):
+        """Klucze dodawane do `dane_do_raportu` (w kolejności kolumn eksportu)."""
+        return list(self.dodatkowe) + ([KLUCZ_PKD] if self.pkd else [])
+
+    def __bool__(self):
+        return bool(self.dodatkowe) or self.pkd
+
+
+PODSTAWOWA = Projekcja()
+
+# --- Parsowanie strumieniowe ---
+
+
+def rekordy(xml, pola=None):
+    """Generator słowników {pole: tekst} dla kolejnych elementów `<dane>` w `xml`.
+
+    Gdy podano `pola`, pozostałe elementy są pomijane. Każdy rekord jest
+    usuwany z drzewa zaraz po odczytaniu.
+    """
+    from lxml import etree
+
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    # Filtr `tag` sprawia, że zdarzenia dla pominiętych pól nie docierają do Pythona.
+    tagi = None if pola is None else ["dane", *pola]
+    rekord = {}
+    for _, element in etree.iterparse(BytesIO(xml), events=("end",), tag=tagi):
+        tag = element.tag
+        if tag == "dane":
+            yield rekord
+            rekord = {}
+            element.clear()
+            rodzic = element.getparent()
+            if rodzic is not None:
+                # Usuwamy przeczytane rekordy, żeby drzewo nie rosło wraz z raportem.
+                while element.getprevious() is not None:
+                    del rodzic[0]
+        else:
+            rekord[tag] = element.text if element.text is not None else ""
+
+
+def lista_pkd(xml, typ):
+    """Lista kodów PKD [{"kod", "nazwa", "przewazajace"}] z raportu działalności podmiotu typu `typ`."""
+    _, kod, nazwa, przewazajace = RAPORTY_PKD[typ]
+    return [
+        {"kod": r.get(kod), "nazwa": r.get(nazwa), "przewazajace": r.get(przewazajace) == "1"}
+        for r in rekordy(xml, (kod, nazwa, przewazajace)) if r.get(kod)
+    ]
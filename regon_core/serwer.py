@@ -0,0 +1,331 @@
+"""Serwer HTTP/JSON z wyszukiwaniem w REGON wspólny dla całego zespołu.
+
+Jeden proces trzyma pulę zalogowanych sesji BIR1 (jeden klucz API), pamięć
+podręczną wyników, limiter zapytań i rejestr single-flight, więc analitycy
+nie potrzebują własnych kluczy, a te same podmioty nie są pobierane
+z GUS wielokrotnie.
+
+Punkty końcowe:
+    GET  /nip/{nip}, /regon/{regon}, /krs/{krs}
+                  dane podmiotu jako JSON; ?fields=forma,pkd dodaje pola raportu,
+                  ?refresh=1 pomija pamięć podręczną
+    POST /batch   lista identyfikatorów: JSON ["...", ...], {"ids": [...], "fields": "..."}
+                  albo tekst (jeden w wierszu); odpowiedź to strumień JSON Lines
+                  wysyłany paczkami w miarę pobierania
+    GET  /health  stan limitera, pamięci podręcznej i single-flight
+    GET  /metrics metryki w formacie Prometheusa
+
+Użycie:
+    regon-cli serve --port 8000 --workers 8
+    curl http://127.0.0.1:8000/nip/5261040828
+"""
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlsplit
+
+from .gus import pobierz_dane_wiele, podziel_na_paczki, rozpoznaj_identyfikator
+from .limiter import DOMYSLNY_LIMIT, AdaptiveLimiter
+from .metryki import METRYKI, klasa_bledu
+from .projekcja import PODSTAWOWA, Projekcja
+from .sesja import SessionManager, is_auth_error
+from .singleflight import SINGLE_FLIGHT
+
+# --- Konfiguracja i stałe ---
+
+DOMYSLNY_HOST = "127.0.0.1"
+DOMYSLNY_PORT = 8000
+DOMYSLNE_WORKERS = 8
+# Najwięcej identyfikatorów w jednym POST /batch i największe przyjmowane ciało żądania.
+MAX_BATCH = 10000
+MAX_BODY = 4 * 1024 * 1024
+
+STATUS_OK = "ok"
+STATUS_BRAK = "brak"
+STATUS_BLAD = "błąd"
+
+_RODZAJE = ("nip", "regon", "krs")
+
+
+class _BladZapytania(ValueError):
+    def __init__(self, kod, komunikat):
+        super().__init__(komunikat)
+        self.kod = kod
+
+
+def _wiersz(tekst, para, dane=None, blad=None):
+    """Wiersz odpowiedzi /batch: identyfikator z żądania, status i dane albo opis błędu."""
+    wiersz = {"id": tekst}
+    if para is not None:
+        wiersz["rodzaj"], wiersz["numer"] = para
+    if blad is not None:
+        wiersz.update(status=STATUS_BLAD, błąd=str(blad))
+    elif dane is None:
+        wiersz["status"] = STATUS_BRAK
+    else:
+        wiersz.update(status=STATUS_OK, dane=dane)
+    return wiersz
+
+
+class RegonServer:
+    """Serwer HTTP (wątkowy, keep-alive) udostępniający pobierz_dane_wiele.
+
+    Wszystkie żądania korzystają z jednej puli sesji `sesje` (domyślnie
+    `workers` sesji z AdaptiveLimiter o pułapie `rate`), wspólnej pamięci
+    podręcznej `cache` i rejestru SINGLE_FLIGHT. Paczki z POST /batch
+    wykonuje wspólna pula `workers` wątków, więc duże listy nie zajmują
+    wszystkich sesji naraz.
+    """
+
+    def __init__(self, klucz, host=DOMYSLNY_HOST, port=DOMYSLNY_PORT, sesje=None, cache=None,
+                 workers=DOMYSLNE_WORKERS, rate=DOMYSLNY_LIMIT, max_batch=MAX_BATCH):
+        # http.server ładujemy dopiero tutaj, żeby `regon-cli --help` startował szybko.
+        from http.server import ThreadingHTTPServer
+
+        self.klucz = klucz
+        self.cache = cache
+        self.workers = workers
+        self.max_batch = max_batch
+        self._wlasne_sesje = sesje is None
+        self.sesje = sesje if sesje is not None else SessionManager(
+            max_sessions=workers, limiter=AdaptiveLimiter(rate))
+        self._pula = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="regon-batch")
+        self._start = time.time()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="regon-serwer", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._pula.shutdown(wait=False, cancel_futures=True)
+        if self._wlasne_sesje:
+            self.sesje.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Obsługa zapytań ---
+
+    def lookup(self, rodzaj, numer, projekcja=PODSTAWOWA, refresh=False):
+        """Dane jednego podmiotu lub None; błędy usługi są przekazywane wyżej."""
+        wyniki = pobierz_dane_wiele([(rodzaj, numer)], self.klucz, self.sesje, self.cache, refresh,
+                                    projekcja=projekcja)
+        return wyniki[(rodzaj, numer)]
+
+    def batch(self, identyfikatory, projekcja=PODSTAWOWA, refresh=False):
+        """Generator list wierszy - jednej na paczkę BIR, w kolejności ukończenia paczek.
+
+        Niepoprawne identyfikatory trafiają od razu do pierwszej listy jako
+        wiersze z błędem. Najwyżej dwie paczki na wątek puli czekają
+        w kolejce, więc długa lista nie trafia do puli naraz.
+        """
+        wejscia, niepoprawne = {}, []
+        for tekst in identyfikatory:
+            try:
+                para = rozpoznaj_identyfikator(tekst)
+            except ValueError as e:
+                niepoprawne.append(_wiersz(tekst, None, blad=e))
+                continue
+            wejscia.setdefault(para, []).append(tekst)
+        if niepoprawne:
+            yield niepoprawne
+
+        paczki = iter(podziel_na_paczki(wejscia))
+        w_toku = {}
+        try:
+            while True:
+                while len(w_toku) < self.workers * 2:
+                    paczka = next(paczki, None)
+                    if paczka is None:
+                        break
+                    rodzaj, numery = paczka
+                    pary = [(rodzaj, numer) for numer in numery]
+                    zadanie = self._pula.submit(pobierz_dane_wiele, pary, self.klucz, self.sesje, self.cache,
+                                                refresh, projekcja)
+                    w_toku[zadanie] = pary
+                if not w_toku:
+                    break
+                zakonczone, _ = wait(w_toku, return_when=FIRST_COMPLETED)
+                for zadanie in zakonczone:
+                    pary = w_toku.pop(zadanie)
+                    try:
+                        wyniki, blad = zadanie.result(), None
+                    except Exception as e:
+                        wyniki, blad = {}, e
+                    yield [_wiersz(tekst, para, wyniki.get(para), blad) for para in pary for tekst in wejscia[para]]
+        finally:
+            # Klient się rozłączył albo wystąpił błąd - porzucamy paczki, które jeszcze nie ruszyły.
+            for zadanie in w_toku:
+                zadanie.cancel()
+
+    def health(self):
+        stan = {
+            "status": "ok",
+            "uptime_s": round(time.time() - self._start),
+            "single_flight": SINGLE_FLIGHT.stats(),
+        }
+        if self.sesje.limiter is not None:
+            stan["limiter"] = self.sesje.limiter.stats()
+        if self.cache is not None:
+            stan["cache"] = self.cache.stats()
+        return stan
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+
+        serwer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _odpowiedz(self, kod, tresc, typ="application/json; charset=utf-8"):
+                if not isinstance(tresc, (bytes, str)):
+                    tresc = json.dumps(tresc, ensure_ascii=False)
+                if isinstance(tresc, str):
+                    tresc = tresc.encode("utf-8")
+                self.send_response(kod)
+                self.send_header("Content-Type", typ)
+                self.send_header("Content-Length", str(len(tresc)))
+                if self.close_connection:
+                    # Klient musi wiedzieć, że po tej odpowiedzi połączenie zostanie zamknięte.
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(tresc)
+
+            def _parametry(self):
+                czesci = urlsplit(self.path)
+                zapytanie = {k: v[-1] for k, v in parse_qs(czesci.query).items()}
+                try:
+                    projekcja = Projekcja.z_nazw(zapytanie.get("fields"))
+                except ValueError as e:
+                    raise _BladZapytania(400, e)
+                refresh = zapytanie.get("refresh", "") not in ("", "0", "false")
+                return czesci.path.rstrip("/"), projekcja, refresh
+
+            def do_GET(self):
+                with METRYKI.span("http", metoda="GET"):
+                    try:
+                        self._get()
+                    except _BladZapytania as e:
+                        self._odpowiedz(e.kod, {"błąd": str(e)})
+
+            def _get(self):
+                sciezka, projekcja, refresh = self._parametry()
+                if sciezka == "/health":
+                    return self._odpowiedz(200, serwer.health())
+                if sciezka == "/metrics":
+                    return self._odpowiedz(200, METRYKI.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+                czesci = sciezka.strip("/").split("/")
+                if len(czesci) != 2 or czesci[0] not in _RODZAJE:
+                    raise _BladZapytania(404, "Nieznany adres - użyj /nip/{nip}, /regon/{regon} lub /krs/{krs}.")
+                try:
+                    rodzaj, numer = rozpoznaj_identyfikator(f"{czesci[0]}:{czesci[1]}")
+                except ValueError as e:
+                    raise _BladZapytania(400, e)
+                try:
+                    dane = serwer.lookup(rodzaj, numer, projekcja, refresh)
+                except Exception as e:
+                    kod = 502 if not is_auth_error(e) else 503
+                    return self._odpowiedz(kod, {"błąd": str(e), "klasa": klasa_bledu(e)})
+                if dane is None:
+                    return self._odpowiedz(404, {"błąd": f"Nie znaleziono podmiotu: {numer}", "rodzaj": rodzaj})
+                self._odpowiedz(200, {"rodzaj": rodzaj, "numer": numer, "dane": dane})
+
+            def do_POST(self):
+                with METRYKI.span("http", metoda="POST"):
+                    try:
+                        self._post()
+                    except _BladZapytania as e:
+                        self._odpowiedz(e.kod, {"błąd": str(e)})
+
+            def _identyfikatory(self):
+                try:
+                    dlugosc = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    dlugosc = -1
+                if dlugosc < 0:
+                    # Nie wiadomo, gdzie kończy się ciało - połączenia nie da się użyć ponownie.
+                    self.close_connection = True
+                    raise _BladZapytania(400, "Niepoprawny nagłówek Content-Length.")
+                if dlugosc > MAX_BODY:
+                    # Nieprzeczytane ciało zostałoby odczytane jako następne żądanie na tym połączeniu.
+                    self.close_connection = True
+                    raise _BladZapytania(413, f"Ciało żądania większe niż {MAX_BODY} bajtów.")
+                try:
+                    tresc = self.rfile.read(dlugosc).decode("utf-8")
+                except UnicodeDecodeError:
+                    raise _BladZapytania(400, "Ciało żądania musi być w UTF-8.")
+                pola = None
+                if "json" in (self.headers.get("Content-Type") or "") or tresc.lstrip()[:1] in ("[", "{"):
+                    try:
+                        dane = json.loads(tresc)
+                    except ValueError as e:
+                        raise _BladZapytania(400, f"Niepoprawny JSON: {e}")
+                    if isinstance(dane, dict):
+                        pola = dane.get("fields")
+                        if pola is not None and not isinstance(pola, str):
+                            raise _BladZapytania(400, 'Pole "fields" musi być tekstem, np. "forma,pkd".')
+                        dane = dane.get("ids", [])
+                    if not isinstance(dane, list):
+                        raise _BladZapytania(400, 'Oczekiwano listy identyfikatorów lub {"ids": [...]}.')
+                    identyfikatory = [str(i) for i in dane]
+                else:
+                    identyfikatory = [linia.strip() for linia in tresc.splitlines() if linia.strip()]
+                if len(identyfikatory) > serwer.max_batch:
+                    raise _BladZapytania(413, f"Najwięcej {serwer.max_batch} identyfikatorów w jednym żądaniu.")
+                return identyfikatory, pola
+
+            def _post(self):
+                sciezka, projekcja, refresh = self._parametry()
+                if sciezka != "/batch":
+                    raise _BladZapytania(404, "Nieznany adres - użyj POST /batch.")
+                identyfikatory, pola = self._identyfikatory()
+                if pola:
+                    try:
+                        projekcja = Projekcja.z_nazw(pola)
+                    except ValueError as e:
+                        raise _BladZapytania(400, e)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                paczki = serwer.batch(identyfikatory, projekcja, refresh)
+                try:
+                    # Każda ukończona paczka idzie do klienta od razu jako osobny fragment odpowiedzi.
+                    for wiersze in paczki:
+                        self._kawalek("".join(json.dumps(w, ensure_ascii=False) + "\n" for w in wiersze))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                finally:
+                    paczki.close()
+
+            def _kawalek(self, tekst):
+                dane = tekst.encode("utf-8")
+                self.wfile.write(f"{len(dane):X}\r\n".encode("ascii") + dane + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from .limiter import MAX_PROB, with_retries
+from .metryki import METRYKI, instrument_client
+
+# --- Konfiguracja i stałe ---
+
+SERVICE_URL = "https://wyszukiwarkaregon.stat.gov.pl/wsBIR/UslugaBIRzewnPubl.svc"
+
+# GUS zamyka sesję po 60 minutach bezczynności - odnawiamy ją z zapasem.
+SESSION_TTL = 50 * 60
+
+
+def is_auth_error(e):
+    """Czy błąd oznacza niepoprawny lub wygasły klucz API."""
+    tekst = str(e)
+    return "Authentication failed" in tekst or "403" in tekst or "Login failed" in tekst
+
+
+def is_session_error(e):
+    """Czy błąd oznacza, że sesja (SID) straciła ważność i trzeba się zalogować ponownie."""
+    tekst = str(e)
+    return is_auth_error(e) or "Are you logged in" in tekst or "Not logged in" in tekst
+
+
+class _Sesja:
+    __slots__ = ("klient", "ostatnie_uzycie")
+
+    def __init__(self, klient):
+        self.klient = klient
+        self.ostatnie_uzycie = time.monotonic()
+
+
+class SessionManager:
+    """Pula zalogowanych sesji BIR1 dla każdego klucza API.
+
+    Sesje są zakładane przy pierwszym użyciu (najwyżej `max_sessions` na klucz),
+    odnawiane po upływie `ttl` sekund bezczynności lub po odrzuceniu SID
+    przez serwer i zamykane w `close()`. Domyślnie jest jedna sesja na klucz.
+
+    Wszystkie zapytania HTTP sesji przechodzą przez wspólny `limiter`
+    (AdaptiveLimiter), a błędy przejściowe są ponawiane do `max_prob` razy.
+    """
+
+    def __init__(self, service_url=SERVICE_URL, ttl=SESSION_TTL, max_sessions=1, limiter=None,
+                 max_prob=MAX_PROB):
+        self.service_url = service_url
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.limiter = limiter
+        self.max_prob = max_prob
+        self._wolne = {}
+        self._liczba = {}
+        self._warunek = threading.Condition()
+
+    def _pobierz(self, klucz):
+        do_zamkniecia = []
+        with self._warunek:
+            while True:
+                wolne = self._wolne.setdefault(klucz, [])
+                teraz = time.monotonic()
+                sesja = None
+                while wolne:
+                    kandydat = wolne.pop()
+                    if teraz - kandydat.ostatnie_uzycie <= self.ttl:
+                        sesja = kandydat
+                        break
+                    self._liczba[klucz] -= 1
+                    do_zamkniecia.append(kandydat)
+                if sesja is not None or self._liczba.get(klucz, 0) < self.max_sessions:
+                    if sesja is None:
+                        self._liczba[klucz] = self._liczba.get(klucz, 0) + 1
+                    break
+                self._warunek.wait()
+
+        for stara in do_zamkniecia:
+            self._wyloguj(stara)
+        if sesja is not None:
+            return sesja
+
+        try:
+            klient = self._nowy_klient()
+            with METRYKI.span("login"):
+                klient.login(klucz)
+        except Exception:
+            with self._warunek:
+                self._liczba[klucz] -= 1
+                self._warunek.notify()
+            raise
+        return _Sesja(klient)
+
+    def _nowy_klient(self):
+        # litex.regon (z requests i lxml) ładujemy dopiero przy pierwszym logowaniu.
+        import litex.regon as regon
+        # Pomiar obejmuje pojedyncze próby, więc ponowienia są widoczne w metrykach jako osobne zapytania.
+        return with_retries(instrument_client(regon.REGONAPI(self.service_url)), self.limiter, self.max_prob)
+
+    def _oddaj(self, klucz, sesja, wazna=True):
+        with self._warunek:
+            if wazna:
+                sesja.ostatnie_uzycie = time.monotonic()
+                self._wolne.setdefault(klucz, []).append(sesja)
+            else:
+                self._liczba[klucz] -= 1
+            self._warunek.notify()
+        if not wazna:
+            self._wyloguj(sesja)
+
+    @contextmanager
+    def session(self, klucz):
+        """Wypożycza zalogowanego klienta z puli na czas bloku `with`."""
+        sesja = self._pobierz(klucz)
+        try:
+            yield sesja.klient
+        except Exception as e:
+            self._oddaj(klucz, sesja, wazna=not is_session_error(e))
+            raise
+        self._oddaj(klucz, sesja)
+
+    def call(self, klucz, operacja):
+        """Wykonuje `operacja(klient)` w sesji klucza.
+
+        Jeśli serwer odrzuci sesję, loguje się ponownie i ponawia operację raz.
+        """
+        for proba in range(2):
+            sesja = self._pobierz(klucz)
+            try:
+                wynik = operacja(sesja.klient)
+            except Exception as e:
+                odrzucona = is_session_error(e)
+                self._oddaj(klucz, sesja, wazna=not odrzucona)
+                if odrzucona and proba == 0:
+                    continue
+                raise
+            self._oddaj(klucz, sesja)
+            return wynik
+
+    def invalidate(self, klucz):
+        """Zamyka wolne sesje klucza; następne wywołanie zaloguje się od nowa."""
+        with self._warunek:
+            sesje = self._wolne.pop(klucz, [])
+            if klucz in self._liczba:
+                self._liczba[klucz] -= len(sesje)
+            self._warunek.notify_all()
+        for sesja in sesje:
+            self._wyloguj(sesja)
+
+    def close(self):
+        """Wylogowuje wszystkie wolne sesje."""
+        with self._warunek:
+            klucze = list(self._wolne)
+        for klucz in klucze:
+            self.invalidate(klucz)
+
+    @staticmethod
+    def _wyloguj(sesja):
+        try:
+            sesja.klient.logout()
+        except Exception:
+            pass
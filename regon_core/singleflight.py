@@ -0,0 +1,98 @@
+"""Łączenie równoczesnych zapytań o ten sam podmiot (single-flight).
+
+Gdy kilka wątków (okno GUI, tryb wsadowy, odświeżanie lustra, serwer HTTP)
+pyta w tym samym momencie o ten sam numer, do GUS idzie jedno zapytanie -
+pierwszy wątek je wykonuje, a pozostałe czekają i dostają jego wynik
+(albo ten sam wyjątek). Klucz obejmuje klucz API, rodzaj i numer
+identyfikatora oraz pola projekcji, więc różne zapytania nie są łączone.
+
+Liczba zaoszczędzonych wywołań trafia do metryk jako licznik
+"singleflight_shared", a wywołania wykonane do GUS - "singleflight_upstream".
+"""
+import threading
+
+from .metryki import METRYKI
+
+
+class _Lot:
+    __slots__ = ("gotowe", "wynik", "blad", "czekajacy")
+
+    def __init__(self):
+        self.gotowe = threading.Event()
+        self.wynik = None
+        self.blad = None
+        self.czekajacy = 0
+
+
+class SingleFlight:
+    """Rejestr trwających zapytań; równoczesne zapytania o ten sam klucz dzielą jeden wynik."""
+
+    def __init__(self, metryki=METRYKI):
+        self.metryki = metryki
+        self.liczniki = {"upstream": 0, "shared": 0}
+        self._w_toku = {}
+        self._lock = threading.Lock()
+
+    def zacznij(self, klucze):
+        """Rejestruje klucze; zwraca (prowadzone, obce) - słowniki {klucz: lot}.
+
+        Loty `prowadzone` wywołujący musi zakończyć przez `zakoncz` (także po
+        błędzie), a na `obce` czeka przez `czekaj`.
+        """
+        prowadzone, obce = {}, {}
+        with self._lock:
+            for klucz in klucze:
+                if klucz in prowadzone or klucz in obce:
+                    continue
+                lot = self._w_toku.get(klucz)
+                if lot is None:
+                    lot = self._w_toku[klucz] = _Lot()
+                    prowadzone[klucz] = lot
+                else:
+                    lot.czekajacy += 1
+                    obce[klucz] = lot
+            self.liczniki["upstream"] += len(prowadzone)
+            self.liczniki["shared"] += len(obce)
+        if prowadzone:
+            self.metryki.count("singleflight_upstream", len(prowadzone))
+        if obce:
+            self.metryki.count("singleflight_shared", len(obce))
+        return prowadzone, obce
+
+    def zakoncz(self, klucz, lot, wynik=None, blad=None):
+        """Zapisuje wynik (lub wyjątek) lotu i budzi czekające wątki."""
+        lot.wynik, lot.blad = wynik, blad
+        with self._lock:
+            if self._w_toku.get(klucz) is lot:
+                del self._w_toku[klucz]
+        lot.gotowe.set()
+
+    @staticmethod
+    def czekaj(lot):
+        """Wynik lotu prowadzonego przez inny wątek; jego wyjątek jest zgłaszany ponownie."""
+        lot.gotowe.wait()
+        if lot.blad is not None:
+            raise lot.blad
+        return lot.wynik
+
+    def do(self, klucz, funkcja):
+        """Wykonuje `funkcja()` albo dołącza do trwającego wywołania z tym samym kluczem."""
+        prowadzone, obce = self.zacznij([klucz])
+        if obce:
+            return self.czekaj(obce[klucz])
+        lot = prowadzone[klucz]
+        try:
+            wynik = funkcja()
+        except BaseException as e:
+            self.zakoncz(klucz, lot, blad=e)
+            raise
+        self.zakoncz(klucz, lot, wynik)
+        return wynik
+
+    def stats(self):
+        with self._lock:
+            return {**self.liczniki, "w_toku": len(self._w_toku)}
+
+
+# Wspólny rejestr procesu - używany domyślnie przez pobierz_dane i pobierz_dane_wiele.
+SINGLE_FLIGHT = SingleFlight()
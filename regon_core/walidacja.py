@@ -0,0 +1,111 @@
+"""Normalizacja i sprawdzanie sum kontrolnych NIP, REGON i numerów KRS - lokalnie, przed zapytaniem do GUS.
+
+Każdy błędny numer wysłany do BIR1 kosztuje logowanie i wyszukiwanie, więc
+numery są czyszczone (spacje, myślniki, przedrostek PL), sprawdzane i
+deduplikowane zanim trafią do paczek wyszukiwania. Sumy kontrolne są liczone
+na bajtach ASCII z wagami i przesunięciem ('0' * suma wag) policzonymi raz,
+co pozwala odfiltrować miliony numerów z ERP w kilka sekund.
+"""
+from operator import mul
+
+# --- Wagi i tablice ---
+
+WAGI_NIP = (6, 5, 7, 2, 3, 4, 5, 6, 7)
+WAGI_REGON9 = (8, 9, 2, 3, 4, 5, 6, 7)
+WAGI_REGON14 = (2, 4, 8, 5, 0, 9, 7, 3, 6, 1, 2, 4, 8)
+DLUGOSC_KRS = 10
+
+_ZERO = ord("0")
+# Suma wag razy kod '0' - odejmowana od sumy ważonej kodów ASCII zamiast zamiany każdej cyfry na int.
+_PRZESUNIECIE = {wagi: _ZERO * sum(wagi) for wagi in (WAGI_NIP, WAGI_REGON9, WAGI_REGON14)}
+
+
+def _cyfry(numer):
+    # str.isdigit() przepuszcza też cyfry spoza ASCII (np. "²"), których nie da się zważyć.
+    return numer.isdigit() and numer.isascii()
+
+
+def _suma_zgodna(bajty, wagi, modulo_10=False):
+    reszta = (sum(map(mul, wagi, bajty)) - _PRZESUNIECIE[wagi]) % 11
+    if reszta == 10:
+        if not modulo_10:
+            # Dla NIP reszta 10 oznacza numer, którego urząd nie mógł nadać.
+            return False
+        reszta = 0
+    return reszta == bajty[len(wagi)] - _ZERO
+
+
+def normalizuj(tekst):
+    """Usuwa białe znaki i myślniki oraz zamienia litery na wielkie; zwraca None dla pustych wartości."""
+    numer = "".join(str(tekst).split()).replace("-", "").upper()
+    return numer or None
+
+
+def poprawny_nip(numer):
+    """True dla 10 cyfr z poprawną cyfrą kontrolną (wagi 6,5,7,2,3,4,5,6,7, modulo 11)."""
+    return len(numer) == 10 and _cyfry(numer) and _suma_zgodna(numer.encode("ascii"), WAGI_NIP)
+
+
+def poprawny_regon(numer):
+    """True dla REGONu 9- lub 14-cyfrowego z poprawną cyfrą kontrolną (modulo 11, reszta 10 to 0)."""
+    wagi = {9: WAGI_REGON9, 14: WAGI_REGON14}.get(len(numer))
+    return wagi is not None and _cyfry(numer) and _suma_zgodna(numer.encode("ascii"), wagi, modulo_10=True)
+
+
+def poprawny_krs(numer):
+    """True dla 10-cyfrowego numeru KRS innego niż same zera (KRS nie ma cyfry kontrolnej)."""
+    return len(numer) == DLUGOSC_KRS and _cyfry(numer) and numer.strip("0") != ""
+
+
+_SPRAWDZENIA = {"nip": poprawny_nip, "regon": poprawny_regon, "krs": poprawny_krs}
+
+
+def sprawdz(rodzaj, numer):
+    """Zwraca numer albo zgłasza ValueError, gdy numer danego rodzaju ("nip", "regon", "krs") jest niepoprawny."""
+    if not _SPRAWDZENIA[rodzaj](numer):
+        if rodzaj == "krs":
+            raise ValueError(f"Niepoprawny numer KRS: {numer}")
+        raise ValueError(f"Niepoprawna suma kontrolna numeru {rodzaj.upper()}: {numer}")
+    return numer
+
+
+def sprawdz_nip(tekst):
+    """Znormalizowany NIP (bez spacji, myślników i przedrostka PL); zgłasza ValueError dla niepoprawnych."""
+    numer = normalizuj(tekst) or ""
+    if numer.startswith("PL"):
+        numer = numer[2:]
+    if len(numer) != 10 or not _cyfry(numer):
+        raise ValueError(f"NIP musi mieć 10 cyfr: {tekst}")
+    return sprawdz("nip", numer)
+
+# --- Listy ---
+
+
+def filtruj_nipy(wartosci, odrzucone=None):
+    """Poprawne NIPy z `wartosci` bez duplikatów, w kolejności pierwszego wystąpienia.
+
+    Niepoprawne wartości (z powodem) są dopisywane do listy `odrzucone`, jeśli
+    ją podano; puste są pomijane bez komentarza. Każda wartość jest sprawdzana
+    najwyżej raz - powtórzenia odpadają na zbiorze widzianych numerów.
+    """
+    widziane = set()
+    nipy = []
+    # Metody związane z nazwami lokalnymi - pętla bywa wykonywana miliony razy.
+    widziane_add, dopisz = widziane.add, nipy.append
+    przesuniecie = _PRZESUNIECIE[WAGI_NIP]
+    for wartosc in wartosci:
+        numer = "".join(str(wartosc).split()).replace("-", "")
+        if not numer[:1].isdigit() and numer[:2].upper() == "PL":
+            numer = numer[2:]
+        if not numer or numer in widziane:
+            continue
+        widziane_add(numer)
+        if len(numer) == 10 and numer.isdigit() and numer.isascii():
+            bajty = numer.encode("ascii")
+            if (sum(map(mul, WAGI_NIP, bajty)) - przesuniecie) % 11 == bajty[9] - _ZERO:
+                dopisz(numer)
+            elif odrzucone is not None:
+                odrzucone.append((wartosc, "suma kontrolna"))
+        elif odrzucone is not None:
+            odrzucone.append((wartosc, "format"))
+    return nipy
@@ -0,0 +1,101 @@
+"""Wyniki trybu wsadowego w pamięci: filtrowanie i sortowanie dla widoków tabelarycznych.
+
+Widok (np. tabela w GUI) pyta tylko o liczbę wierszy i o okno
+`rows(offset, limit)`, więc rysuje wyłącznie widoczne wiersze niezależnie
+od tego, czy plik ma sto, czy sto tysięcy wyników.
+"""
+import unicodedata
+
+from .batch import KOLUMNY_WYNIKU
+from .eksport import read_results
+from .historia import _do_wyszukiwania
+
+
+def _do_filtra(tekst):
+    """Małe litery bez polskich znaków - jak indeks FTS5 historii ("Łódź" pasuje do "lodz")."""
+    rozlozony = unicodedata.normalize("NFKD", _do_wyszukiwania(tekst).casefold())
+    return "".join(znak for znak in rozlozony if not unicodedata.combining(znak))
+
+
+def _klucz_sortowania(wartosc):
+    # Puste wartości na końcu; liczby w tekście porównywane jak tekst (NIP, REGON mają stałą długość).
+    if wartosc is None or wartosc == "":
+        return (1, "")
+    return (0, str(wartosc).casefold())
+
+
+class ResultSet:
+    """Wiersze pliku wynikowego z bieżącym filtrem i kolejnością.
+
+    `filter()` i `sort()` przeliczają tylko listę indeksów wierszy; same
+    wiersze (słowniki z `read_results`) nie są kopiowane.
+    """
+
+    def __init__(self, wiersze):
+        self.wiersze = list(wiersze)
+        obecne = {}
+        for wiersz in self.wiersze[:1000]:
+            obecne.update(dict.fromkeys(wiersz))
+        # Kolumny pliku w kolejności KOLUMNY_WYNIKU, dodatkowe pola projekcji na końcu.
+        self.kolumny = [k for k in KOLUMNY_WYNIKU if k in obecne] + [k for k in obecne if k not in KOLUMNY_WYNIKU]
+        self.query = ""
+        self.sort_column = None
+        self.descending = False
+        self._teksty = None
+        self._kolejnosc = list(range(len(self.wiersze)))
+        self._indeksy = self._kolejnosc
+
+    @classmethod
+    def from_file(cls, path):
+        """Wczytuje plik wynikowy polecenia batch (CSV, JSONL, Parquet lub Arrow).
+
+        Tekst do filtrowania jest przygotowywany od razu, więc wczytanie w wątku
+        roboczym zdejmuje ten koszt z wątku GUI.
+        """
+        wyniki = cls(read_results(path))
+        wyniki._teksty_wyszukiwania()
+        return wyniki
+
+    def _teksty_wyszukiwania(self):
+        if self._teksty is None:
+            # Tekst do wyszukiwania jest budowany raz, przy wczytaniu pliku albo pierwszym filtrowaniu.
+            self._teksty = [
+                _do_filtra(" ".join(str(v) for v in w.values() if v not in (None, "")))
+                for w in self.wiersze
+            ]
+        return self._teksty
+
+    def filter(self, query):
+        """Zostawia wiersze zawierające wszystkie słowa `query` (bez względu na wielkość liter i polskie znaki).
+
+        Zwraca liczbę pasujących wierszy.
+        """
+        self.query = (query or "").strip()
+        slowa = _do_filtra(self.query).split()
+        if not slowa:
+            self._indeksy = self._kolejnosc
+        else:
+            teksty = self._teksty_wyszukiwania()
+            self._indeksy = [i for i in self._kolejnosc if all(s in teksty[i] for s in slowa)]
+        return len(self._indeksy)
+
+    def sort(self, column, descending=False):
+        """Sortuje po kolumnie (puste wartości zawsze na końcu) i ponownie stosuje filtr."""
+        self.sort_column = column
+        self.descending = descending
+        klucze = [_klucz_sortowania(w.get(column)) for w in self.wiersze]
+        if descending:
+            # Odwrócona kolejność wartości, ale puste nadal na końcu.
+            pelne = sorted((i for i, k in enumerate(klucze) if k[0] == 0), key=klucze.__getitem__, reverse=True)
+            self._kolejnosc = pelne + [i for i, k in enumerate(klucze) if k[0] == 1]
+        else:
+            self._kolejnosc = sorted(range(len(self.wiersze)), key=klucze.__getitem__)
+        return self.filter(self.query)
+
+    def count(self):
+        return len(self._indeksy)
+
+    def rows(self, offset=0, limit=None):
+        """Wiersze (słowniki) od pozycji `offset` w bieżącej kolejności, najwyżej `limit`."""
+        koniec = None if limit is None else offset + limit
+        return [self.wiersze[i] for i in self._indeksy[offset:koniec]]
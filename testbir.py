@@ -1,37 +1,50 @@
-import litex.regon as regon
-import lxml.etree
 import tkinter as tk
-from tkinter import messagebox, scrolledtext, filedialog, simpledialog
-from datetime import date
-from fpdf import FPDF
+from tkinter import messagebox, scrolledtext, filedialog, simpledialog, ttk
 import os
+import queue
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from regon_core import (
+    KEY_FILE, POLA_DO_WYSWIETLENIA, AdaptiveLimiter, HistoryStore, ResultCache, ResultSet, SessionManager,
+    is_auth_error, pobierz_dane, read_api_key, save_api_key,
+)
+from regon_core.batch import STATUS_OK
+from regon_core.walidacja import sprawdz_nip
+from regon_core.metryki import METRYKI, PROFILE_ENV, save_from_env
+from regon_core.pdf import FontError, get_current_date, pary_z_tekstu, write_report
 
 # --- Konfiguracja i stałe ---
 
-KEY_FILE = "api_key.txt"
-HISTORY_FILE = "historia_regon.txt"
+HISTORY_FILE = "historia_regon.sqlite"
+# Dawna historia w pliku tekstowym - importowana do bazy przy pierwszym uruchomieniu.
+LEGACY_HISTORY_FILE = "historia_regon.txt"
+# Tabele historii i wyników pobierają ze źródła bloki po tyle wierszy, a rysują tylko widoczne.
+TABLE_BLOCK_SIZE = 200
+HISTORY_SEARCH_DELAY_MS = 250
+# Kolumny tabeli wyników wsadowych: klucz wiersza, nagłówek, szerokość w pikselach.
+RESULT_COLUMNS = [("NIP", "NIP", 90), ("Status", "Status", 50)] + [
+    (key, label_text, 200 if key == "Nazwa" else 110) for label_text, key in POLA_DO_WYSWIETLENIA
+] + [("Błąd", "Błąd", 200)]
+RESULTS_FILETYPES = [
+    ("Wyniki (CSV, JSONL, Parquet, Arrow)", "*.csv *.jsonl *.json *.parquet *.pq *.arrow *.feather"),
+    ("All files", "*.*"),
+]
 
 # --- Funkcje obsługi Klucza API ---
 
 def get_api_key():
     """Pobiera klucz z pliku lub pyta użytkownika. Zwraca None, jeśli anulowano."""
-    if os.path.exists(KEY_FILE):
-        try:
-            with open(KEY_FILE, "r", encoding="utf-8") as f:
-                key = f.read().strip()
-                if key:
-                    return key
-        except Exception:
-            pass 
+    key = read_api_key(KEY_FILE)
+    if key:
+        return key
 
     key = simpledialog.askstring("Weryfikacja", "Wprowadź klucz API REGON, aby uruchomić program:")
     
     if key:
         try:
-            with open(KEY_FILE, "w", encoding="utf-8") as f:
-                f.write(key.strip())
-            return key.strip()
+            return save_api_key(key, KEY_FILE)
         except Exception as e:
             messagebox.showerror("Błąd", f"Nie udało się zapisać klucza API: {e}")
             return None
@@ -40,6 +53,7 @@ def get_api_key():
 
 def reset_api_key():
     """Usuwa plik z kluczem."""
+    sesje_gus.close()
     if os.path.exists(KEY_FILE):
         try:
             os.remove(KEY_FILE)
@@ -51,22 +65,9 @@ def reset_api_key():
 
 # --- Funkcje PDF ---
 
-class PDF(FPDF):
-    def header(self):
-        self.set_font('DejaVuSansCondensed', 'B', 12)
-        self.cell(0, 10, 'Raport Danych REGON', 0, 1, 'C')
-        self.ln(10)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('DejaVuSansCondensed', 'I', 8)
-        self.cell(0, 10, f'Strona {self.page_no()}/{{nb}}', 0, 0, 'C')
-
-def get_current_date():
-    return date.today().strftime("%d-%m-%Y")
-
-def export_to_pdf_from_widget(content, initial_filename_prefix):
-    if not content.strip():
+def export_to_pdf_from_widget(rekord, initial_filename_prefix):
+    """Zapisuje rekord - listę par (etykieta, wartość) - jako raport PDF w układzie karty."""
+    if not any(wartosc for _, wartosc in rekord):
         messagebox.showwarning("Błąd", "Brak danych do wyeksportowania do PDF.")
         return
 
@@ -77,112 +78,402 @@ def export_to_pdf_from_widget(content, initial_filename_prefix):
     )
 
     if file_path:
-        pdf = PDF()
-        pdf.alias_nb_pages()
         try:
-            pdf.add_font('DejaVuSansCondensed', '', 'DejaVuSansCondensed.ttf')
-            pdf.add_font('DejaVuSansCondensed', 'B', 'DejaVuSansCondensed.ttf')
-            pdf.add_font('DejaVuSansCondensed', 'I', 'DejaVuSansCondensed.ttf')
-            pdf.set_font('DejaVuSansCondensed', '', 10)
-        except RuntimeError as e:
-            messagebox.showerror("Błąd czcionki", f"Nie można załadować czcionki DejaVuSansCondensed.ttf. {e}")
-            return
-        
-        pdf.add_page()
-        
-        for line in content.split('\n'):
-            pdf.cell(0, 7, line, 0, 1, 'L')
-        
-        try:
-            pdf.output(file_path)
+            write_report([rekord], file_path)
             messagebox.showinfo("Sukces", f"Raport zapisano do: {file_path}")
+        except FontError as e:
+            messagebox.showerror("Błąd czcionki", str(e))
         except Exception as e:
             messagebox.showerror("Błąd zapisu PDF", f"Nie udało się zapisać pliku PDF: {e}")
 
 # --- Funkcje pobierania danych GUS ---
 
-def pobierz_dane_gus_gui(nip):
+# Błędy przejściowe GUS są ponawiane w tle, więc okno błędu pojawia się dopiero, gdy ponowienia zawiodą.
+sesje_gus = SessionManager(limiter=AdaptiveLimiter())
+# Tworzona w main() - sam import modułu nie może zakładać pliku bazy w katalogu bieżącym.
+cache_wynikow = None
+
+def pobierz_dane_gus_gui(nip, klucz_uzytkownika, cache, force_refresh=False):
+    """Wykonywane w wątku roboczym - nie może dotykać widżetów. Zwraca (dane, błąd)."""
+    try:
+        return pobierz_dane(nip, klucz_uzytkownika, sesje_gus, cache, force_refresh), None
+    except Exception as e:
+        return None, e
+
+def show_lookup_error(nip, blad):
+    if blad is None:
+        messagebox.showwarning("Brak danych", f"Nie znaleziono podmiotu dla NIPu: {nip}")
+    elif is_auth_error(blad):
+         messagebox.showerror("Błąd autoryzacji", f"Klucz API jest niepoprawny lub wygasł.\nBłąd: {blad}")
+    else:
+        messagebox.showerror("Błąd", f"Wystąpił błąd: {blad}")
+
+def update_cache_stats_display():
+    if cache_wynikow is None:
+        return
+    stats = cache_wynikow.stats()
+    cache_stats_label.config(text=f"Pamięć podręczna: {stats['entries']} wpisów, trafienia {stats['hits']}, chybienia {stats['misses']}")
+
+# --- Wyszukiwanie w tle ---
+
+# Zapytania do GUS trwają nawet kilka sekund, więc wykonują się poza wątkiem Tk.
+# Wyniki wracają przez kolejkę odczytywaną cyklicznie przez root.after.
+POLL_INTERVAL_MS = 100
+
+executor_gus = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gus")
+lookup_results = queue.Queue()
+lookups_in_flight = {}
+lookup_state = {'token': 0, 'last_nip': None}
+
+def start_lookup(nip, force_refresh=False):
+    """Zleca wyszukiwanie NIPu w tle; powtórne zlecenie tego samego NIPu dołącza do trwającego."""
+    lookup_state['last_nip'] = nip
+    if nip in lookups_in_flight:
+        update_lookup_indicator()
+        return
     klucz_uzytkownika = get_api_key()
-    
     if not klucz_uzytkownika:
-        return None
+        return
+    lookup_state['token'] += 1
+    token = lookup_state['token']
+    cache = cache_wynikow
 
-    klient = None
-    dane_do_raportu = {}
+    def zadanie():
+        dane, blad = pobierz_dane_gus_gui(nip, klucz_uzytkownika, cache, force_refresh)
+        lookup_results.put((nip, token, dane, blad))
 
-    try:
-        service_url = "https://wyszukiwarkaregon.stat.gov.pl/wsBIR/UslugaBIRzewnPubl.svc"
-        klient = regon.REGONAPI(service_url)
-        klient.login(klucz_uzytkownika)
+    lookups_in_flight[nip] = (token, executor_gus.submit(zadanie))
+    update_lookup_indicator()
 
-        wynik_wyszukiwania = klient.search(nip=nip, detailed=True)
-        if not wynik_wyszukiwania:
-            messagebox.showwarning("Brak danych", f"Nie znaleziono podmiotu dla NIPu: {nip}")
-            return None
+def cancel_lookups():
+    """Porzuca trwające wyszukiwania; ich wyniki nie zostaną wyświetlone."""
+    for token, future in lookups_in_flight.values():
+        future.cancel()
+    lookups_in_flight.clear()
+    update_lookup_indicator()
 
-        glowny_element_odpowiedzi = wynik_wyszukiwania[0]
-        
-        dane_do_raportu['Regon'] = getattr(glowny_element_odpowiedzi, 'Regon', None)
-        dane_do_raportu['Typ'] = getattr(glowny_element_odpowiedzi, 'Typ', None)
-        dane_do_raportu['Nazwa'] = getattr(glowny_element_odpowiedzi, 'Nazwa', None)
-        dane_do_raportu['Wojewodztwo'] = getattr(glowny_element_odpowiedzi, 'Wojewodztwo', None)
-        dane_do_raportu['Powiat'] = getattr(glowny_element_odpowiedzi, 'Powiat', None)
-        dane_do_raportu['Gmina'] = getattr(glowny_element_odpowiedzi, 'Gmina', None)
-        dane_do_raportu['KodPocztowy'] = getattr(glowny_element_odpowiedzi, 'KodPocztowy', None)
-        dane_do_raportu['Miejscowosc'] = getattr(glowny_element_odpowiedzi, 'Miejscowosc', None)
-        dane_do_raportu['Ulica'] = getattr(glowny_element_odpowiedzi, 'Ulica', None)
-        dane_do_raportu['Numer Nieruchomości'] = getattr(glowny_element_odpowiedzi, 'NrNieruchomosci', None)
-        
-        detailed_element = getattr(glowny_element_odpowiedzi, 'detailed', None)
-        if detailed_element is not None:
-            raw_data_zakonczenia_element = getattr(detailed_element, 'praw_dataZakonczeniaDzialalnosci', None)
-            data_zakonczenia_text = raw_data_zakonczenia_element.text if raw_data_zakonczenia_element is not None else None
-
-            if data_zakonczenia_text and data_zakonczenia_text.strip():
-                dane_do_raportu['Informacja o skreśleniu z REGON'] = f"Działalność zakończona: {data_zakonczenia_text.strip()}"
+def process_lookup_results():
+    try:
+        while True:
+            nip, token, dane, blad = lookup_results.get_nowait()
+            w_toku = lookups_in_flight.get(nip)
+            if w_toku is None or w_toku[0] != token:
+                continue
+            del lookups_in_flight[nip]
+            update_lookup_indicator()
+            update_cache_stats_display()
+            if dane:
+                add_to_history(nip, dane)
+                if nip == lookup_state['last_nip']:
+                    show_company_data(dane)
+            elif nip == lookup_state['last_nip']:
+                show_lookup_error(nip, blad)
+    except queue.Empty:
+        pass
+    root.after(POLL_INTERVAL_MS, process_lookup_results)
+
+def update_lookup_indicator():
+    if lookups_in_flight:
+        lookup_status_label.config(text=f"Wyszukiwanie... ({len(lookups_in_flight)})")
+        cancel_button.config(state=tk.NORMAL)
+    else:
+        lookup_status_label.config(text="")
+        cancel_button.config(state=tk.DISABLED)
+
+# --- Wirtualna tabela ---
+
+class VirtualTable:
+    """ttk.Treeview, który rysuje tylko widoczne wiersze źródła danych.
+
+    Źródło podaje liczbę wierszy (`count()`) i ich okno (`rows(offset, limit)`),
+    a `values(wiersz)` zamienia wiersz na wartości kolumn. Tabela ma stałą pulę
+    elementów Treeview (tyle, ile mieści się na ekranie) i przy przewijaniu
+    wpisuje do nich kolejne wiersze, więc 100 tys. wierszy kosztuje tyle samo
+    co sto. Sortowanie i filtrowanie należą do źródła.
+    """
+
+    def __init__(self, parent, columns, count, rows, values=tuple, on_sort=None, on_activate=None, height=8):
+        self.frame = tk.Frame(parent)
+        self.columns = columns
+        self._count = count
+        self._rows = rows
+        self._values = values
+        self.on_activate = on_activate
+        self.tree = ttk.Treeview(self.frame, columns=[key for key, _, _ in columns], show="headings",
+                                 height=height, selectmode="browse")
+        for key, heading, width in columns:
+            self.tree.heading(key, text=heading, command=(lambda k=key: on_sort(k)) if on_sort else "")
+            self.tree.column(key, width=width, minwidth=40, stretch=key in ("Nazwa", "nazwa"))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.height = height
+        self.offset = 0
+        self.total = 0
+        self.selected = None
+        self.visible = []
+        self._block = (0, [])
+        self._pixels = None
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_by(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_by(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "page-up"), ("<Next>", "page-down")):
+            self.tree.bind(key, lambda event, s=step: self.on_key(s))
+        self.tree.bind("<Home>", lambda event: self.select(0))
+        self.tree.bind("<End>", lambda event: self.select(self.total - 1))
+        self.tree.bind("<Double-Button-1>", self.on_double_click)
+        self.tree.bind("<Return>", lambda event: self.activate(self.selected))
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def refresh(self, top=False):
+        """Ponownie odczytuje źródło (po zmianie danych, filtra lub kolejności)."""
+        self.total = self._count()
+        self._block = (0, [])
+        if top:
+            self.offset = 0
+            self.selected = None
+        self.scroll_to(self.offset)
+        self._fit()
+
+    def set_sort_indicator(self, column, descending):
+        for key, heading, _ in self.columns:
+            arrow = (" ▼" if descending else " ▲") if key == column else ""
+            self.tree.heading(key, text=heading + arrow)
+
+    def _window(self, offset, limit):
+        # Bloki po TABLE_BLOCK_SIZE wierszy: przewijanie kółkiem nie odpytuje źródła przy każdym kroku.
+        start, rows = self._block
+        if offset < start or offset + limit > start + len(rows):
+            start = max(0, offset - TABLE_BLOCK_SIZE // 4)
+            rows = self._rows(start, max(TABLE_BLOCK_SIZE, limit))
+            self._block = (start, rows)
+        return rows[offset - start:offset - start + limit]
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, self.total - self.height))
+        self.visible = self._window(self.offset, self.height) if self.total else []
+        items = self.tree.get_children()
+        for item in items[len(self.visible):]:
+            self.tree.delete(item)
+        for i, row in enumerate(self.visible):
+            values = ["" if v is None else v for v in self._values(row)]
+            if i < len(items):
+                self.tree.item(items[i], values=values)
             else:
-                dane_do_raportu['Informacja o skreśleniu z REGON'] = "----------"
+                self.tree.insert("", tk.END, values=values)
+        items = self.tree.get_children()
+        if self.selected is not None and self.offset <= self.selected < self.offset + len(items):
+            self.tree.selection_set(items[self.selected - self.offset])
         else:
-            dane_do_raportu['Informacja o skreśleniu z REGON'] = "----------"
-        
-        return dane_do_raportu
+            self.tree.selection_set(())
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, (self.offset + len(self.visible)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
 
-    except Exception as e:
-        if "Authentication failed" in str(e) or "403" in str(e):
-             messagebox.showerror("Błąd autoryzacji", f"Klucz API jest niepoprawny lub wygasł.\nBłąd: {e}")
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+        return "break"
+
+    def on_scrollbar(self, action, number, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(number) * self.total))
+        elif unit == "pages":
+            self.scroll_by(int(number) * self.height)
         else:
-            messagebox.showerror("Błąd", f"Wystąpił błąd: {e}")
-        return None
+            self.scroll_by(int(number))
+
+    def on_resize(self, event):
+        self._pixels = event.height
+        self._fit()
+
+    def _fit(self):
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items and self._pixels else None
+        if bbox:
+            # Tyle wierszy, ile mieści się pod nagłówkiem przy bieżącej wysokości tabeli.
+            height = max(1, (self._pixels - bbox[1]) // bbox[3])
+            if height != self.height:
+                self.height = height
+                self.scroll_to(self.offset)
+
+    def select(self, index):
+        if not self.total:
+            return "break"
+        self.selected = max(0, min(index, self.total - 1))
+        if self.selected < self.offset:
+            self.scroll_to(self.selected)
+        elif self.selected >= self.offset + self.height:
+            self.scroll_to(self.selected - self.height + 1)
+        else:
+            self.scroll_to(self.offset)
+        return "break"
+
+    def on_key(self, step):
+        current = self.offset if self.selected is None else self.selected
+        if step == "page-up":
+            return self.select(current - self.height)
+        if step == "page-down":
+            return self.select(current + self.height)
+        return self.select(current + step)
+
+    def row_at(self, y):
+        """Wiersz źródła pod współrzędną `y` tabeli albo None."""
+        item = self.tree.identify_row(y)
+        if not item:
+            return None
+        return self.visible[self.tree.index(item)]
 
-    finally:
-        try:
-            if klient:
-                klient.logout()
-        except Exception:
-            pass
+    def cell_at(self, x, y):
+        """(nagłówek, wartość) komórki pod kursorem albo None (np. nad nagłówkiem)."""
+        if self.tree.identify_region(x, y) != "cell":
+            return None
+        row = self.row_at(y)
+        column = self.tree.identify_column(x)
+        if row is None or not column:
+            return None
+        index = int(column[1:]) - 1
+        value = self._values(row)[index]
+        return self.columns[index][1], "" if value is None else str(value)
 
-# --- Funkcje obsługi historii ---
+    def on_select(self, event):
+        # Kliknięcie zaznacza element puli - zapamiętujemy pozycję wiersza w źródle.
+        items = self.tree.selection()
+        if items:
+            self.selected = self.offset + self.tree.index(items[0])
+
+    def on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if item:
+            self.activate(self.offset + self.tree.index(item))
+
+    def activate(self, index):
+        if index is not None and self.on_activate is not None and 0 <= index - self.offset < len(self.visible):
+            self.on_activate(self.visible[index - self.offset])
 
-search_history = []
+# --- Funkcje obsługi historii ---
 
-def save_history():
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        for entry in search_history:
-            f.write(entry + "\n")
+historia = None
+history_view = {'query': '', 'total': 0, 'sort': 'czas', 'descending': True, 'search_job': None}
 
 def load_history():
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                search_history.append(line.strip())
-        update_history_display()
-
-def update_history_display():
-    history_text.config(state=tk.NORMAL)
-    history_text.delete(1.0, tk.END)
-    for entry in reversed(search_history):
-        history_text.insert(tk.END, entry + "\n")
-    history_text.config(state=tk.DISABLED)
+    global historia
+    historia = HistoryStore(HISTORY_FILE, LEGACY_HISTORY_FILE)
+    update_history_display()
+
+def history_rows(offset, limit):
+    return historia.page(offset, limit, history_view['query'], history_view['sort'], history_view['descending'])
+
+def history_values(wpis):
+    nip, nazwa, czas = wpis
+    return nip, nazwa, time.strftime("%Y-%m-%d %H:%M", time.localtime(czas))
+
+def update_history_display(top=True):
+    """Odświeża tabelę historii (zawężonej wyszukiwaniem); tabela doczytuje tylko widoczne wiersze."""
+    history_view['query'] = history_search_var.get()
+    history_view['total'] = historia.count(history_view['query'])
+    history_label.config(text=f"Historia wyszukiwania: {history_view['total']} wpisów")
+    history_table.refresh(top)
+
+def on_history_sort(kolumna):
+    if kolumna == history_view['sort']:
+        history_view['descending'] = not history_view['descending']
+    else:
+        history_view['sort'] = kolumna
+        # Czas domyślnie od najnowszych, NIP i nazwa - rosnąco.
+        history_view['descending'] = kolumna == 'czas'
+    history_table.set_sort_indicator(kolumna, history_view['descending'])
+    update_history_display()
+
+def on_history_search(*args):
+    if history_view['search_job'] is not None:
+        root.after_cancel(history_view['search_job'])
+    history_view['search_job'] = root.after(HISTORY_SEARCH_DELAY_MS, run_history_search)
+
+def run_history_search():
+    history_view['search_job'] = None
+    update_history_display()
+
+# --- Wyniki wsadowe ---
+
+results_view = {'set': None, 'path': None, 'sort': None, 'descending': False, 'search_job': None, 'loading': None}
+
+def results_count():
+    return results_view['set'].count() if results_view['set'] is not None else 0
+
+def results_rows(offset, limit):
+    return results_view['set'].rows(offset, limit)
+
+def results_values(wiersz):
+    return [wiersz.get(key) for key, _, _ in RESULT_COLUMNS]
+
+def open_results_file():
+    """Wczytuje plik wynikowy `regon-cli batch` w tle i pokazuje go w tabeli wyników."""
+    path = filedialog.askopenfilename(filetypes=RESULTS_FILETYPES)
+    if not path:
+        return
+    results_label.config(text=f"Wczytywanie: {os.path.basename(path)}...")
+    results_view['loading'] = (path, executor_gus.submit(ResultSet.from_file, path))
+    root.after(POLL_INTERVAL_MS, poll_results_file)
+
+def poll_results_file():
+    path, future = results_view['loading']
+    if not future.done():
+        root.after(POLL_INTERVAL_MS, poll_results_file)
+        return
+    results_view['loading'] = None
+    try:
+        results_view['set'] = future.result()
+    except Exception as e:
+        results_label.config(text="")
+        messagebox.showerror("Błąd", f"Nie udało się wczytać wyników: {e}")
+        return
+    results_view['sort'] = None
+    results_view['set'].filter(results_search_var.get())
+    results_table.set_sort_indicator(None, False)
+    update_results_display(path)
+
+def update_results_display(path=None):
+    wyniki = results_view['set']
+    if path is not None:
+        results_view['path'] = os.path.basename(path)
+    results_label.config(text=f"Wyniki: {results_view['path']} - {wyniki.count()} z {len(wyniki.wiersze)} wierszy")
+    results_table.refresh(top=True)
+
+def on_results_sort(kolumna):
+    if results_view['set'] is None:
+        return
+    if kolumna == results_view['sort']:
+        results_view['descending'] = not results_view['descending']
+    else:
+        results_view['sort'], results_view['descending'] = kolumna, False
+    results_view['set'].sort(kolumna, results_view['descending'])
+    results_table.set_sort_indicator(kolumna, results_view['descending'])
+    update_results_display()
+
+def on_results_search(*args):
+    if results_view['search_job'] is not None:
+        root.after_cancel(results_view['search_job'])
+    results_view['search_job'] = root.after(HISTORY_SEARCH_DELAY_MS, run_results_search)
+
+def run_results_search():
+    results_view['search_job'] = None
+    if results_view['set'] is not None:
+        results_view['set'].filter(results_search_var.get())
+        update_results_display()
+
+def show_result_row(wiersz):
+    """Pokazuje wiersz wyników w lewym panelu - bez zapytania do GUS."""
+    nip_entry.delete(0, tk.END)
+    nip_entry.insert(0, wiersz.get("NIP") or "")
+    if wiersz.get("Status") != STATUS_OK:
+        messagebox.showwarning("Brak danych", f"{wiersz.get('NIP')}: {wiersz.get('Błąd') or wiersz.get('Status')}")
+        return
+    show_company_data({k: v for k, v in wiersz.items() if v is not None})
 
 # --- Funkcje obsługi GUI ---
 
@@ -190,10 +481,8 @@ drag_data = {'text': None}
 is_uppercase = False 
 original_data = {} 
 
-def on_drag_start(event, source_entry):
-    label_text = entry_labels[source_entry]
-    value = source_entry.get()
-    if is_uppercase:
+def start_drag(label_text, value, uppercase=False):
+    if uppercase:
         drag_data['text'] = f"{label_text.upper()}: {value.upper()}"
     else:
         drag_data['text'] = f"{label_text}: {value}"
@@ -201,6 +490,15 @@ def on_drag_start(event, source_entry):
     root.bind('<ButtonRelease-1>', on_drop_global)
     root.bind('<Motion>', on_drag_motion_global)
 
+def on_drag_start(event, source_entry):
+    start_drag(entry_labels[source_entry], source_entry.get(), is_uppercase)
+
+def on_row_drag_start(event, table):
+    """Przeciąganie komórki wiersza tabeli (historii lub wyników) do raportu, jak pola lewego panelu."""
+    komorka = table.cell_at(event.x, event.y)
+    if komorka is not None:
+        start_drag(*komorka)
+
 def on_drag_motion_global(event):
     pass
 
@@ -222,50 +520,54 @@ def on_drop_global(event):
     root.unbind('<Motion>')
 
 def on_search_button_click():
-    global is_uppercase
     nip_do_szukania = nip_entry.get().strip()
     if not nip_do_szukania:
         messagebox.showwarning("Błąd", "Proszę wprowadzić numer NIP.")
         return
+    # Literówka w NIPie nie kosztuje zapytania do GUS - suma kontrolna jest sprawdzana lokalnie.
+    try:
+        nip_do_szukania = sprawdz_nip(nip_do_szukania)
+    except ValueError as e:
+        messagebox.showwarning("Błąd", str(e))
+        return
 
-    dane = pobierz_dane_gus_gui(nip_do_szukania)
-    if dane:
-        address_combine_var.set(False)
-        zip_city_combine_var.set(False)
-        entry_frames['Numer Nieruchomości'].grid()
-        entry_frames['Miejscowość'].grid()
-
-        for label_text, key in pola_do_wyswietlenia:
-            value = str(dane.get(key, "")).strip()
-            original_data[label_text] = value
-            entry = entry_widgets[label_text]
-            entry.config(state=tk.NORMAL)
-            entry.delete(0, tk.END)
-            entry.insert(0, value)
-            entry.config(state='readonly')
-        
-        nazwa_firmy = dane.get('Nazwa', 'Brak nazwy')
-        historia_wpis = f"{nip_do_szukania} | {nazwa_firmy}"
-        if historia_wpis not in search_history:
-            search_history.append(historia_wpis)
-            if len(search_history) > 20: 
-                search_history.pop(0)
-            update_history_display()
-            save_history()
-        
-        is_uppercase = False
-        uppercase_button.config(text="A/a")
+    start_lookup(nip_do_szukania, force_refresh=force_refresh_var.get())
+    force_refresh_var.set(False)
+
+def show_company_data(dane):
+    global is_uppercase
+    address_combine_var.set(False)
+    zip_city_combine_var.set(False)
+    entry_frames['Numer Nieruchomości'].grid()
+    entry_frames['Miejscowość'].grid()
+
+    for label_text, key in pola_do_wyswietlenia:
+        value = str(dane.get(key, "")).strip()
+        original_data[label_text] = value
+        entry = entry_widgets[label_text]
+        entry.config(state=tk.NORMAL)
+        entry.delete(0, tk.END)
+        entry.insert(0, value)
+        entry.config(state='readonly')
+
+    is_uppercase = False
+    uppercase_button.config(text="A/a")
+
+def add_to_history(nip, dane):
+    historia.add(nip, dane.get('Nazwa', 'Brak nazwy'))
+    update_history_display()
 
 def combine_entry_data():
-    combined_text = ""
+    """Widoczne pola lewego panelu jako rekord raportu: lista par (etykieta, wartość)."""
+    rekord = []
     for label_text, key in pola_do_wyswietlenia:
         if entry_frames[label_text].winfo_ismapped():
             entry_value = entry_widgets[label_text].get()
             if is_uppercase:
-                 combined_text += f"{label_text.upper()}: {entry_value.upper()}\n"
+                rekord.append((label_text.upper(), entry_value.upper()))
             else:
-                 combined_text += f"{label_text}: {entry_value}\n"
-    return combined_text
+                rekord.append((label_text, entry_value))
+    return rekord
 
 def clear_left_panel():
     global is_uppercase
@@ -366,19 +668,11 @@ def handle_zip_city_checkbox():
     else:
         split_zip_city_logic()
 
-def load_nip_from_history(event):
-    try:
-        index = history_text.index("@%s,%s" % (event.x, event.y))
-        line_num = int(index.split('.')[0])
-        line_content = history_text.get(f"{line_num}.0", f"{line_num}.end").strip()
-        if '|' in line_content:
-            nip = line_content.split('|')[0].strip()
-            nip_entry.delete(0, tk.END)
-            nip_entry.insert(0, nip)
-            on_search_button_click()
-    except tk.TclError:
-        pass
-        
+def load_nip_from_history(wpis):
+    nip_entry.delete(0, tk.END)
+    nip_entry.insert(0, wpis[0])
+    on_search_button_click()
+
 def toggle_case():
     global is_uppercase
     labels_to_change = [
@@ -437,20 +731,21 @@ nip_entry.insert(0, "5261040828")
 search_button = tk.Button(input_frame, text="Szukaj", command=on_search_button_click)
 search_button.pack(side=tk.LEFT, padx=(10, 0))
 
+force_refresh_var = tk.BooleanVar()
+force_refresh_checkbox = tk.Checkbutton(input_frame, text="Odśwież z GUS", variable=force_refresh_var)
+force_refresh_checkbox.pack(side=tk.LEFT, padx=(5, 0))
+
+cancel_button = tk.Button(input_frame, text="Anuluj", command=cancel_lookups, state=tk.DISABLED)
+cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+
+lookup_status_label = tk.Label(left_frame, text="", fg="blue", anchor="w")
+lookup_status_label.pack(fill=tk.X, padx=15)
+
 data_frame = tk.Frame(left_frame, padx=10, pady=10)
 data_frame.pack(fill=tk.BOTH, expand=True)
 data_frame.columnconfigure(1, weight=1)
 
-pola_do_wyswietlenia = [
-    ("Regon", "Regon"), ("Typ", "Typ"), ("Nazwa", "Nazwa"),
-    ("Województwo", "Wojewodztwo"), ("Powiat", "Powiat"),
-    ("Gmina", "Gmina"), 
-    ("Kod pocztowy", "KodPocztowy"),
-    ("Miejscowość", "Miejscowosc"),
-    ("Ulica", "Ulica"),
-    ("Numer Nieruchomości", "Numer Nieruchomości"),
-    ("Informacja o skreśleniu z REGON", "Informacja o skreśleniu z REGON")
-]
+pola_do_wyswietlenia = POLA_DO_WYSWIETLENIA
 entry_widgets = {}
 entry_labels = {}
 entry_frames = {}
@@ -507,7 +802,7 @@ selected_data_text.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
 selected_data_text.config(font=("Courier New", 10))
 
 pdf_selected_button = tk.Button(right_frame, text="Drukuj do PDF wybrane", 
-                                command=lambda: export_to_pdf_from_widget(selected_data_text.get(1.0, tk.END), "Wybrany_Raport_REGON"))
+                                command=lambda: export_to_pdf_from_widget(pary_z_tekstu(selected_data_text.get(1.0, tk.END)), "Wybrany_Raport_REGON"))
 pdf_selected_button.pack(pady=(10, 5))
 
 clear_right_button = tk.Button(right_frame, text="Wyczyść wybrane", command=clear_right_panel)
@@ -515,23 +810,76 @@ clear_right_button.pack(pady=(0, 10))
 
 history_frame = tk.Frame(root)
 history_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
-history_label = tk.Label(history_frame, text="Historia wyszukiwania (NIP | Nazwa firmy):")
+tables_notebook = ttk.Notebook(history_frame)
+tables_notebook.pack(fill=tk.BOTH, expand=True)
+
+history_tab = tk.Frame(tables_notebook)
+tables_notebook.add(history_tab, text="Historia")
+history_label = tk.Label(history_tab, text="Historia wyszukiwania:")
 history_label.pack()
 
-history_text = scrolledtext.ScrolledText(history_frame, wrap=tk.WORD, width=60, height=8, padx=5, pady=5)
-history_text.pack(fill=tk.BOTH, expand=True)
-history_text.config(state=tk.DISABLED, font=("Courier New", 10))
-history_text.bind("<Double-Button-1>", load_nip_from_history)
+history_search_frame = tk.Frame(history_tab)
+history_search_frame.pack(fill=tk.X)
+tk.Label(history_search_frame, text="Szukaj w historii (NIP lub nazwa):").pack(side=tk.LEFT)
+history_search_var = tk.StringVar()
+history_search_var.trace_add("write", on_history_search)
+history_search_entry = tk.Entry(history_search_frame, textvariable=history_search_var)
+history_search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+
+history_table = VirtualTable(history_tab, [("nip", "NIP", 110), ("nazwa", "Nazwa firmy", 500), ("czas", "Wyszukano", 130)],
+                             lambda: history_view['total'], history_rows, history_values,
+                             on_sort=on_history_sort, on_activate=load_nip_from_history)
+history_table.pack(fill=tk.BOTH, expand=True)
+history_table.set_sort_indicator(history_view['sort'], history_view['descending'])
+history_table.tree.bind('<Button-1>', lambda event: on_row_drag_start(event, history_table), add="+")
+
+results_tab = tk.Frame(tables_notebook)
+tables_notebook.add(results_tab, text="Wyniki wsadowe")
+results_top_frame = tk.Frame(results_tab)
+results_top_frame.pack(fill=tk.X)
+tk.Button(results_top_frame, text="Otwórz plik wyników...", command=open_results_file).pack(side=tk.LEFT)
+results_label = tk.Label(results_top_frame, text="", anchor="w")
+results_label.pack(side=tk.LEFT, padx=(10, 0))
+
+results_search_frame = tk.Frame(results_tab)
+results_search_frame.pack(fill=tk.X)
+tk.Label(results_search_frame, text="Filtruj wyniki:").pack(side=tk.LEFT)
+results_search_var = tk.StringVar()
+results_search_var.trace_add("write", on_results_search)
+tk.Entry(results_search_frame, textvariable=results_search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+
+results_table = VirtualTable(results_tab, RESULT_COLUMNS, results_count, results_rows, results_values,
+                             on_sort=on_results_sort, on_activate=show_result_row)
+results_table.pack(fill=tk.BOTH, expand=True)
+results_table.tree.bind('<Button-1>', lambda event: on_row_drag_start(event, results_table), add="+")
+
+cache_stats_label = tk.Label(history_frame, text="", anchor="w")
+cache_stats_label.pack(fill=tk.X)
 
 # --- Uruchamianie aplikacji ---
 
 def main():
+    global cache_wynikow
     start_key = get_api_key()
     
     if start_key:
+        cache_wynikow = ResultCache()
         root.deiconify() 
         load_history() 
-        root.mainloop()
+        update_cache_stats_display()
+        root.after(POLL_INTERVAL_MS, process_lookup_results)
+        if os.environ.get(PROFILE_ENV):
+            METRYKI.enable_profiling()
+        try:
+            root.mainloop()
+        finally:
+            executor_gus.shutdown(wait=False, cancel_futures=True)
+            sesje_gus.close()
+            cache_wynikow.close()
+            if historia is not None:
+                historia.close()
+            # Czasy zapytań i liczniki błędów, jeśli ustawiono REGON_METRICS / REGON_PROFILE.
+            save_from_env()
     else:
         root.destroy()
         sys.exit()
@@ -0,0 +1,62 @@
+import pytest
+
+from regon_core.batch import STATUS_NIEPOPRAWNY, STATUS_OK, kolumny_wyniku, read_nips, run_batch
+from regon_core.cache import ResultCache
+from regon_core.eksport import open_writer, read_results
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.projekcja import Projekcja
+from regon_core.sesja import SessionManager
+
+
+@pytest.mark.parametrize("rozszerzenie", [".jsonl", ".csv"])
+def test_wznowienie_nie_powiela_wierszy(tmp_path, rozszerzenie):
+    wejscie = tmp_path / "kontrahenci.csv"
+    wyjscie = str(tmp_path / ("wyniki" + rozszerzenie))
+    with MockBIR() as bir:
+        nipy = bir.add_synthetic(3)
+        wejscie.write_text("\n".join(["NIP"] + nipy + ["5261040829", "12-34", nipy[0]]), encoding="utf-8")
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            przebiegi = []
+            for _ in range(2):
+                # Jak regon-cli batch: odrzucone przy wczytaniu trafiają do pliku wynikowego.
+                niepoprawne = []
+                wczytane = read_nips(str(wejscie), niepoprawne)
+                przebiegi.append(run_batch(wczytane, MOCK_API_KEY, wyjscie, workers=2, rate=0, sesje=sesje,
+                                           niepoprawne=niepoprawne))
+        finally:
+            sesje.close()
+
+    pierwszy, drugi = przebiegi
+    assert pierwszy[STATUS_OK] == 3 and pierwszy["niepoprawne"] == 2
+    assert drugi[STATUS_OK] == 0 and drugi["pominięte"] == 3
+    wiersze = list(read_results(wyjscie))
+    assert sorted(w["NIP"] for w in wiersze) == sorted(nipy + ["5261040829", "12-34"])
+    assert {w["NIP"]: w["Status"] for w in wiersze}["5261040829"] == STATUS_NIEPOPRAWNY
+
+
+def test_wpisy_pamieci_z_inna_projekcja(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    with MockBIR() as bir:
+        nipy = bir.add_synthetic(3)
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            # Pierwszy przebieg zapisuje w pamięci podręcznej dodatkowe pola formy prawnej.
+            run_batch(nipy, MOCK_API_KEY, str(tmp_path / "pelne.csv"), rate=0, sesje=sesje, cache=cache,
+                      projekcja=Projekcja.z_nazw("forma"))
+            liczniki = run_batch(nipy, MOCK_API_KEY, str(tmp_path / "podstawowe.csv"), rate=0, sesje=sesje,
+                                 cache=cache)
+        finally:
+            sesje.close()
+            cache.close()
+    assert liczniki[STATUS_OK] == 3
+    wiersze = list(read_results(str(tmp_path / "podstawowe.csv")))
+    assert list(wiersze[0]) == kolumny_wyniku()
+
+
+def test_csv_z_innymi_kolumnami(tmp_path):
+    wyjscie = str(tmp_path / "wyniki.csv")
+    with open_writer(wyjscie, kolumny_wyniku()) as writer:
+        writer.write({"NIP": "5261040828", "Status": STATUS_OK})
+    with pytest.raises(ValueError):
+        open_writer(wyjscie, kolumny_wyniku(Projekcja.z_nazw("forma")))
@@ -0,0 +1,42 @@
+import asyncio
+
+from regon_core.bir_async import AsyncREGONClient, pobierz_wiele
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+
+
+def test_pobierz_wiele_zwraca_none_dla_nieznalezionego_nipu():
+    with MockBIR() as bir:
+        nipy = bir.add_synthetic(2)
+        del bir.nagrania.po_nip[nipy[1]]
+        wyniki = asyncio.run(pobierz_wiele(nipy, MOCK_API_KEY, service_url=bir.url))
+    assert isinstance(wyniki[nipy[0]], dict)
+    assert wyniki[nipy[1]] is None
+
+
+def test_limit_polaczen_i_zapytan_w_toku():
+    async def sprawdz(klient, nipy):
+        w_toku = najwiecej = 0
+        szukaj = klient._search
+
+        async def licz(*args):
+            nonlocal w_toku, najwiecej
+            w_toku += 1
+            najwiecej = max(najwiecej, w_toku)
+            try:
+                return await szukaj(*args)
+            finally:
+                w_toku -= 1
+
+        klient._search = licz
+        async with klient:
+            wyniki = await asyncio.gather(*(klient.pobierz_dane(nip) for nip in nipy))
+        return wyniki, najwiecej
+
+    with MockBIR(latency=0.05) as bir:
+        nipy = bir.add_synthetic(8)
+        # Klient tworzony poza pętlą zdarzeń, jak w kodzie synchronicznym, który potem woła asyncio.run.
+        klient = AsyncREGONClient(MOCK_API_KEY, bir.url, max_connections=2, max_in_flight=3)
+        wyniki, najwiecej = asyncio.run(sprawdz(klient, nipy))
+    assert all(wyniki)
+    assert najwiecej == 3
+    assert klient._pula.opened <= 2
@@ -0,0 +1,82 @@
+import types
+
+import pytest
+
+from regon_core import cache as modul_cache
+from regon_core.cache import ResultCache
+from regon_core.gus import pobierz_dane
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.sesja import SessionManager
+
+
+@pytest.fixture
+def zegar(monkeypatch):
+    """Sterowany czas modułu cache - kolejność LRU i TTL nie zależą od rozdzielczości zegara."""
+    czas = types.SimpleNamespace(teraz=1000.0)
+    monkeypatch.setattr(modul_cache, "time", types.SimpleNamespace(time=lambda: czas.teraz))
+    return czas
+
+
+def test_trafienia_i_chybienia(tmp_path, zegar):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get("5261040828") is None
+    cache.put("5261040828", {"Nazwa": "GUS"}, "<xml/>")
+    assert cache.get_entry("5261040828") == ({"Nazwa": "GUS"}, "<xml/>")
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+    cache.close()
+
+
+def test_wygasniecie_ttl(tmp_path, zegar):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), ttl=60)
+    cache.put("5261040828", {"Nazwa": "GUS"})
+    zegar.teraz += 59
+    assert cache.get("5261040828") is not None
+    zegar.teraz += 2
+    assert cache.get("5261040828") is None
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_usuwanie_lru(tmp_path, zegar):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    for i in range(10):
+        zegar.teraz += 1
+        cache.put(str(i), {"i": i})
+    # Trafienie odświeża wpis "0" - najdawniej używany jest teraz "1".
+    zegar.teraz += 1
+    assert cache.get("0") == {"i": 0}
+    zegar.teraz += 1
+    cache.put("10", {"i": 10})
+    pozostale = {str(i) for i in range(11) if cache.get(str(i)) is not None}
+    assert "0" in pozostale and "10" in pozostale and "1" not in pozostale
+    assert len(pozostale) <= 10
+    cache.close()
+
+
+def test_czas_uzycia_zapisany_przy_zamknieciu(tmp_path, zegar):
+    sciezka = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(sciezka)
+    cache.put("5261040828", {"Nazwa": "GUS"})
+    zegar.teraz += 10
+    cache.get("5261040828")
+    cache.close()
+    cache = ResultCache(sciezka)
+    assert cache._db.execute("SELECT uzyto FROM wyniki").fetchone()[0] == zegar.teraz
+    cache.close()
+
+
+def test_force_refresh_omija_pamiec(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    with MockBIR() as bir:
+        nip = bir.add_synthetic(1)[0]
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            pierwsze = pobierz_dane(nip, MOCK_API_KEY, sesje, cache)
+            assert pobierz_dane(nip, MOCK_API_KEY, sesje, cache) == pierwsze
+            assert bir.requests["DaneSzukajPodmioty"] == 1
+            pobierz_dane(nip, MOCK_API_KEY, sesje, cache, force_refresh=True)
+            assert bir.requests["DaneSzukajPodmioty"] == 2
+        finally:
+            sesje.close()
+    assert cache.stats()["hits"] == 1
+    cache.close()
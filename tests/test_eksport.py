@@ -0,0 +1,41 @@
+import pytest
+
+from regon_core.batch import STATUS_OK, kolumny_wyniku
+from regon_core.eksport import open_writer, read_results
+from regon_core.projekcja import Projekcja
+
+KOLUMNY = kolumny_wyniku()
+
+
+def _wiersz(nip):
+    return {"NIP": nip, "Status": STATUS_OK, "Nazwa": f"Firma {nip}"}
+
+
+@pytest.mark.parametrize("rozszerzenie", [".jsonl", ".csv"])
+def test_wznowienie_po_ucietym_wierszu(tmp_path, rozszerzenie):
+    wyjscie = tmp_path / ("wyniki" + rozszerzenie)
+    with open_writer(str(wyjscie), KOLUMNY) as writer:
+        writer.write_many([_wiersz("1"), _wiersz("2")])
+    # Przerwany zapis: połowa trzeciego wiersza bez znaku nowej linii.
+    with open(wyjscie, "ab") as f:
+        f.write(b'{"NIP": "3", "Sta' if rozszerzenie == ".jsonl" else b"3,ok,Firm")
+    with open_writer(str(wyjscie), KOLUMNY) as writer:
+        writer.write(_wiersz("4"))
+    assert [w["NIP"] for w in read_results(str(wyjscie))] == ["1", "2", "4"]
+
+
+@pytest.mark.parametrize("rozszerzenie", [".parquet", ".arrow"])
+def test_wznowienie_pliku_kolumnowego(tmp_path, rozszerzenie):
+    pytest.importorskip("pyarrow")
+    wyjscie = str(tmp_path / ("wyniki" + rozszerzenie))
+    with open_writer(wyjscie, KOLUMNY, row_group=2) as writer:
+        writer.write_many([_wiersz("1"), _wiersz("2"), _wiersz("3")])
+    with open_writer(wyjscie, KOLUMNY, row_group=2) as writer:
+        writer.write(_wiersz("4"))
+    assert [w["NIP"] for w in read_results(wyjscie)] == ["1", "2", "3", "4"]
+
+    with pytest.raises(ValueError):
+        open_writer(wyjscie, kolumny_wyniku(Projekcja.z_nazw("forma")))
+    # Nieudane wznowienie nie zmienia pliku ani nie zostawia pliku tymczasowego.
+    assert [w["NIP"] for w in read_results(wyjscie)] == ["1", "2", "3", "4"]
+    assert not (tmp_path / ("wyniki" + rozszerzenie + ".tmp")).exists()
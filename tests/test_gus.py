@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from regon_core.gus import MAX_W_ZAPYTANIU, pobierz_dane_wiele, podziel_na_paczki, rozpoznaj_identyfikator
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.sesja import SessionManager
+
+
+@pytest.mark.parametrize("tekst, para", [
+    ("5261040828", ("nip", "5261040828")),
+    ("PL 526-104-08-28", ("nip", "5261040828")),
+    ("000331501", ("regon", "000331501")),
+    ("12345678512347", ("regon", "12345678512347")),
+    ("REGON:000331501", ("regon", "000331501")),
+    ("KRS 312345", ("krs", "0000312345")),
+    ("krs=0000312345", ("krs", "0000312345")),
+])
+def test_rozpoznaj_identyfikator(tekst, para):
+    assert rozpoznaj_identyfikator(tekst) == para
+
+
+@pytest.mark.parametrize("tekst", ["abc", "12345", "5261040829", "NIP 000331501", "REGON 5261040828", "KRS 0"])
+def test_rozpoznaj_identyfikator_bledy(tekst):
+    with pytest.raises(ValueError):
+        rozpoznaj_identyfikator(tekst)
+
+
+def test_paczki_jednego_parametru_po_najwyzej_20():
+    nipy = [("nip", f"{i:010d}") for i in range(45)]
+    regony9 = [("regon", f"{i:09d}") for i in range(3)]
+    regony14 = [("regon", f"{i:014d}") for i in range(2)]
+    krs = [("krs", "0000312345")]
+    paczki = podziel_na_paczki(nipy + regony9 + krs + regony14 + nipy[:5])
+
+    assert all(0 < len(numery) <= MAX_W_ZAPYTANIU for _, numery in paczki)
+    assert [len(numery) for rodzaj, numery in paczki if rodzaj == "nip"] == [20, 20, 5]
+    # REGONy 9- i 14-cyfrowe idą osobnymi parametrami (Regony9zn / Regony14zn).
+    assert sorted(len(numery[0]) for rodzaj, numery in paczki if rodzaj == "regon") == [9, 14]
+    wszystkie = [(rodzaj, numer) for rodzaj, numery in paczki for numer in numery]
+    assert sorted(wszystkie) == sorted(nipy + regony9 + regony14 + krs)
+
+
+def _regon(bir, nip):
+    return re.search(r"<Regon>(\d+)</Regon>", bir.nagrania.po_nip[nip]).group(1)
+
+
+def test_mieszana_lista_i_raporty_tylko_dla_typu_p():
+    with MockBIR() as bir:
+        # Co trzeci podmiot syntetyczny to osoba prawna (0, 3, ...).
+        nipy = bir.add_synthetic(7)
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            wyniki = pobierz_dane_wiele(nipy[:6], MOCK_API_KEY, sesje, single_flight=None)
+            assert all(wyniki.values())
+            assert bir.requests["DaneSzukajPodmioty"] == 1
+            assert bir.requests["DanePobierzPelnyRaport"] == 2
+
+            # NIP, REGON osoby fizycznej i KRS osoby prawnej: trzy parametry, trzy wyszukiwania.
+            przed = dict(bir.requests)
+            pary = [("nip", nipy[6]), ("regon", _regon(bir, nipy[4])), ("krs", "0000000003")]
+            wyniki = pobierz_dane_wiele(pary, MOCK_API_KEY, sesje, single_flight=None)
+        finally:
+            sesje.close()
+    assert wyniki[("regon", _regon(bir, nipy[4]))]["Typ"] == "F"
+    assert wyniki[("krs", "0000000003")]["Regon"] == _regon(bir, nipy[3])
+    assert wyniki[("nip", nipy[6])]["Typ"] == "P"
+    assert bir.requests["DaneSzukajPodmioty"] - przed["DaneSzukajPodmioty"] == 3
+    # Raport dla KRS (przypisanie numeru) i dla osoby prawnej znalezionej po NIP; osoba fizyczna - bez raportu.
+    assert bir.requests["DanePobierzPelnyRaport"] - przed["DanePobierzPelnyRaport"] == 2
@@ -0,0 +1,96 @@
+import pytest
+
+from regon_core.historia import HistoryStore
+
+WPISY = [
+    ("5261040828", "Łódzka Spółdzielnia Mleczarska", 1.0),
+    ("5250001009", "Zakład Energetyczny Łódź", 2.0),
+    ("7740001454", "Polski Koncern Naftowy", 3.0),
+    ("5261040567", "Mleczarnia Gostyń", 4.0),
+]
+
+
+@pytest.fixture
+def historia(tmp_path):
+    store = HistoryStore(str(tmp_path / "historia.sqlite"), legacy_path=None)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def historia_like(tmp_path):
+    store = HistoryStore(str(tmp_path / "historia.sqlite"), legacy_path=None)
+    # Jak w SQLite bez FTS5: wpisy trafiają tylko do tabeli, a nazwy przeszukuje LIKE.
+    store.fts = False
+    yield store
+    store.close()
+
+
+def _nipy(wiersze):
+    return [nip for nip, _, _ in wiersze]
+
+
+def test_fts_poczatki_slow_bez_polskich_znakow(historia):
+    if not historia.fts:
+        pytest.skip("SQLite bez FTS5")
+    historia.add_many(WPISY)
+    assert _nipy(historia.page(query="lodz")) == ["5250001009", "5261040828"]
+    assert _nipy(historia.page(query="ŁÓDZ mlecz")) == ["5261040828"]
+    assert _nipy(historia.page(query="gostyn")) == ["5261040567"]
+    assert historia.page(query="odz") == []
+    assert historia.count("mlecz") == 2
+
+
+def test_like_bez_fts(historia_like):
+    historia_like.add_many(WPISY)
+    assert _nipy(historia_like.page(query="mlecz")) == ["5261040567", "5261040828"]
+    # LIKE dopasowuje też środek słowa, ale nie pomija polskich znaków.
+    assert _nipy(historia_like.page(query="Naftow")) == ["7740001454"]
+    assert historia_like.count("Gostyń") == 1
+    assert historia_like.count("gostyn") == 0
+
+
+@pytest.mark.parametrize("fixture", ["historia", "historia_like"])
+def test_poczatek_nipu(request, fixture):
+    historia = request.getfixturevalue(fixture)
+    historia.add_many(WPISY)
+    assert _nipy(historia.page(query="526-104")) == ["5261040567", "5261040828"]
+    assert historia.count("525") == 1
+
+
+def test_ponowne_wyszukanie_przenosi_na_poczatek(historia):
+    historia.add_many(WPISY)
+    historia.add("5261040828", "Łódzka Spółdzielnia Mleczarska", 5.0)
+    assert historia.count() == 4
+    assert _nipy(historia.page(limit=1)) == ["5261040828"]
+    if historia.fts:
+        assert historia.count("lodzka") == 1
+
+
+def test_stronicowanie_i_sortowanie(historia):
+    historia.add_many((f"{i:010d}", f"Firma {i % 7}", float(i)) for i in range(50))
+    assert historia.count() == 50
+
+    strony = [historia.page(offset=o, limit=20) for o in (0, 20, 40)]
+    assert [len(s) for s in strony] == [20, 20, 10]
+    assert _nipy(sum(strony, [])) == [f"{i:010d}" for i in reversed(range(50))]
+
+    assert _nipy(historia.page(limit=3, sort="nip", descending=False)) == ["0000000000", "0000000001", "0000000002"]
+    # Równe nazwy w kolejności wpisów, w tym samym kierunku co nazwy.
+    assert _nipy(historia.page(limit=3, sort="nazwa", descending=False)) == ["0000000000", "0000000007", "0000000014"]
+    assert _nipy(historia.page(limit=3, sort="nazwa", descending=True)) == ["0000000048", "0000000041", "0000000034"]
+    nazwy = [nazwa for _, nazwa, _ in historia.page(limit=50, sort="nazwa", descending=False)]
+    assert nazwy == sorted(nazwy)
+    with pytest.raises(ValueError):
+        historia.page(sort="czas; DROP TABLE historia")
+
+
+def test_import_pliku_tekstowego(tmp_path):
+    stary = tmp_path / "historia.txt"
+    stary.write_text("5261040828 | Pierwsza\n\n7740001454 | Druga\n", encoding="utf-8")
+    store = HistoryStore(str(tmp_path / "historia.sqlite"), legacy_path=str(stary))
+    try:
+        assert _nipy(store.page()) == ["7740001454", "5261040828"]
+        assert store.get("5261040828")[1] == "Pierwsza"
+    finally:
+        store.close()
@@ -0,0 +1,121 @@
+import json
+import time
+import types
+
+import pytest
+
+from regon_core import limiter as modul_limiter
+from regon_core.batch import run_batch
+from regon_core.gus import pobierz_dane
+from regon_core.limiter import (OKNO_SPADKU, SPADEK, WZROST, AdaptiveLimiter, DeadLetterList, ServiceError,
+                                with_retries)
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.sesja import SessionManager
+
+
+class _Odpowiedz:
+    def is_multipart(self):
+        return True
+
+
+class _Klient:
+    """Klient litex.regon zastępczy: kolejne wywołania zgłaszają błędy z listy, potem odpowiadają."""
+
+    def __init__(self, bledy):
+        self.bledy = list(bledy)
+        self.wywolania = 0
+
+    def call(self, envelope, **args):
+        self.wywolania += 1
+        if self.bledy:
+            raise self.bledy.pop(0)
+        return _Odpowiedz()
+
+
+def test_aimd_spadek_i_powrot(monkeypatch):
+    zegar = [100.0]
+    monkeypatch.setattr(modul_limiter, "time", types.SimpleNamespace(monotonic=lambda: zegar[0], sleep=time.sleep))
+    limiter = AdaptiveLimiter(rate=10)
+    limiter.blad(ServiceError("HTTP 500"))
+    assert limiter.rate == 10 * SPADEK
+    # Kolejne błędy z tego samego epizodu nie obniżają limitu ponownie.
+    limiter.blad(ServiceError("HTTP 500"))
+    assert limiter.rate == 10 * SPADEK
+    zegar[0] += OKNO_SPADKU
+    limiter.blad(ServiceError("HTTP 500"))
+    assert limiter.rate == 10 * SPADEK * SPADEK
+    # Błąd klucza API to nie przeciążenie usługi.
+    zegar[0] += OKNO_SPADKU
+    limiter.blad(RuntimeError("Login failed."))
+    assert limiter.rate == 10 * SPADEK * SPADEK
+
+    for _ in range(round((1 - SPADEK * SPADEK) / WZROST)):
+        limiter.sukces(0.1)
+    assert limiter.rate == pytest.approx(10)
+    limiter.sukces(0.1)
+    assert limiter.rate == 10
+    assert limiter.stats()["spadki"] == 2
+
+
+def test_ponawianie_bledow_przejsciowych():
+    przerwy = []
+    klient = with_retries(_Klient([ServiceError("HTTP 500"), ConnectionResetError()]), czekaj=przerwy.append)
+    assert isinstance(klient.call("koperta"), _Odpowiedz)
+    assert klient.wywolania == 3 and len(przerwy) == 2
+
+
+def test_bez_ponawiania_bledu_klucza():
+    przerwy = []
+    klient = with_retries(_Klient([RuntimeError("Login failed.")]), czekaj=przerwy.append)
+    with pytest.raises(RuntimeError):
+        klient.call("koperta")
+    assert przerwy == []
+
+
+def test_ostatnia_proba_zglasza_blad():
+    klient = with_retries(_Klient([ServiceError("HTTP 500")] * 3), max_prob=3, czekaj=lambda _: None)
+    with pytest.raises(ServiceError):
+        klient.call("koperta")
+    assert klient.wywolania == 3
+
+
+def test_bledy_mockbir_sa_ponawiane(monkeypatch):
+    monkeypatch.setattr(modul_limiter, "opoznienie", lambda proba: 0)
+    limiter = AdaptiveLimiter(rate=1000)
+    with MockBIR(error_rate=0.3, seed=7) as bir:
+        nipy = bir.add_synthetic(10)
+        sesje = SessionManager(service_url=bir.url, limiter=limiter)
+        try:
+            wyniki = [pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None) for nip in nipy]
+        finally:
+            sesje.close()
+    assert all(wyniki)
+    assert bir.requests["błędy"] > 0
+    assert limiter.stats()["błędy"] == bir.requests["błędy"]
+    assert limiter.stats()["spadki"] >= 1
+
+
+def test_dead_letter_jsonl(tmp_path):
+    sciezka = tmp_path / "odrzucone.jsonl"
+    odrzucone = DeadLetterList(str(sciezka))
+    odrzucone.add("5261040828", RuntimeError("Login failed."))
+    odrzucone.add("7740001454", RuntimeError("Login failed."))
+    wpisy = [json.loads(linia) for linia in sciezka.read_text(encoding="utf-8").splitlines()]
+    assert [w["id"] for w in wpisy] == ["5261040828", "7740001454"]
+    assert {w["klasa"] for w in wpisy} == {"auth"}
+    assert len(odrzucone) == 2 and list(odrzucone) == odrzucone.wpisy
+
+
+def test_batch_ze_zlym_kluczem_trafia_do_dead_letter(tmp_path):
+    sciezka = tmp_path / "wyniki.jsonl.odrzucone.jsonl"
+    with MockBIR() as bir:
+        nipy = bir.add_synthetic(3)
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            liczniki = run_batch(nipy, "zly-klucz", str(tmp_path / "wyniki.jsonl"), workers=1, rate=0, sesje=sesje,
+                                 dead_letter=str(sciezka))
+        finally:
+            sesje.close()
+    assert liczniki["odrzucone"] == 3
+    assert bir.requests == {"Zaloguj": 1}
+    assert sorted(json.loads(l)["id"] for l in sciezka.read_text(encoding="utf-8").splitlines()) == sorted(nipy)
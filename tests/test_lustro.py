@@ -0,0 +1,68 @@
+import json
+
+from regon_core.gus import pobierz_dane_wiele
+from regon_core.lustro import POLE_STATUSU, EntityMirror, MirrorRefresher
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.projekcja import POLE_ZAKONCZENIA
+from regon_core.sesja import SessionManager
+
+NIP = "5261040828"
+
+
+def _dane(nazwa="GUS", skreslenie="----------"):
+    return {"Regon": "000331501", "Nazwa": nazwa, "Informacja o skreśleniu z REGON": skreslenie}
+
+
+def test_wykrywanie_zmian(tmp_path):
+    lustro = EntityMirror(str(tmp_path / "lustro.sqlite"))
+    assert lustro.put(NIP, _dane()) == []
+    assert lustro.put(NIP, _dane()) == []
+    assert lustro.put(NIP, _dane("GUS NOWY")) == [("Nazwa", "GUS", "GUS NOWY")]
+    # Skreślenie jest w dzienniku raz - jako data zakończenia działalności.
+    assert lustro.put(NIP, _dane("GUS NOWY", "Działalność zakończona: 2024-01-31")) == [
+        (POLE_ZAKONCZENIA, None, "2024-01-31")]
+    lustro.mark_missing(NIP)
+    assert lustro.get(NIP) is None
+    assert lustro.put(NIP, _dane("GUS NOWY", "Działalność zakończona: 2024-01-31")) == [
+        (POLE_STATUSU, "brak", "aktywny")]
+    assert [(z["pole"], z["nowa"]) for z in lustro.changes()] == [
+        ("Nazwa", "GUS NOWY"), (POLE_ZAKONCZENIA, "2024-01-31"), (POLE_STATUSU, "brak"), (POLE_STATUSU, "aktywny")]
+
+    ostatnia = lustro.export_changes(str(tmp_path / "zmiany.jsonl"), since_id=2)
+    wiersze = [json.loads(l) for l in (tmp_path / "zmiany.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [w["id"] for w in wiersze] == [3, 4] and ostatnia == 4
+    lustro.close()
+
+
+def test_krs_z_raportu(tmp_path):
+    lustro = EntityMirror(str(tmp_path / "lustro.sqlite"))
+    xml = "<root><dane><praw_numerWRejestrzeEwidencji>312345</praw_numerWRejestrzeEwidencji></dane></root>"
+    lustro.put(NIP, _dane(), xml)
+    assert lustro.lookup("KRS 0000312345")["Nazwa"] == "GUS"
+    # Raport bez KRS (wyszukiwanie zbiorcze osoby fizycznej) nie kasuje zapamiętanego numeru.
+    lustro.put(NIP, _dane())
+    assert lustro.get_entry(NIP)["krs"] == "0000312345"
+    lustro.close()
+
+
+def test_odswiezanie_zapisuje_zmiany(tmp_path):
+    lustro = EntityMirror(str(tmp_path / "lustro.sqlite"))
+    with MockBIR() as bir:
+        nipy = bir.add_synthetic(4)
+        sesje = SessionManager(service_url=bir.url)
+        try:
+            pobierz_dane_wiele(nipy, MOCK_API_KEY, sesje, lustro)
+            zmieniony, usuniety = nipy[1], nipy[2]
+            bir.nagrania.po_nip[zmieniony] = bir.nagrania.po_nip[zmieniony].replace(
+                "<Ulica>ul. Syntetyczna</Ulica>", "<Ulica>ul. Nowa</Ulica>")
+            del bir.nagrania.po_nip[usuniety]
+            for nip in (zmieniony, usuniety):
+                lustro.invalidate(nip)
+            liczniki = MirrorRefresher(lustro, MOCK_API_KEY, sesje).run_once()
+        finally:
+            sesje.close()
+    assert liczniki == {"sprawdzone": 2, "zmienione": 2, "brak": 1, "błędy": 0}
+    assert {(z["nip"], z["pole"], z["nowa"]) for z in lustro.changes()} == {
+        (zmieniony, "Ulica", "ul. Nowa"), (usuniety, POLE_STATUSU, "brak")}
+    assert lustro.stats()["stale"] == 0
+    lustro.close()
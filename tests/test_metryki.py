@@ -0,0 +1,28 @@
+import threading
+
+from regon_core.metryki import Metryki
+
+
+def test_profilowany_jest_jeden_blok_naraz(tmp_path):
+    metryki = Metryki()
+    metryki.enable_profiling()
+    w_bloku, koniec = threading.Event(), threading.Event()
+
+    def dlugi_blok():
+        with metryki.span("search"):
+            w_bloku.set()
+            koniec.wait(5)
+
+    watek = threading.Thread(target=dlugi_blok)
+    watek.start()
+    w_bloku.wait(5)
+    # Drugi wątek nie uruchamia własnego profilera (Python 3.12+ zgłosiłby ValueError).
+    assert metryki._start_profilu("search") is None
+    with metryki.span("parse"):
+        pass
+    koniec.set()
+    watek.join()
+
+    with metryki.span("parse"):
+        sum(range(1000))
+    assert metryki.dump_profile(str(tmp_path / "profil.prof"))
@@ -0,0 +1,22 @@
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.obserwacja import DZIEN, JsonlSink, WatchScheduler, Watchlist
+from regon_core.sesja import SessionManager
+
+
+def test_maly_dzienny_limit_nadal_sprawdza_podmioty(tmp_path):
+    # 1000 zapytań na dobę to ~0,7 zapytania na minutowy interwał - mniej niż koszt jednego NIPu.
+    with MockBIR() as bir:
+        lista = Watchlist(str(tmp_path / "obserwowane.sqlite"))
+        lista.add(bir.add_synthetic(5))
+        sesje = SessionManager(service_url=bir.url)
+        harmonogram = WatchScheduler(lista, MOCK_API_KEY, sesje, sink=JsonlSink(str(tmp_path / "zmiany.jsonl")),
+                                     dzienny_limit=1000, interval=60)
+        try:
+            for _ in range(10):
+                harmonogram._przebieg(60)
+        finally:
+            sesje.close()
+            lista.close()
+    assert harmonogram.liczniki["sprawdzone"] >= 2
+    # Budżet nie przekracza tego, co dzienny limit przydzielił przez 10 interwałów.
+    assert harmonogram.liczniki["zapytania"] <= 1000 * 10 * 60 / DZIEN
@@ -0,0 +1,18 @@
+from regon_core import pdf
+
+
+def _dokument_z_tekstem():
+    dokument = pdf.new_pdf()
+    dokument.add_page()
+    dokument.cell(text="Zażółć gęślą jaźń")
+    return bytes(dokument.output())
+
+
+def test_czcionka_ze_wzorca():
+    assert _dokument_z_tekstem().startswith(b"%PDF")
+
+
+def test_czcionka_bez_znanych_pol_fpdf2(monkeypatch):
+    # Gdy budowa TTFFont nie pasuje, czcionka jest dodawana zwykłym add_font.
+    monkeypatch.setattr(pdf, "_POLA_KOPII", pdf._POLA_KOPII + ("pole_z_innej_wersji",))
+    assert _dokument_z_tekstem().startswith(b"%PDF")
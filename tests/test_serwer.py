@@ -0,0 +1,55 @@
+import http.client
+import json
+from urllib.parse import urlsplit
+
+import pytest
+
+from regon_core.mock_bir import MOCK_API_KEY
+from regon_core.serwer import MAX_BODY, RegonServer
+from regon_core.sesja import SessionManager
+
+
+@pytest.fixture
+def serwer():
+    # Żądania odrzucane przy wczytywaniu ciała nie docierają do GUS - wystarczy nieistniejąca usługa.
+    sesje = SessionManager(service_url="http://127.0.0.1:9/bir")
+    with RegonServer(MOCK_API_KEY, port=0, sesje=sesje) as s:
+        yield s
+    sesje.close()
+
+
+def _post(serwer, dlugosc, tresc):
+    adres = urlsplit(serwer.url)
+    polaczenie = http.client.HTTPConnection(adres.hostname, adres.port, timeout=5)
+    try:
+        polaczenie.putrequest("POST", "/batch")
+        polaczenie.putheader("Content-Length", dlugosc)
+        polaczenie.endheaders(tresc)
+        odpowiedz = polaczenie.getresponse()
+        return odpowiedz.status, json.loads(odpowiedz.read()), odpowiedz.will_close
+    finally:
+        polaczenie.close()
+
+
+@pytest.mark.parametrize("dlugosc, tresc", [
+    ("abc", b"5261040828"),
+    ("-1", b"5261040828"),
+    ("4", b"\xff\xfe\xfd\xfc"),
+])
+def test_niepoprawne_cialo_zadania(serwer, dlugosc, tresc):
+    kod, odpowiedz, _ = _post(serwer, dlugosc, tresc)
+    assert kod == 400
+    assert "błąd" in odpowiedz
+
+
+def test_za_duze_cialo_zamyka_polaczenie(serwer):
+    kod, _, zamkniete = _post(serwer, str(MAX_BODY + 1), b"5261040828\n" * 10)
+    assert kod == 413
+    assert zamkniete
+
+
+def test_pole_fields_nie_tekstowe(serwer):
+    tresc = json.dumps({"ids": ["5261040828"], "fields": 5}).encode()
+    kod, odpowiedz, _ = _post(serwer, str(len(tresc)), tresc)
+    assert kod == 400
+    assert "fields" in odpowiedz["błąd"]
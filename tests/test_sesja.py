@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from regon_core.gus import pobierz_dane
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.sesja import SessionManager
+
+
+@pytest.fixture
+def bir():
+    with MockBIR() as serwer:
+        yield serwer
+
+
+def test_jedna_sesja_dla_wielu_zapytan(bir):
+    nipy = bir.add_synthetic(3)
+    sesje = SessionManager(service_url=bir.url)
+    for nip in nipy:
+        assert pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None)
+    sesje.close()
+    assert bir.requests["Zaloguj"] == 1
+    assert bir.requests["Wyloguj"] == 1
+
+
+def test_ponowne_logowanie_po_ttl(bir):
+    nip = bir.add_synthetic(1)[0]
+    sesje = SessionManager(service_url=bir.url, ttl=0.01)
+    pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None)
+    time.sleep(0.02)
+    pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None)
+    # Wygasła sesja jest wylogowywana, zanim powstanie nowa.
+    assert bir.requests["Zaloguj"] == 2
+    assert bir.requests["Wyloguj"] == 1
+    sesje.close()
+
+
+def test_odrzucona_sesja_jedno_ponowienie(bir):
+    nip = bir.add_synthetic(1)[0]
+    sesje = SessionManager(service_url=bir.url)
+    pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None)
+    # Serwer zapomina SID (np. restart usługi) - następne zapytanie loguje się ponownie.
+    bir._sesje.clear()
+    assert pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=None)
+    assert bir.requests["Zaloguj"] == 2
+    sesje.close()
+
+
+def test_bez_ponowienia_innych_bledow(bir):
+    sesje = SessionManager(service_url=bir.url)
+    wywolania = []
+
+    def operacja(klient):
+        wywolania.append(klient)
+        raise ValueError("błąd danych")
+
+    with pytest.raises(ValueError):
+        sesje.call(MOCK_API_KEY, operacja)
+    assert len(wywolania) == 1
+    # Sesja wraca do puli - błąd nie dotyczył jej ważności.
+    sesje.call(MOCK_API_KEY, lambda klient: None)
+    assert bir.requests["Zaloguj"] == 1
+    sesje.close()
+
+
+def test_pula_nie_przekracza_max_sessions(bir):
+    sesje = SessionManager(service_url=bir.url, max_sessions=3)
+    lock = threading.Lock()
+    aktywne = set()
+    najwiecej = [0]
+
+    def operacja(klient):
+        with lock:
+            aktywne.add(id(klient))
+            najwiecej[0] = max(najwiecej[0], len(aktywne))
+        time.sleep(0.02)
+        with lock:
+            aktywne.discard(id(klient))
+
+    with ThreadPoolExecutor(10) as pula:
+        list(pula.map(lambda _: sesje.call(MOCK_API_KEY, operacja), range(40)))
+    sesje.close()
+    assert najwiecej[0] == 3
+    assert bir.requests["Zaloguj"] == 3
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from regon_core.gus import pobierz_dane, pobierz_dane_wiele
+from regon_core.mock_bir import MOCK_API_KEY, MockBIR
+from regon_core.sesja import SessionManager
+from regon_core.singleflight import SingleFlight
+
+WATKI = 8
+
+
+def _razem(funkcja):
+    """Wywołuje `funkcja()` w WATKI wątkach startujących jednocześnie; zwraca wyniki albo wyjątki."""
+    start = threading.Barrier(WATKI)
+
+    def zadanie():
+        start.wait()
+        try:
+            return funkcja()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(WATKI) as pula:
+        return list(pula.map(lambda _: zadanie(), range(WATKI)))
+
+
+@pytest.fixture
+def bir():
+    # Opóźnienie odpowiedzi sprawia, że wszystkie wątki pytają, zanim pierwszy dostanie wynik.
+    with MockBIR(latency=0.2) as serwer:
+        yield serwer
+
+
+def test_pobierz_dane_jedno_zapytanie_dla_wielu_watkow(bir):
+    nip = bir.add_synthetic(1)[0]
+    lot = SingleFlight()
+    sesje = SessionManager(service_url=bir.url, max_sessions=WATKI)
+    try:
+        wyniki = _razem(lambda: pobierz_dane(nip, MOCK_API_KEY, sesje, single_flight=lot))
+    finally:
+        sesje.close()
+    assert bir.requests["DaneSzukajPodmioty"] == 1
+    assert all(w == wyniki[0] for w in wyniki) and wyniki[0]["Nazwa"]
+    # Każdy wywołujący dostaje własną kopię wyniku.
+    assert len({id(w) for w in wyniki}) == WATKI
+    assert lot.stats() == {"upstream": 1, "shared": WATKI - 1, "w_toku": 0}
+
+
+def test_pobierz_dane_wiele_dzieli_paczke(bir):
+    nipy = bir.add_synthetic(3)
+    lot = SingleFlight()
+    sesje = SessionManager(service_url=bir.url, max_sessions=WATKI)
+    try:
+        wyniki = _razem(lambda: pobierz_dane_wiele(nipy, MOCK_API_KEY, sesje, single_flight=lot))
+    finally:
+        sesje.close()
+    assert bir.requests["DaneSzukajPodmioty"] == 1
+    assert all(w == wyniki[0] for w in wyniki)
+    assert list(wyniki[0]) == [("nip", nip) for nip in nipy]
+    assert all(dane is not None for dane in wyniki[0].values())
+
+
+def test_czekajace_watki_dostaja_blad_prowadzacego(bir):
+    nip = bir.add_synthetic(1)[0]
+    lot = SingleFlight()
+    sesje = SessionManager(service_url=bir.url, max_sessions=WATKI)
+    try:
+        wyniki = _razem(lambda: pobierz_dane(nip, "zly-klucz", sesje, single_flight=lot))
+    finally:
+        sesje.close()
+    assert all(isinstance(w, Exception) for w in wyniki)
+    assert len({id(w) for w in wyniki}) == 1
+    assert bir.requests == {"Zaloguj": 1}
+    assert lot.stats()["w_toku"] == 0
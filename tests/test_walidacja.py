@@ -0,0 +1,44 @@
+import pytest
+
+from regon_core.walidacja import filtruj_nipy, poprawny_krs, poprawny_nip, poprawny_regon, sprawdz, sprawdz_nip
+
+
+@pytest.mark.parametrize("sprawdzenie, poprawny, bledny", [
+    (poprawny_nip, "5261040828", "5261040829"),
+    (poprawny_regon, "000331501", "000331502"),
+    (poprawny_regon, "12345678512347", "12345678512348"),
+])
+def test_cyfra_kontrolna(sprawdzenie, poprawny, bledny):
+    assert sprawdzenie(poprawny)
+    assert not sprawdzenie(bledny)
+
+
+@pytest.mark.parametrize("numer", ["526104082", "52610408281", "526104082A", "526104082²", ""])
+def test_nip_zly_format(numer):
+    assert not poprawny_nip(numer)
+
+
+def test_regon_zla_dlugosc():
+    assert not poprawny_regon("0003315010")
+
+
+def test_krs():
+    assert poprawny_krs("0000312345")
+    assert not poprawny_krs("0000000000")
+    assert not poprawny_krs("000031234")
+
+
+def test_sprawdz():
+    assert sprawdz("regon", "000331501") == "000331501"
+    with pytest.raises(ValueError):
+        sprawdz("nip", "5261040829")
+    assert sprawdz_nip("PL 526-104-08-28") == "5261040828"
+    with pytest.raises(ValueError):
+        sprawdz_nip("526-104-08-2")
+
+
+def test_filtruj_nipy_usuwa_duplikaty_i_zachowuje_kolejnosc():
+    odrzucone = []
+    wartosci = ["7740001454", "526-104-08-28", "", "PL7740001454", "5261040829", "abc", "5261040828", " 5261040829 "]
+    assert filtruj_nipy(wartosci, odrzucone) == ["7740001454", "5261040828"]
+    assert odrzucone == [("5261040829", "suma kontrolna"), ("abc", "format")]
@@ -0,0 +1,78 @@
+import pytest
+
+from regon_core.batch import KOLUMNY_WYNIKU
+from regon_core.eksport import open_writer
+from regon_core.wyniki import ResultSet
+
+WIERSZE = [
+    {"NIP": "5261040828", "Status": "OK", "Nazwa": "Łódzka Spółdzielnia", "Miejscowosc": "Łódź"},
+    {"NIP": "7740001454", "Status": "OK", "Nazwa": "Polski Koncern", "Miejscowosc": "Płock"},
+    {"NIP": "5250001009", "Status": "BRAK", "Nazwa": "Zakład", "Miejscowosc": None},
+    {"NIP": "5270001007", "Status": "BRAK", "Nazwa": "", "Miejscowosc": ""},
+    {"NIP": "5261040567", "Status": "OK", "Nazwa": "mleczarnia Łódź", "Miejscowosc": "Zgierz"},
+]
+
+
+def _nipy(wiersze):
+    return [w["NIP"] for w in wiersze]
+
+
+def test_filtr_wszystkie_slowa_bez_polskich_znakow():
+    wyniki = ResultSet(WIERSZE)
+    assert wyniki.filter("lodz") == 2
+    assert _nipy(wyniki.rows()) == ["5261040828", "5261040567"]
+    assert wyniki.filter("ŁÓDŹ  spoldz") == 1
+    assert wyniki.filter("plock koncern") == 1
+    assert wyniki.filter("lodz plock") == 0
+    assert wyniki.rows() == []
+    assert wyniki.filter("  ") == 5
+    assert wyniki.count() == 5
+
+
+@pytest.mark.parametrize("descending, oczekiwane", [
+    (False, ["b", "d", "a", "c", "e"]),
+    (True, ["a", "d", "b", "c", "e"]),
+])
+def test_sortowanie_puste_na_koncu(descending, oczekiwane):
+    # Wielkość liter nie wpływa na kolejność; puste wartości zawsze na końcu.
+    wyniki = ResultSet([
+        {"NIP": "a", "Nazwa": "zakład"},
+        {"NIP": "b", "Nazwa": "Apteka"},
+        {"NIP": "c", "Nazwa": ""},
+        {"NIP": "d", "Nazwa": "mleczarnia"},
+        {"NIP": "e"},
+    ])
+    assert wyniki.sort("Nazwa", descending) == 5
+    assert _nipy(wyniki.rows()) == oczekiwane
+
+
+def test_sortowanie_zachowuje_filtr():
+    wyniki = ResultSet(WIERSZE)
+    wyniki.filter("ok")
+    assert wyniki.sort("NIP", descending=True) == 3
+    assert _nipy(wyniki.rows()) == ["7740001454", "5261040828", "5261040567"]
+    assert wyniki.filter("") == 5
+    assert _nipy(wyniki.rows())[0] == "7740001454"
+
+
+def test_okno_wierszy():
+    wyniki = ResultSet({"NIP": f"{i:010d}", "Status": "OK"} for i in range(1000))
+    wyniki.sort("NIP", descending=True)
+    okno = wyniki.rows(offset=990, limit=20)
+    assert _nipy(okno) == [f"{i:010d}" for i in reversed(range(10))]
+    assert wyniki.rows(offset=2000, limit=20) == []
+    # Filtr szuka fragmentu tekstu: 0000000990-999 i 0000000099.
+    assert wyniki.filter("0000099") == 11
+    assert wyniki.count() == 11
+    assert _nipy(wyniki.rows(0, 2)) == ["0000000999", "0000000998"]
+
+
+def test_z_pliku_jsonl(tmp_path):
+    sciezka = str(tmp_path / "wyniki.jsonl")
+    with open_writer(sciezka, KOLUMNY_WYNIKU + ["pkd"]) as writer:
+        writer.write_many(dict(w, pkd="10.51.Z") for w in WIERSZE)
+    wyniki = ResultSet.from_file(sciezka)
+    assert wyniki.count() == 5
+    assert wyniki.kolumny[:2] == ["NIP", "Status"]
+    assert wyniki.kolumny[-1] == "pkd"
+    assert wyniki.filter("10.51 zgierz") == 1